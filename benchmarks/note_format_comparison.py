@@ -0,0 +1,50 @@
+"""Compares the size and load time of notes stored in format version 1 and version 2.
+Usage: python -m benchmarks.note_format_comparison [years]"""
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.synthetic_journal import synthetic_notes
+from journal.api import note_format
+from journal.api.storage import JsonStorage
+
+
+def write_version_1(folder: Path, date: str, html_content: str) -> None:
+    """Writes a note as DailyNote.save_note used to"""
+    with open(folder / f"{date}.json", "w", encoding="utf-8") as f:
+        json.dump({"date": date, "html_content": html_content, "images": None}, f, indent=4)
+
+
+def measure(folder: Path) -> tuple[int, float]:
+    """Total size of the notes of a folder and time to read them all"""
+    size = sum(path.stat().st_size for path in folder.glob("*.json"))
+    storage = JsonStorage(folder)
+    start = time.perf_counter()
+    for date in storage.list_notes():
+        storage.read(date)
+    return size, time.perf_counter() - start
+
+
+def main(years: int = 10) -> None:
+    with tempfile.TemporaryDirectory() as temporary_folder:
+        version_1, version_2 = Path(temporary_folder) / "v1", Path(temporary_folder) / "v2"
+        version_1.mkdir()
+        storage = JsonStorage(version_2)
+        count = 0
+        for date, html_content in synthetic_notes(years):
+            write_version_1(version_1, date, html_content)
+            storage.write({"date": date, "html_content": html_content, "images": None})
+            count += 1
+
+        print(f"{count} notes, {years} years")
+        print(f"{'format':<8}{'size (KiB)':>12}{'per note (B)':>14}{'load (ms)':>12}")
+        results = {version: measure(folder) for version, folder in ((1, version_1),
+                                                                     (note_format.FORMAT_VERSION, version_2))}
+        for version, (size, load_time) in results.items():
+            print(f"{version:<8}{size / 1024:>12.0f}{size / count:>14.0f}{load_time * 1000:>12.0f}")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,172 @@
+"""Benchmarks of the journal hot paths on a synthetic journal.
+The GUI benchmarks run under Qt's offscreen platform.
+
+Usage: python -m benchmarks.run_benchmarks --baseline FILE [--save-baseline] [--years N] [--output FILE]
+
+Results are written as json: {"environment": {...}, "results": {name: {"median": s, "min": s, "runs": n}}}.
+Each median is compared to the one of the baseline and the exit code is 1 if any benchmark is slower
+than the baseline by more than the tolerance. Timings depend on the machine, so the baseline is not
+part of the repository: create one on the machine comparing results, before the changes to measure,
+with --save-baseline, e.g.
+    python -m benchmarks.run_benchmarks --baseline ../baseline.json --save-baseline"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+DEFAULT_OUTPUT = Path("benchmark_results.json")
+TYPED_TEXT = "Footing de 45 minutes, allure facile, un peu de vent. "
+
+
+def measure(function: Callable[[], object], runs: int,
+            setup: Callable[[], object] | None = None) -> dict[str, float | int]:
+    """Times runs calls of function, setup being called untimed before each one"""
+    durations = []
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return {"median": statistics.median(durations), "min": min(durations), "runs": runs}
+
+
+def api_benchmarks(journal_folder: Path, note_count: int) -> dict[str, dict]:
+    """Benchmarks of journal.api functions"""
+    from benchmarks.synthetic_journal import synthetic_notes
+    from journal.api.daily_note import DailyNote, get_notes, delete_all_notes
+    from journal.api.note_repository import note_repository
+
+    results = {"get_notes": measure(get_notes, runs=5)}
+
+    notes = iter(DailyNote(f"1999-{i % 12 + 1:02d}-{i % 28 + 1:02d}", html_content)
+                 for i, (_, html_content) in enumerate(synthetic_notes(years=2, seed=1)))
+    results["DailyNote.save_note"] = measure(lambda: next(notes).save_note(), runs=200)
+
+    notes_folder, backup_folder = journal_folder / "Notes", journal_folder / "Notes.backup"
+    shutil.copytree(notes_folder, backup_folder)
+
+    def restore_notes() -> None:
+        shutil.rmtree(notes_folder, ignore_errors=True)
+        shutil.copytree(backup_folder, notes_folder)
+
+    results["delete_all_notes"] = measure(delete_all_notes, runs=3, setup=restore_notes)
+    restore_notes()
+    note_repository.invalidate()
+    return results
+
+
+def gui_benchmarks() -> dict[str, dict]:
+    """Benchmarks of MainWindow slots"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtCore import QDate, Qt
+    from PySide6.QtTest import QTest
+    from PySide6.QtWidgets import QApplication
+
+    from journal.api.note_repository import note_repository
+    from journal.ui.main_window import MainWindow
+
+    app = QApplication.instance() or QApplication([])
+    results = {}
+    windows = []
+    results["MainWindow startup"] = measure(lambda: windows.append(MainWindow(app)), runs=1)
+    window = windows[0]
+    window.show()
+    app.processEvents()
+
+    dates = iter([QDate.fromString(date, Qt.DateFormat.ISODate) for date in sorted(note_repository.dates())] * 2)
+    results["MainWindow.display_note"] = measure(lambda: window.calendar.setSelectedDate(next(dates)), runs=100)
+
+    characters = iter(TYPED_TEXT * 10)
+
+    def type_character() -> None:
+        QTest.keyClick(window.te_notes, next(characters))
+        app.processEvents()
+
+    window.te_notes.moveCursor(window.te_notes.textCursor().MoveOperation.End)
+    results["MainWindow.note_changed (keystroke)"] = measure(type_character, runs=len(TYPED_TEXT) * 5)
+
+    def flush_note() -> None:
+        window.save_note()
+        window.autosave.flush()
+
+    results["MainWindow.note_changed (save)"] = measure(flush_note, runs=20, setup=type_character)
+
+    pages = iter([(year, month) for year in range(2000, 2010) for month in range(1, 13)])
+    results["MainWindow.color_dates"] = measure(window.color_dates, runs=50,
+                                                setup=lambda: window.calendar.setCurrentPage(*next(pages)))
+    window.close()
+    window.deleteLater()
+    app.processEvents()
+    return results
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict], tolerance: float) -> list[str]:
+    """Prints results against a baseline, returns the names of the regressions"""
+    regressions = []
+    print(f"{'benchmark':<40}{'median (ms)':>14}{'baseline (ms)':>16}{'ratio':>8}")
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            print(f"{name:<40}{result['median'] * 1000:>14.3f}{'-':>16}{'-':>8}")
+            continue
+        ratio = result["median"] / reference["median"] if reference["median"] else float("inf")
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<40}{result['median'] * 1000:>14.3f}{reference['median'] * 1000:>16.3f}{ratio:>8.2f}{flag}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=int, default=5, help="years of notes in the synthetic journal")
+    parser.add_argument("--images", type=int, default=20, help="images in the synthetic journal")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT, help="json results file")
+    parser.add_argument("--baseline", type=Path, required=True, help="json baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help="stores the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="slowdown ratio reported as a regression")
+    parser.add_argument("--no-gui", action="store_true", help="skips the MainWindow benchmarks")
+    args = parser.parse_args()
+    if not args.save_baseline and not args.baseline.exists():
+        parser.error(f"no baseline {args.baseline}: create it with --save-baseline")
+
+    journal_folder = Path(tempfile.mkdtemp(prefix="journal_benchmark_"))
+    os.environ["JOURNAL_FOLDER"] = str(journal_folder)  # before journal.api.constants_api is imported
+    try:
+        from benchmarks.synthetic_journal import generate_journal
+
+        start = time.perf_counter()
+        note_count = generate_journal(args.years, args.images)
+        print(f"Synthetic journal: {note_count} notes, {args.images} images "
+              f"({time.perf_counter() - start:.1f} s to generate)")
+        results = api_benchmarks(journal_folder, note_count)
+        if not args.no_gui:
+            results.update(gui_benchmarks())
+    finally:
+        shutil.rmtree(journal_folder, ignore_errors=True)
+
+    report = {"environment": {"python": platform.python_version(), "platform": platform.platform(),
+                              "years": args.years, "notes": note_count, "images": args.images},
+              "results": results}
+    args.output.write_text(json.dumps(report, indent=4), encoding="utf-8")
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=4), encoding="utf-8")
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))["results"]
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Generator of realistic synthetic notes, as QTextEdit.toHtml() would write them, and of whole journals"""
+import random
+import struct
+import tempfile
+import zlib
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Iterator
+
+QT_HEADER = ('<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.0//EN" "http://www.w3.org/TR/REC-html40/strict.dtd">\n'
+             '<html><head><meta name="qrichtext" content="1" /><meta charset="utf-8" /><style type="text/css">\n'
+             'p, li { white-space: pre-wrap; }\n'
+             'hr { height: 1px; border-width: 0; }\n'
+             'li.unchecked::marker { content: "\\2610"; }\n'
+             'li.checked::marker { content: "\\2612"; }\n'
+             '</style></head><body style=" font-family:\'Segoe UI\'; font-size:9pt; font-weight:400; '
+             'font-style:normal;">\n')
+QT_FOOTER = '</body></html>'
+PARAGRAPH = ('<p style=" margin-top:0px; margin-bottom:0px; margin-left:0px; margin-right:0px; '
+             '-qt-block-indent:0; text-indent:0px;">{}</p>')
+EMPTY_PARAGRAPH = ('<p style="-qt-paragraph-type:empty; margin-top:0px; margin-bottom:0px; margin-left:0px; '
+                   'margin-right:0px; -qt-block-indent:0; text-indent:0px; font-size:16pt;"><br /></p>')
+SPAN_STYLES = [' font-size:16pt;', ' font-size:16pt;', ' font-size:16pt;', ' font-size:16pt; font-weight:700;',
+               ' font-size:16pt; font-style:italic;', ' font-size:16pt; text-decoration: underline;',
+               ' font-size:16pt; text-decoration: line-through;', ' font-size:24pt; font-weight:700;',
+               ' font-size:12pt;']
+WORDS = ("séance footing fractionné récupération étirements sommeil fatigue genou douleur progrès objectif "
+         "course vélo natation côtes allure tempo seuil échauffement retour au calme matin soir pluie soleil "
+         "chaleur froid vent légère dure facile excellente moyenne kilomètres minutes secondes pulsations "
+         "le la les un une des du de et à en avec pour sur dans très bien pas plus moins").split()
+
+
+def random_sentence(rng: random.Random) -> str:
+    """A sentence of random words"""
+    words = [rng.choice(WORDS) for _ in range(rng.randint(5, 20))]
+    return " ".join(words).capitalize() + rng.choice([".", ".", ".", " !", " ?"])
+
+
+def random_html(rng: random.Random, images: list[str] = ()) -> str:
+    """Html of a note with varied formatting, possibly showing some of images"""
+    paragraphs = []
+    for _ in range(rng.randint(1, 12)):
+        if rng.random() < 0.15:
+            paragraphs.append(EMPTY_PARAGRAPH)
+            continue
+        spans = "".join(f'<span style="{rng.choice(SPAN_STYLES)}">{random_sentence(rng)} </span>'
+                        for _ in range(rng.randint(1, 4)))
+        if images and rng.random() < 0.1:
+            spans += f'<img src="{rng.choice(images)}" />'
+        paragraphs.append(PARAGRAPH.format(spans))
+    return QT_HEADER + "\n".join(paragraphs) + QT_FOOTER
+
+
+def synthetic_notes(years: int, seed: int = 0, images: list[str] = (),
+                    fill_rate: float = 0.8) -> Iterator[tuple[str, str]]:
+    """Yields (iso date, html) of notes for years of journal, fill_rate of the days having a note"""
+    rng = random.Random(seed)
+    first_day = date(2000, 1, 1)
+    for day in range(365 * years):
+        if rng.random() < fill_rate:
+            yield (first_day + timedelta(days=day)).isoformat(), random_html(rng, images)
+
+
+def write_png(path: Path, width: int, height: int, seed: int = 0) -> None:
+    """Writes a RGB png image of a colored gradient"""
+    rng = random.Random(seed)
+    red, green, blue = rng.randrange(256), rng.randrange(256), rng.randrange(256)
+    rows = b"".join(b"\x00" + bytes((red + x) % 256 if i % 3 == 0 else (green + y) % 256 if i % 3 == 1 else blue
+                                    for x in range(width) for i in range(3))
+                    for y in range(height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    path.write_bytes(b"\x89PNG\r\n\x1a\n"
+                     + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+                     + chunk(b"IDAT", zlib.compress(rows))
+                     + chunk(b"IEND", b""))
+
+
+def generate_journal(years: int, image_count: int = 20, seed: int = 0) -> int:
+    """Fills the journal (JOURNAL_FOLDER) with years of notes showing image_count images
+    inserted with copy_image. Returns the number of notes."""
+    from journal.api.daily_note import DailyNote
+    from journal.api.images_functions import copy_image, extract_images
+
+    images = []
+    with tempfile.TemporaryDirectory() as source_folder:
+        for i in range(image_count):
+            source_path = Path(source_folder) / f"photo_{i}.png"
+            write_png(source_path, 64 + 16 * (i % 8), 48 + 16 * (i % 5), seed=seed + i)
+            images.append(str(copy_image(source_path)))
+
+    count = 0
+    for date, html_content in synthetic_notes(years, seed=seed, images=images):
+        DailyNote(date, html_content, extract_images(html_content)).save_note()
+        count += 1
+    return count
@@ -0,0 +1,8 @@
+"""Entry point of python -m journal: the command line interface"""
+import sys
+
+from journal.cli import main
+
+
+if __name__ == '__main__':
+    sys.exit(main())
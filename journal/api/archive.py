@@ -0,0 +1,243 @@
+"""Export of the journal to a zip archive, and import of such an archive into a journal.
+
+An archive holds one file per note, notes/<date>.html or notes/<date>.md, the images of the notes,
+images/<name>, each written once however many notes show it, and manifest.json listing the notes
+with their images. Image paths in the notes are relative to the archive, so that it can be read
+once extracted.
+Notes are read, converted and written one at a time, so that memory use does not grow with the
+journal; the Markdown conversion runs in a process pool, a bounded number of notes ahead. The processes
+are spawned, not forked: a fork of the application could copy locks held by its other threads."""
+import html
+import json
+import multiprocessing
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date as Date
+from pathlib import Path, PurePosixPath
+from typing import Callable, Iterable, Iterator
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
+
+from journal.api.daily_note import list_notes
+from journal.api.images_functions import extract_images, hash_file, is_stored_image, store_image
+from journal.api.markdown import html_to_markdown, markdown_to_html
+from journal.api.storage import get_storage
+from journal.api.text_functions import append_html, html_body, html_to_text
+
+ARCHIVE_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+NOTES_PREFIX = "notes/"
+IMAGES_PREFIX = "images/"
+NOTE_NAME_PATTERN = re.compile(r"notes/(\d{4}-\d{2}-\d{2})\.(html|md)")
+IMAGE_SUFFIX_PATTERN = re.compile(r"\.[A-Za-z0-9]{1,5}")
+SOURCE_PATTERN = re.compile(r"""(\s(?:src|href)\s*=\s*)(?:"([^"]*)"|'([^']*)')""", re.IGNORECASE)
+COMPRESSED_SUFFIXES = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".avif"}  # stored as they are
+MARKDOWN_BATCH_SIZE = 32  # notes converted by a task of the process pool
+MARKDOWN_BATCHES_AHEAD = 4  # tasks queued per process, bounding the notes held in memory
+IMPORT_BATCH_SIZE = 100  # notes written to the storage at once
+
+
+@dataclass
+class ImportResult:
+    """Numbers of notes added, merged into existing notes, and already in the journal"""
+    added: int = 0
+    merged: int = 0
+    unchanged: int = 0
+
+
+def _replace_sources(html_content: str, replace: Callable[[str], str | None]) -> str:
+    """html_content with the src and href paths replaced by replace(path), kept when it returns None"""
+    def replace_source(match: re.Match) -> str:
+        path = html.unescape(match.group(2) if match.group(2) is not None else match.group(3))
+        new_path = replace(path.removeprefix("file://"))
+        return match.group(0) if new_path is None else f'{match.group(1)}"{html.escape(new_path)}"'
+
+    return SOURCE_PATTERN.sub(replace_source, html_content)
+
+
+def _notes_to_markdown(html_contents: list[str]) -> list[str]:
+    """Markdown of notes, in a process of the pool"""
+    return [html_to_markdown(html_content) for html_content in html_contents]
+
+
+def _batches(items: Iterable, size: int) -> Iterator[list]:
+    """Lists of size items, the last one possibly shorter"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _markdown_notes(notes: Iterable[tuple[str, str]], processes: int) -> Iterator[tuple[str, str]]:
+    """(date, Markdown) of (date, html) notes, in order, converted by batches in a process pool"""
+    with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn")) as executor:
+        pending = deque()  # (dates, future Markdown) of the batches being converted
+        for batch in _batches(notes, MARKDOWN_BATCH_SIZE):
+            dates, html_contents = zip(*batch)
+            pending.append((dates, executor.submit(_notes_to_markdown, list(html_contents))))
+            if len(pending) >= processes * MARKDOWN_BATCHES_AHEAD:
+                dates, future = pending.popleft()
+                yield from zip(dates, future.result())
+        while pending:
+            dates, future = pending.popleft()
+            yield from zip(dates, future.result())
+
+
+class _ImageWriter:
+    """Writes the images of the notes to an archive, each image once"""
+
+    def __init__(self, archive: ZipFile) -> None:
+        self.archive = archive
+        self._names = {}  # path of an image: its name in the archive, None if it is missing
+        self._written = set()  # names of the images in the archive
+
+    def write(self, html_content: str) -> tuple[str, list[str]]:
+        """Writes the images of a note not in the archive yet.
+        Returns the note with image paths relative to the archive, and the names of its images."""
+        names = {}
+        for image in extract_images(html_content):
+            if image not in self._names:
+                self._names[image] = self._write_image(Path(image))
+            if self._names[image] is not None:
+                names[image] = self._names[image]
+        if not names:
+            return html_content, []
+        html_content = _replace_sources(html_content,
+                                        lambda path: IMAGES_PREFIX + names[path] if path in names else None)
+        return html_content, list(dict.fromkeys(names.values()))
+
+    def _write_image(self, image: Path) -> str | None:
+        if not image.is_file():
+            return None
+        # stored images are named by their content already
+        name = image.name if is_stored_image(image) else f"{hash_file(image)}{image.suffix.lower()}"
+        if name not in self._written:
+            compression = ZIP_STORED if image.suffix.lower() in COMPRESSED_SUFFIXES else ZIP_DEFLATED
+            self.archive.write(image, IMAGES_PREFIX + name, compress_type=compression)
+            self._written.add(name)
+        return name
+
+
+def export_archive(path: str | Path, start: str = "0000-00-00", end: str = "9999-99-99", markdown: bool = False,
+                   progress: Callable[[int, int], None] | None = None, processes: int | None = None) -> int:
+    """Writes the notes from start to end (included) and their images to a zip archive, as html or
+    Markdown. Returns the number of notes. progress is called with the numbers of notes written and
+    to write, and may raise an exception to stop: the archive is then not created.
+    The Markdown conversion uses processes processes, as many as processors by default, or none if 0."""
+    path = Path(path)
+    total = sum(1 for date in list_notes() if start <= date <= end)
+    processes = (os.cpu_count() or 1) if processes is None else processes
+    suffix = ".md" if markdown else ".html"
+    manifest = {}  # date: names of the images of the note
+    temporary_path = path.with_name(f".{path.name}.tmp")
+    try:
+        with ZipFile(temporary_path, "w", ZIP_DEFLATED) as archive:
+            image_writer = _ImageWriter(archive)
+
+            def notes() -> Iterator[tuple[str, str]]:
+                for record in get_storage().read_range(start, end):
+                    html_content, manifest[record["date"]] = image_writer.write(record.get("html_content") or "")
+                    yield record["date"], html_content
+
+            if not markdown:
+                contents = notes()
+            elif processes and total > MARKDOWN_BATCH_SIZE:
+                contents = _markdown_notes(notes(), processes)
+            else:
+                contents = ((date, html_to_markdown(html_content)) for date, html_content in notes())
+            for done, (date, content) in enumerate(contents, 1):
+                archive.writestr(f"{NOTES_PREFIX}{date}{suffix}", content)
+                if progress is not None:
+                    progress(done, total)
+            archive.writestr(MANIFEST_NAME, json.dumps({"version": ARCHIVE_VERSION,
+                                                        "format": "markdown" if markdown else "html",
+                                                        "notes": manifest}, ensure_ascii=False))
+        os.replace(temporary_path, path)
+    finally:
+        temporary_path.unlink(missing_ok=True)
+    return len(manifest)
+
+
+def _is_date(value: str) -> bool:
+    try:
+        Date.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _text(html_content: str) -> str:
+    """Text of a note with its white spaces normalized, to compare notes"""
+    return " ".join(html_to_text(html_content).split())
+
+
+def import_archive(path: str | Path, progress: Callable[[int, int], None] | None = None) -> ImportResult:
+    """Merges the notes of an archive written by export_archive into the journal: a note is added if
+    there is none at its date, else appended to the existing note unless it already contains it.
+    progress is called as by export_archive; the notes merged before it stops are kept.
+    The notes are written straight to the storage: the caller updates what depends on them
+    (NoteRepository.invalidate(), ImageCollector.build())."""
+    result = ImportResult()
+    stored_images = {}  # name of an image in the archive: its path in the store
+    storage = get_storage()
+    records = []  # merged notes not written yet
+    with ZipFile(path) as archive:
+        image_names = {name.removeprefix(IMAGES_PREFIX) for name in archive.namelist()
+                       if name.startswith(IMAGES_PREFIX)}
+
+        def stored_image(path_in_archive: str) -> str | None:
+            name = path_in_archive.removeprefix(IMAGES_PREFIX)
+            if not path_in_archive.startswith(IMAGES_PREFIX) or name not in image_names:
+                return None
+            if name not in stored_images:
+                suffix = PurePosixPath(name).suffix
+                with archive.open(IMAGES_PREFIX + name) as stream:
+                    stored_images[name] = str(store_image(stream, suffix if IMAGE_SUFFIX_PATTERN.fullmatch(suffix)
+                                                          else ""))
+            return stored_images[name]
+
+        notes = sorted(match.groups() for match in map(NOTE_NAME_PATTERN.fullmatch, archive.namelist())
+                       if match and _is_date(match.group(1)))
+        try:
+            for done, (date, extension) in enumerate(notes, 1):
+                content = archive.read(f"{NOTES_PREFIX}{date}.{extension}").decode("utf-8")
+                html_content = markdown_to_html(content) if extension == "md" else content
+                if IMAGES_PREFIX in html_content:
+                    html_content = _replace_sources(html_content, stored_image)
+                record = storage.read(date)
+                existing_html = record.get("html_content") if record is not None else None
+                images = extract_images(html_content)
+                text = _text(html_content)
+                if not text and not images:
+                    result.unchanged += 1
+                    html_content = None
+                elif not existing_html:
+                    result.added += 1
+                elif text in _text(existing_html) and set(images) <= set(extract_images(existing_html)):
+                    result.unchanged += 1
+                    html_content = None
+                else:
+                    result.merged += 1
+                    html_content = append_html(existing_html, html_body(html_content))
+                    images = extract_images(html_content)
+                if html_content is not None:
+                    records.append({"date": date, "html_content": html_content, "images": images})
+                if len(records) >= IMPORT_BATCH_SIZE:
+                    storage.write_many(records)
+                    records = []
+                if progress is not None:
+                    progress(done, len(notes))
+        finally:
+            if records:
+                storage.write_many(records)
+    return result
+
+
+if __name__ == '__main__':
+    pass
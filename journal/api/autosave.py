@@ -0,0 +1,127 @@
+"""Contains AutosaveWriter class"""
+import threading
+from typing import Callable
+
+from journal.api.daily_note import DailyNote
+from journal.api.note_repository import NoteRepository, note_repository
+
+RETRY_DELAY = 5.0  # s before writing again the notes whose writing failed
+
+
+class AutosaveWriter:
+    """Writes notes to disk from a worker thread.
+    Notes are made available in the repository as soon as they are submitted,
+    and only the last submitted version of each note is written.
+    A note whose writing fails stays available in the repository and is written again every RETRY_DELAY s,
+    until it succeeds or a newer version is submitted; failed is called (from the worker thread) with its
+    date and the error when it starts failing."""
+
+    def __init__(self, repository: NoteRepository = note_repository,
+                 failed: Callable[[str, str], None] | None = None) -> None:
+        self.repository = repository
+        self.failed = failed
+        self.saves_requested = 0
+        self.saves_performed = 0
+        self._pending: dict[str, DailyNote | None] = {}  # None means deletion
+        self._failed: dict[str, DailyNote | None] = {}  # waiting for RETRY_DELAY before being written again
+        self._failing: set[str] = set()  # dates whose last writing failed
+        self._writing = False
+        self._closed = False
+        self._error: Exception | None = None
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self._thread.start()
+
+    def request_save(self) -> None:
+        """Counts a save request (e.g. a keystroke), whether or not it leads to a write"""
+        with self._condition:
+            self.saves_requested += 1
+
+    def submit(self, note: DailyNote) -> None:
+        """Schedules a note to be written"""
+        self.repository.stage(note)
+        self._schedule(note.date, note)
+
+    def submit_deletion(self, date: str) -> None:
+        """Schedules a note to be deleted"""
+        self.repository.stage_deletion(date)
+        self._schedule(date, None)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Writes again the notes whose writing failed, and waits until every submitted note is written.
+        Returns False on timeout, raises the last writing error if any."""
+        with self._condition:
+            self._retry()
+            self._error = None
+            done = self._condition.wait_for(lambda: not self._pending and not self._writing, timeout)
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
+        return done
+
+    def close(self) -> None:
+        """Writes pending notes and stops the worker thread"""
+        try:
+            self.flush()
+        finally:
+            with self._condition:
+                self._closed = True
+                self._condition.notify_all()
+            self._thread.join()
+
+    def _schedule(self, date: str, note: DailyNote | None) -> None:
+        """Replaces any pending version of a note and wakes the worker up"""
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("AutosaveWriter is closed")
+            self._pending.pop(date, None)
+            self._failed.pop(date, None)
+            self._pending[date] = note
+            self._condition.notify_all()
+
+    def _retry(self) -> None:
+        """Schedules the notes whose writing failed, under the condition"""
+        for date, note in self._failed.items():
+            self._pending.setdefault(date, note)
+        self._failed.clear()
+        self._condition.notify_all()
+
+    def _run(self) -> None:
+        """Worker loop"""
+        while True:
+            with self._condition:
+                if not self._condition.wait_for(lambda: self._pending or self._closed,
+                                                RETRY_DELAY if self._failed else None):
+                    self._retry()
+                    continue
+                if not self._pending:
+                    return
+                date = next(iter(self._pending))
+                note = self._pending.pop(date)
+                self._writing = True
+            try:
+                if note is None:
+                    self.repository.delete(date)
+                else:
+                    self.repository.save(note)
+            except Exception as e:
+                with self._condition:
+                    self._error = e
+                    if date not in self._pending:  # unless a newer version was submitted meanwhile
+                        self._failed[date] = note
+                    reported = date in self._failing
+                    self._failing.add(date)
+                if self.failed is not None and not reported:
+                    self.failed(date, str(e))
+            else:
+                with self._condition:
+                    self.saves_performed += 1
+                    self._failing.discard(date)
+            finally:
+                with self._condition:
+                    self._writing = False
+                    self._condition.notify_all()
+
+
+if __name__ == '__main__':
+    pass
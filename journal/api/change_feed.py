@@ -0,0 +1,71 @@
+"""Contains NoteChangeFeed class: finds the notes changed by other processes, e.g. a sync client.
+
+The feed keeps the size and modification time of each note, as listed by the storage without reading
+the notes, and updates them as a NoteListener for the writes of this process. Changes are found by
+listing the notes again and comparing, or checking only some of them: no note is read, only the changed
+ones are reloaded (NoteRepository.reload). Whether a changed note really differs is told by its content_hash."""
+import hashlib
+import threading
+from typing import Iterable
+
+from journal.api.daily_note import DailyNote, list_note_details, note_details
+from journal.api.note_repository import NoteListener
+
+
+def content_hash(html_content: str | None) -> str | None:
+    """Hash of a note content, None for no note"""
+    if html_content is None:
+        return None
+    return hashlib.blake2b(html_content.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class NoteChangeFeed(NoteListener):
+    """Dates of the notes created, modified or deleted by other processes"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._known = list_note_details()  # date: (size, modification time) after the last change seen
+
+    def changes(self, dates: Iterable[str] | None = None) -> set[str]:
+        """Dates of the notes changed by other processes since the last call, among dates only if given:
+        their notes are then checked one by one, without listing the others"""
+        if dates is not None:
+            changed = {date for date in dates if self.has_changed(date)}
+            for date in changed:
+                self._update(date)
+            return changed
+        details = list_note_details()
+        with self._lock:
+            changed = {date for date in details.keys() | self._known.keys()
+                       if details.get(date) != self._known.get(date)}
+            self._known = details
+        return changed
+
+    def has_changed(self, date: str) -> bool:
+        """True if the note of a date was changed by another process since the last call to changes()"""
+        details = note_details(date)
+        with self._lock:
+            return details != self._known.get(date)
+
+    # NoteListener interface
+    def note_saved(self, note: DailyNote) -> None:
+        self._update(note.date)
+
+    def note_deleted(self, date: str) -> None:
+        self._update(date)
+
+    def notes_deleted(self) -> None:
+        with self._lock:
+            self._known = {}
+
+    def _update(self, date: str) -> None:
+        details = note_details(date)
+        with self._lock:
+            if details is None:
+                self._known.pop(date, None)
+            else:
+                self._known[date] = details
+
+
+if __name__ == '__main__':
+    pass
@@ -1,20 +1,77 @@
 """Constants used by the API"""
-
+import os
+import re
+import sys
 from pathlib import Path
 
-from PySide6.QtCore import QStandardPaths
-
 __all__ = ['JOURNAL_FOLDER',
            'NOTES_FOLDER',
            'IMAGES_FOLDER',
-           'SETTINGS_FILE',]
+           'REVISIONS_FOLDER',
+           'SNAPSHOTS_FOLDER',
+           'SETTINGS_FILE',
+           'JOURNAL_LOG_FILE',
+           'JOURNAL_DATABASE_FILE',
+           'SEARCH_INDEX_FILE',
+           'IMAGE_REFERENCES_FILE',
+           'MANIFEST_FILE',
+           'TRACE_FILE',
+           'STATISTICS_FILE',
+           'STORAGE_BACKEND',
+           'MAX_CACHED_NOTES_BYTES',]
+
+
+
+def _documents_folder() -> Path:
+    """User documents folder, as QStandardPaths.DocumentsLocation finds it but without importing Qt"""
+    home = Path.home()
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+        buffer = ctypes.create_unicode_buffer(wintypes.MAX_PATH)
+        csidl_personal = 5  # My Documents
+        if ctypes.windll.shell32.SHGetFolderPathW(None, csidl_personal, None, 0, buffer) == 0:
+            return Path(buffer.value)
+    elif sys.platform != "darwin":
+        # XDG user directories: XDG_DOCUMENTS_DIR="$HOME/Documents" in user-dirs.dirs
+        config_folder = Path(os.environ.get("XDG_CONFIG_HOME") or home / ".config")
+        try:
+            with open(config_folder / "user-dirs.dirs", "r", encoding="utf-8") as f:
+                for line in f:
+                    match = re.match(r'\s*XDG_DOCUMENTS_DIR\s*=\s*"(.*)"', line)
+                    if match:
+                        folder = match.group(1).replace("$HOME", str(home))
+                        if Path(folder).is_absolute() and Path(folder) != home:
+                            return Path(folder)
+        except OSError:
+            pass
+    return home / "Documents"
+
 
 # Paths
-DOCUMENTS_FOLDER = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.DocumentsLocation)
-JOURNAL_FOLDER = Path(DOCUMENTS_FOLDER) / ".JOURNAL"
+DOCUMENTS_FOLDER = _documents_folder()
+# JOURNAL_FOLDER environment variable: another journal, e.g. for benchmarks
+JOURNAL_FOLDER = Path(os.environ.get("JOURNAL_FOLDER") or DOCUMENTS_FOLDER / ".JOURNAL")
 NOTES_FOLDER = JOURNAL_FOLDER / "Notes"
 IMAGES_FOLDER = JOURNAL_FOLDER / "Images"
+REVISIONS_FOLDER = JOURNAL_FOLDER / "Revisions"
+SNAPSHOTS_FOLDER = JOURNAL_FOLDER / "Snapshots"
 SETTINGS_FILE = JOURNAL_FOLDER / "settings.json"
+JOURNAL_LOG_FILE = JOURNAL_FOLDER / "journal.log"
+JOURNAL_DATABASE_FILE = JOURNAL_FOLDER / "journal.db"
+SEARCH_INDEX_FILE = JOURNAL_FOLDER / "search.db"
+IMAGE_REFERENCES_FILE = JOURNAL_FOLDER / "image_references.json"
+MANIFEST_FILE = JOURNAL_FOLDER / "manifest.json"
+TRACE_FILE = JOURNAL_FOLDER / "trace.json"
+STATISTICS_FILE = JOURNAL_FOLDER / "statistics.json"
+
+# Storage, default value of the "storage" setting:
+# "json": one file per note in NOTES_FOLDER, "log": single append-only JOURNAL_LOG_FILE,
+# "sqlite": JOURNAL_DATABASE_FILE database
+STORAGE_BACKEND = "json"
+
+# Cache
+MAX_CACHED_NOTES_BYTES = 16 * 1024 * 1024  # memory cap for note contents kept in memory
 
 
 if __name__ == '__main__':
@@ -1,18 +1,27 @@
 """Contains DailyNote class"""
-import json
-import platform
-import subprocess
+import sys
+from typing import Callable, Iterator
 
 from journal.api.constants_api import *
+from journal.api.instrumentation import timed
+from journal.api.storage import get_storage
 
 
 class DailyNote:
-    """A daily note"""
+    """A daily note.
+    html_content can be loaded lazily: if it is None and a loader is given,
+    the loader is called each time the content is accessed, so that it can be cached elsewhere."""
 
-    def __init__(self, date: str, html_content: str, images: list[str, ...] = None) -> None:
+    def __init__(self, date: str, html_content: str | None = None, images: list[str, ...] = None,
+                 size: int = 0, loader: Callable[[str], str] | None = None,
+                 mtime: float = 0.0, flags: int = 0) -> None:
         self.date = date
-        self.html_content = html_content
+        self._html_content = html_content
         self.images = images
+        self.size = size
+        self._loader = loader
+        self.mtime = mtime  # modification time of the note in the storage, 0 if unknown
+        self.flags = flags  # see journal.api.manifest
 
     def __str__(self) -> str:
         return f"Note {self.date}: {self.html_content:.25}{'...' if len(self.html_content) > 25 else ''}"
@@ -20,40 +29,112 @@ class DailyNote:
     def __repr__(self) -> str:
         return f"Note {self.date}"
 
+    @property
+    def html_content(self) -> str:
+        """Note content, loaded through the loader if necessary"""
+        if self._html_content is None and self._loader is not None:
+            return self._loader(self.date)
+        return self._html_content
+
+    @html_content.setter
+    def html_content(self, html_content: str) -> None:
+        self._html_content = html_content
+
+    @classmethod
+    def from_record(cls, record: dict, size: int = 0) -> "DailyNote":
+        """Creates a note from a storage record"""
+        return cls(record.get("date"), record.get("html_content"), record.get("images"), size=size)
+
+    def to_record(self) -> dict:
+        """Returns the storage record of the note"""
+        return {"date": self.date, "html_content": self.html_content, "images": self.images}
+
+    def revisions(self) -> list:
+        """Saved versions of the note (journal.api.revisions.Revision), oldest first"""
+        from journal.api.revisions import revision_store  # revisions depends on this module
+        return revision_store.revisions(self.date)
+
+    def restore_revision(self, number: int) -> None:
+        """Replaces the note content with one of its revisions, save_note keeps it"""
+        from journal.api.revisions import revision_store
+        self.html_content = revision_store.html_content(self.date, number)
+
+    @timed()
     def delete_note(self) -> None:
-        """Deletes a note file"""
-        (NOTES_FOLDER / f"{self.date}.json").unlink(missing_ok=True)
+        """Deletes the note from the storage"""
+        get_storage().delete(self.date)
 
+    @timed()
     def save_note(self) -> None:
-        """Saves note to a json file"""
-        NOTES_FOLDER.mkdir(parents=True, exist_ok=True)
-        note_path = NOTES_FOLDER / f"{self.date}.json"
-        note = {"date": self.date, "html_content": self.html_content, "images": self.images}
-        with open(note_path, "w", encoding="utf-8") as f:
-            json.dump(note, f, indent=4)
+        """Saves the note to the storage"""
+        storage = get_storage()
+        self.size = storage.write(self.to_record())
+        details = storage.note_details(self.date)
+        self.mtime = details[1] if details is not None else 0.0
 
 
-def get_notes() -> dict[str, DailyNote]:
-    """Creates a list with all non-empty daily notes"""
-    # Creating and hiding folders if necessary
+def create_journal_folders() -> None:
+    """Creates and hides journal folders if necessary"""
+    if NOTES_FOLDER.is_dir():
+        return
     NOTES_FOLDER.mkdir(parents=True, exist_ok=True)
-    if platform.system() == "Windows":
+    if sys.platform == "win32":
+        import subprocess
         subprocess.run(['attrib', '+H', str(JOURNAL_FOLDER)])
 
-    # Getting notes
-    notes = {}
-    for note_file in NOTES_FOLDER.glob("*.json"):
-        with open(note_file, "r", encoding="utf-8") as f:
-            note_data = json.load(f)
-        date = note_data.get("date")
-        notes[date] = DailyNote(date, note_data.get("html_content"), note_data.get("images"))
-    return notes
+
+@timed()
+def list_notes() -> dict[str, int]:
+    """Lists existing notes without reading them: {date: size}"""
+    create_journal_folders()
+    return get_storage().list_notes()
+
+
+@timed()
+def list_note_details() -> dict[str, tuple[int, float]]:
+    """Lists existing notes without reading them: {date: (size, modification time or 0)}"""
+    create_journal_folders()
+    return get_storage().list_details()
+
+
+def note_details(date: str) -> tuple[int, float] | None:
+    """Size and modification time (or 0) of a note without reading it, None if there is no note for this date"""
+    return get_storage().note_details(date)
+
+
+def storage_stamp() -> list | None:
+    """Value changing whenever notes are modified, None if the storage has none"""
+    return get_storage().stamp()
+
+
+@timed()
+def load_note(date: str) -> DailyNote | None:
+    """Reads a single note, None if there is no note for this date"""
+    record = get_storage().read(date)
+    if record is None:
+        return None
+    record.setdefault("date", date)
+    return DailyNote.from_record(record)
+
+
+@timed()
+def get_notes(start: str = "0000-00-00", end: str = "9999-99-99") -> dict[str, DailyNote]:
+    """Creates a list with all non-empty daily notes, from start to end dates (included)"""
+    create_journal_folders()
+    return {record["date"]: DailyNote.from_record(record) for record in get_storage().read_range(start, end)}
+
+
+def read_notes(start: str = "0000-00-00", end: str = "9999-99-99") -> Iterator[DailyNote]:
+    """Notes from start to end (included), read one at a time in date order"""
+    create_journal_folders()
+    for record in get_storage().read_range(start, end):
+        yield DailyNote.from_record(record)
 
 
+@timed()
 def delete_all_notes() -> None:
-    """Deletes all note files"""
-    for note in NOTES_FOLDER.glob("*.json"):
-        note.unlink()
+    """Deletes all notes"""
+    get_storage().delete_all()
 
 
 if __name__ == '__main__':
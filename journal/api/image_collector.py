@@ -0,0 +1,231 @@
+"""Contains ImageCollector class: deletes the images no note uses anymore.
+
+The collector keeps the list of the images of each note (IMAGE_REFERENCES_FILE), updated as a
+NoteListener of the repository. An image becomes an orphan when no note uses it anymore, and is
+deleted by a background sweep once it has been an orphan for the grace period (so that an
+undone deletion or a note restored from elsewhere can still find it), unless a revision of a note
+still uses it (journal.api.revisions). Each sweep first thins the histories of the notes by age,
+so that the images of old revisions are given up even for notes no longer edited."""
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Iterable
+
+from journal.api.constants_api import IMAGES_FOLDER, IMAGE_REFERENCES_FILE
+from journal.api.daily_note import DailyNote, get_notes
+from journal.api.images_functions import delete_image, extract_images, is_stored_image
+from journal.api.note_repository import NoteListener
+from journal.api.revisions import RevisionStore, revision_store
+
+GRACE_PERIOD = 7 * 24 * 3600  # seconds an image stays unused before being deleted
+SWEEP_INTERVAL = 3600  # seconds between two sweeps
+SWEEP_PAUSE = 0.002  # seconds between two files handled by a sweep, so that it never competes with the UI
+
+
+class ImageCollector(NoteListener):
+    """Reference index from images to the notes using them, and garbage collector of unused images"""
+
+    def __init__(self, path: Path = IMAGE_REFERENCES_FILE, grace_period: float = GRACE_PERIOD,
+                 revisions: RevisionStore = revision_store) -> None:
+        self.path = path
+        self.grace_period = grace_period
+        self.revisions = revisions
+        self._lock = threading.RLock()
+        self._note_images: dict[str, list[str]] = {}  # date: images of the note
+        self._references: dict[str, set[str]] = {}  # image: dates of the notes using it
+        self._orphans: dict[str, float] = {}  # image: time since when no note uses it
+        self._built = False
+        self._updated_dates: set[str] | None = None  # dates updated while the index is built
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._load()
+
+    def references(self, image: str) -> set[str]:
+        """Dates of the notes using an image"""
+        with self._lock:
+            return set(self._references.get(str(Path(image)), ()))
+
+    # region Reference index
+    def build(self, notes: Iterable[DailyNote]) -> None:
+        """Builds the reference index from all notes"""
+        with self._lock:
+            self._updated_dates = set()
+        note_images = {note.date: _note_images(note) for note in notes}
+        with self._lock:
+            for date in self._updated_dates:
+                note_images.pop(date, None)
+                if date in self._note_images:
+                    note_images[date] = self._note_images[date]
+            self._updated_dates = None
+            self._note_images = {date: images for date, images in note_images.items() if images}
+            self._references = {}
+            for date, images in self._note_images.items():
+                for image in images:
+                    self._references.setdefault(image, set()).add(date)
+            self._orphans = {image: since for image, since in self._orphans.items() if image not in self._references}
+            self._built = True
+            self._save()
+
+    def note_saved(self, note: DailyNote) -> None:
+        self._update(note.date, _note_images(note))
+
+    def note_deleted(self, date: str) -> None:
+        self._update(date, [])
+
+    def notes_deleted(self) -> None:
+        with self._lock:
+            for date in list(self._note_images):
+                self._update(date, [], save=False)
+            self._save()
+
+    def _update(self, date: str, images: list[str], save: bool = True) -> None:
+        """Updates the images of a note"""
+        with self._lock:
+            if self._updated_dates is not None:
+                self._updated_dates.add(date)
+            old_images = self._note_images.get(date, [])
+            if images == old_images:
+                return
+            now = time.time()
+            for image in set(old_images) - set(images):
+                dates = self._references.get(image, set())
+                dates.discard(date)
+                if not dates:
+                    self._references.pop(image, None)
+                    self._orphans[image] = now
+            for image in set(images) - set(old_images):
+                self._references.setdefault(image, set()).add(date)
+                self._orphans.pop(image, None)
+            if images:
+                self._note_images[date] = images
+            else:
+                self._note_images.pop(date, None)
+            if save:
+                self._save()
+    # endregion
+
+    # region Garbage collection
+    def sweep(self, scan: bool = False, now: float | None = None) -> int:
+        """Thins the revisions out, then deletes the images unused for the grace period, returns their number.
+        The images used by revisions are kept, and deleted by a later sweep once their revisions are thinned out.
+        If scan is True, the Images folder is first scanned for files never referenced,
+        which become orphans from now on."""
+        now = time.time() if now is None else now
+        if scan:
+            for image in _stored_images():
+                if self._stopped.is_set():
+                    return 0
+                with self._lock:
+                    if image not in self._references and image not in self._orphans:
+                        self._orphans[image] = now
+                time.sleep(SWEEP_PAUSE)
+
+        for date in self.revisions.dates():
+            if self._stopped.is_set():
+                return 0
+            self.revisions.thin(date, now)
+            time.sleep(SWEEP_PAUSE)
+
+        with self._lock:
+            expired = [image for image, since in self._orphans.items() if now - since >= self.grace_period]
+        if expired:
+            retained = self.revisions.images()
+            expired = [image for image in expired if image not in retained]
+        deleted = 0
+        for image in expired:
+            if self._stopped.is_set():
+                break
+            with self._lock:
+                if image in self._references or image not in self._orphans:
+                    continue
+                if is_stored_image(image):
+                    delete_image(image)
+                    deleted += 1
+                del self._orphans[image]
+            time.sleep(SWEEP_PAUSE)
+        with self._lock:
+            self._save()
+        return deleted
+
+    def start(self) -> None:
+        """Starts the background sweeps, building the reference index first if necessary"""
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="image collector", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the background sweeps"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        """Background sweeps loop"""
+        lower_thread_priority()
+        if not self._built:
+            self.build(get_notes().values())
+        scan = True  # the Images folder is scanned once per session
+        while not self._stopped.wait(0 if scan else SWEEP_INTERVAL):
+            self.sweep(scan=scan)
+            scan = False
+    # endregion
+
+    # region Persistence
+    def _load(self) -> None:
+        """Reads the reference index file"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        self._note_images = data.get("notes", {})
+        self._orphans = data.get("orphans", {})
+        for date, images in self._note_images.items():
+            for image in images:
+                self._references.setdefault(image, set()).add(date)
+        self._built = True
+
+    def _save(self) -> None:
+        """Writes the reference index file"""
+        if not self._built:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.path.with_suffix(".tmp")
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump({"notes": self._note_images, "orphans": self._orphans}, f)
+        os.replace(temporary_path, self.path)
+    # endregion
+
+
+def _note_images(note: DailyNote) -> list[str]:
+    """Images used by a note, from DailyNote.images or else from its content"""
+    images = note.images if note.images is not None else extract_images(note.html_content)
+    return [str(Path(image)) for image in images]
+
+
+def _stored_images():
+    """Yields the paths of the files of the Images folder"""
+    if not IMAGES_FOLDER.is_dir():
+        return
+    for shard in os.scandir(IMAGES_FOLDER):
+        if shard.is_dir():
+            for entry in os.scandir(shard.path):
+                if entry.is_file() and not entry.name.startswith("."):
+                    yield str(Path(entry.path))
+
+
+def lower_thread_priority() -> None:
+    """Gives the current thread the lowest scheduling priority where possible (Linux)"""
+    if sys.platform.startswith("linux"):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except OSError:
+            pass
+
+
+if __name__ == '__main__':
+    pass
@@ -1,19 +1,199 @@
-"""Functions to manage images"""
+"""Functions to manage images.
+Images are stored by content: IMAGES_FOLDER / <first 2 hash characters> / <sha256 hash><extension>,
+so that an image inserted twice is stored once and two different images never overwrite each other."""
+import hashlib
+import html
+import os
+import re
 import shutil
+import sys
+import tempfile
 from pathlib import Path
+from typing import BinaryIO, Callable
 
-from journal.api.constants_api import IMAGES_FOLDER
+from journal.api.constants_api import IMAGES_FOLDER, JOURNAL_FOLDER
+from journal.api.daily_note import DailyNote
+from journal.api.note_repository import NoteRepository, note_repository
 
+HASH_CHUNK_SIZE = 1024 * 1024
+FICLONE = 0x40049409  # Linux ioctl cloning a file (reflink) on copy-on-write filesystems
+IMG_SRC_PATTERN = re.compile(r"""<img\b[^>]*?\bsrc\s*=\s*(?:"([^"]*)"|'([^']*)')""", re.IGNORECASE)
+A_HREF_PATTERN = re.compile(r"""<a\b[^>]*?\bhref\s*=\s*(?:"([^"]*)"|'([^']*)')""", re.IGNORECASE)
 
-def copy_image(source_path: str | Path) -> Path:
-    """Copies an image to the application Images folder"""
-    destination_path = IMAGES_FOLDER / Path(source_path).name
+
+def hash_file(path: str | Path, progress: Callable[[int], None] | None = None) -> str:
+    """sha256 hash of a file, read by chunks. progress is called with the size of each chunk read,
+    and may raise an exception to stop."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+            if progress is not None:
+                progress(len(chunk))
+    return digest.hexdigest()
+
+
+def stored_image_path(digest: str, suffix: str) -> Path:
+    """Path of an image in the store from its hash and extension"""
+    return IMAGES_FOLDER / digest[:2] / f"{digest}{suffix.lower()}"
+
+
+def copy_image(source_path: str | Path, progress: Callable[[int], None] | None = None) -> Path:
+    """Copies an image to the application Images folder, unless it is already there.
+    progress is called as by hash_file."""
+    source_path = Path(source_path)
+    destination_path = stored_image_path(hash_file(source_path, progress), source_path.suffix)
+    if not destination_path.exists():
+        destination_path.parent.mkdir(parents=True, exist_ok=True)
+        link_or_copy(source_path, destination_path)
+    return destination_path
+
+
+def store_image(stream: BinaryIO, suffix: str) -> Path:
+    """Stores an image read from a binary stream, unless it is already there"""
     IMAGES_FOLDER.mkdir(parents=True, exist_ok=True)
-    shutil.copy(source_path, destination_path)
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=IMAGES_FOLDER, prefix=".", suffix=".tmp", delete=False) as f:
+        try:
+            while chunk := stream.read(HASH_CHUNK_SIZE):
+                digest.update(chunk)
+                f.write(chunk)
+        except BaseException:
+            f.close()
+            os.unlink(f.name)
+            raise
+    destination_path = stored_image_path(digest.hexdigest(), suffix)
+    if destination_path.exists():
+        os.unlink(f.name)
+    else:
+        destination_path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(f.name, destination_path)
     return destination_path
 
 
-def delete_image(image: str) -> None:
+def delete_image(image: str | Path) -> None:
     """Deletes an image from the application Images folder"""
-    # TODO
-    pass
+    image_path = Path(image)
+    if not is_stored_image(image_path):
+        raise ValueError(f"{image} is not in {IMAGES_FOLDER}")
+    image_path.unlink(missing_ok=True)
+
+
+def display_variant_path(image: str | Path, width: int, suffix: str) -> Path:
+    """Path of the copy of a stored image scaled down to width, next to it"""
+    image = Path(image)
+    return image.with_name(f"{image.stem}_{width}w{suffix}")
+
+
+def extract_images(html_content: str) -> list[str]:
+    """Paths of the images of a note html content, without duplicates: the sources of the img tags,
+    and the stored images linked by a tags (the originals of display variants)"""
+    sources = (html.unescape(double_quoted or single_quoted).removeprefix("file://")
+               for double_quoted, single_quoted in IMG_SRC_PATTERN.findall(html_content or ""))
+    links = (html.unescape(double_quoted or single_quoted).removeprefix("file://")
+             for double_quoted, single_quoted in A_HREF_PATTERN.findall(html_content or ""))
+    return list(dict.fromkeys([*sources, *(link for link in links if is_stored_image(link))]))
+
+
+def is_stored_image(image: str | Path) -> bool:
+    """True if a path is in the application Images folder"""
+    return Path(image).parent.parent == IMAGES_FOLDER
+
+
+def legacy_images() -> list[Path]:
+    """Images stored by name directly in IMAGES_FOLDER, before images were stored by content"""
+    if not IMAGES_FOLDER.is_dir():
+        return []
+    return [Path(entry.path) for entry in os.scandir(IMAGES_FOLDER)
+            if entry.is_file() and not entry.name.startswith(".")]
+
+
+def migrate_legacy_images(repository: NoteRepository = note_repository,
+                          progress: Callable[[int, int], None] | None = None) -> int:
+    """Moves the legacy images to the store, and rewrites the notes using them through the repository.
+    Returns the number of migrated images. progress is called with the numbers of notes checked and
+    to check."""
+    legacy_paths = legacy_images()
+    if not legacy_paths:
+        return 0
+
+    new_paths = {}  # old path as written in notes: new path
+    for legacy_image in legacy_paths:
+        new_path = str(copy_image(legacy_image))
+        new_paths[str(legacy_image)] = new_paths[legacy_image.as_posix()] = new_path
+
+    dates = repository.dates()
+    used = set()  # paths of the images of the notes once rewritten
+    for done, date in enumerate(dates, 1):
+        old_html_content = repository.get_html(date)
+        note = repository.get(date)
+        if old_html_content is not None and note is not None:
+            html_content = replace_images(old_html_content, new_paths)
+            images = [new_paths.get(image, image) for image in note.images] if note.images else note.images
+            if html_content != old_html_content or images != note.images:
+                repository.save(DailyNote(date, html_content, images))
+            used.update(extract_images(html_content), images or ())
+        if progress is not None:
+            progress(done, len(dates))
+
+    # Legacy files are only deleted once no note uses them anymore
+    for legacy_image in legacy_paths:
+        if str(legacy_image) not in used and legacy_image.as_posix() not in used:
+            legacy_image.unlink()
+    return len(legacy_paths)
+
+
+def replace_images(html_content: str, new_paths: dict[str, str]) -> str:
+    """Html content with the sources of the img tags and the targets of the a tags replaced by new_paths.
+    The paths are compared unescaped, as extract_images gives them: Qt writes & as &amp; for example."""
+
+    def replace(match: re.Match) -> str:
+        group = 1 if match.group(1) is not None else 2
+        path = html.unescape(match.group(group))
+        new_path = new_paths.get(path.removeprefix("file://"))
+        if new_path is None:
+            return match.group(0)
+        if path.startswith("file://"):
+            new_path = f"file://{new_path}"
+        start, end = match.start(group) - match.start(), match.end(group) - match.start()
+        return match.group(0)[:start] + html.escape(new_path) + match.group(0)[end:]
+
+    return A_HREF_PATTERN.sub(replace, IMG_SRC_PATTERN.sub(replace, html_content))
+
+
+def link_or_copy(source_path: Path, destination_path: Path) -> None:
+    """Creates destination_path with the content of source_path without duplicating data if possible:
+    reflink (copy-on-write clone), then hardlink when on the same filesystem, then copy.
+    Only the files of the journal are hardlinked: they are never modified, whereas a file of the user
+    edited in place would change the stored image (and the snapshots linking it) too."""
+    temporary_path = destination_path.with_name(f".{destination_path.name}.tmp")
+    temporary_path.unlink(missing_ok=True)
+    if not _reflink(source_path, temporary_path) and not _hardlink(source_path, temporary_path):
+        shutil.copyfile(source_path, temporary_path)
+    os.replace(temporary_path, destination_path)
+
+
+def _hardlink(source_path: Path, destination_path: Path) -> bool:
+    """Hardlinks a file of the journal, True if done"""
+    if not Path(source_path).resolve().is_relative_to(JOURNAL_FOLDER.resolve()):
+        return False
+    try:
+        os.link(source_path, destination_path)
+        return True
+    except OSError:
+        return False
+
+
+def _reflink(source_path: Path, destination_path: Path) -> bool:
+    """Clones a file on copy-on-write filesystems (Linux only), True if done"""
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+    with open(source_path, "rb") as source, open(destination_path, "wb") as destination:
+        try:
+            fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+            return True
+        except OSError:
+            pass
+    destination_path.unlink()
+    return False
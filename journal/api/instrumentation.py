@@ -0,0 +1,130 @@
+"""Opt-in timing of the hot paths.
+
+Instrumentation is enabled by the JOURNAL_PROFILE environment variable (any non-empty value but "0")
+or the "profiling" setting. When it is disabled, timed() returns functions unchanged, at no cost.
+When enabled, each call of a timed function is added to the histogram of its name and recorded as
+a trace event, exported in the Trace Event Format (viewable in chrome://tracing or ui.perfetto.dev)."""
+import json
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+from pathlib import Path
+from typing import Callable
+
+from journal.api.constants_api import TRACE_FILE
+from journal.api.settings import get_setting
+
+MAX_TRACE_EVENTS = 100_000  # most recent events kept for the trace
+BUCKETS = 32  # histogram buckets: [0, 1 us[, [1, 2 us[, [2, 4 us[... up to ~35 min
+
+enabled = os.environ.get("JOURNAL_PROFILE", "0") not in ("", "0") or bool(get_setting("profiling", False))
+logger = None  # logger of the reports, only when enabled: logging is slow to import for the command line
+if enabled:
+    import logging
+    logger = logging.getLogger("journal.instrumentation")
+    if not logger.handlers:
+        logger.addHandler(logging.StreamHandler())
+        logger.setLevel(logging.INFO)
+
+_lock = threading.Lock()
+_histograms: dict[str, "Histogram"] = {}
+_events: deque = deque(maxlen=MAX_TRACE_EVENTS)
+_start = time.perf_counter()
+
+
+class Histogram:
+    """Distribution of durations in power of 2 microseconds buckets"""
+
+    def __init__(self) -> None:
+        self.buckets = [0] * BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, duration: float) -> None:
+        """Adds a duration in seconds"""
+        microseconds = int(duration * 1_000_000)
+        self.buckets[min(microseconds.bit_length(), BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += duration
+        self.maximum = max(self.maximum, duration)
+
+    def percentile(self, percent: float) -> float:
+        """Upper bound in seconds of the bucket holding the given percentile"""
+        rank = self.count * percent / 100
+        cumulated = 0
+        for i, count in enumerate(self.buckets):
+            cumulated += count
+            if count and cumulated >= rank:
+                return min((1 << i) / 1_000_000, self.maximum)
+        return self.maximum
+
+
+def timed(name: str | None = None) -> Callable[[Callable], Callable]:
+    """Decorator timing each call of a function when instrumentation is enabled"""
+    def decorator(f: Callable) -> Callable:
+        if not enabled:
+            return f
+        event_name = name or f.__qualname__
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                record(event_name, start, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def record(name: str, start: float, duration: float, **arguments) -> None:
+    """Records a duration measured from a time.perf_counter() start"""
+    event = {"name": name, "ph": "X", "ts": (start - _start) * 1_000_000, "dur": duration * 1_000_000,
+             "pid": os.getpid(), "tid": threading.get_ident()}
+    if arguments:
+        event["args"] = arguments
+    with _lock:
+        _histograms.setdefault(name, Histogram()).add(duration)
+        _events.append(event)
+
+
+def record_instant(name: str, thread: int | None = None, **arguments) -> None:
+    """Records an instant event on a thread (the current one by default), e.g. a stall of the event loop"""
+    with _lock:
+        _events.append({"name": name, "ph": "i", "s": "t", "ts": (time.perf_counter() - _start) * 1_000_000,
+                        "pid": os.getpid(), "tid": thread or threading.get_ident(), "args": arguments})
+
+
+def histograms() -> dict[str, Histogram]:
+    """Histograms by name"""
+    with _lock:
+        return dict(_histograms)
+
+
+def summary() -> str:
+    """Text table of the histograms, slowest total first"""
+    lines = [f"{'name':<40}{'calls':>8}{'total ms':>11}{'mean ms':>10}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}"]
+    for name, histogram in sorted(histograms().items(), key=lambda item: -item[1].total):
+        lines.append(f"{name:<40}{histogram.count:>8}{histogram.total * 1000:>11.1f}"
+                     f"{histogram.total / histogram.count * 1000:>10.2f}{histogram.percentile(50) * 1000:>9.2f}"
+                     f"{histogram.percentile(99) * 1000:>9.2f}{histogram.maximum * 1000:>9.2f}")
+    return "\n".join(lines)
+
+
+def export_trace(path: Path = TRACE_FILE) -> Path:
+    """Writes the recorded events in the Trace Event Format, returns the path written"""
+    with _lock:
+        events = list(_events)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return path
+
+
+if __name__ == '__main__':
+    pass
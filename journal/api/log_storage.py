@@ -0,0 +1,199 @@
+"""Contains LogStorage class: all notes in a single append-only file.
+
+Each record is a fixed-size header followed by a json payload (a note stored as defined by note_format):
+    magic (4 bytes) | payload length (uint32) | payload crc32 (uint32) | date (10 bytes) | flags (uint8)
+A deleted note is a record with the DELETED flag and an empty payload.
+Only the header of each record is read when the file is opened, to build the date -> offset index."""
+import json
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+
+from journal.api import note_format
+from journal.api.constants_api import JOURNAL_LOG_FILE
+from journal.api.storage import NoteStorage
+
+MAGIC = b"JRN1"
+HEADER = struct.Struct("<4sII10sB")
+DELETED = 1
+
+COMPACTION_MIN_DEAD_BYTES = 1024 * 1024  # superseded bytes before a compaction is considered
+COMPACTION_DEAD_RATIO = 0.5  # share of superseded bytes in the file triggering a compaction
+
+
+class LogStorage(NoteStorage):
+    """Append-only log of note records with an in-memory offset index"""
+    name = "log"
+
+    def __init__(self, path: Path = JOURNAL_LOG_FILE) -> None:
+        self.path = path
+        self._lock = threading.RLock()
+        self._index: dict[str, tuple[int, int]] = {}  # date: (payload offset, payload length)
+        self._size = 0
+        self._dead_bytes = 0
+        self._compaction: threading.Thread | None = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a+b")
+        self._load_index()
+
+    # region NoteStorage interface
+    def list_notes(self) -> dict[str, int]:
+        with self._lock:
+            return {date: length for date, (_, length) in self._index.items()}
+
+    def note_details(self, date: str) -> tuple[int, float] | None:
+        with self._lock:
+            return (self._index[date][1], 0.0) if date in self._index else None
+
+    def stamp(self) -> list:
+        stat = os.stat(self.path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def read(self, date: str) -> dict | None:
+        with self._lock:
+            if date not in self._index:
+                return None
+            offset, length = self._index[date]
+            self._file.seek(offset - HEADER.size)
+            data = self._file.read(HEADER.size + length)
+        _, _, crc, _, _ = HEADER.unpack_from(data)
+        payload = data[HEADER.size:]
+        if zlib.crc32(payload) != crc:
+            raise OSError(f"Corrupted record for {date} in {self.path}")
+        return note_format.unpack(json.loads(payload))
+
+    def write(self, record: dict) -> int:
+        payload = json.dumps(note_format.pack(record), separators=(",", ":")).encode("utf-8")
+        self._append(record["date"], payload, 0)
+        return len(payload)
+
+    def delete(self, date: str) -> None:
+        with self._lock:
+            if date in self._index:
+                self._append(date, b"", DELETED)
+
+    def delete_all(self) -> None:
+        self._wait_for_compaction()
+        with self._lock:
+            self._file.truncate(0)
+            self._sync()
+            self._index.clear()
+            self._size = self._dead_bytes = 0
+
+    def close(self) -> None:
+        self._wait_for_compaction()
+        with self._lock:
+            self._file.close()
+    # endregion
+
+    # region Log management
+    def _load_index(self) -> None:
+        """Builds the index from record headers, dropping a torn record at the end of the file"""
+        file_size = self._file.seek(0, os.SEEK_END)
+        offset = 0
+        while offset + HEADER.size <= file_size:
+            self._file.seek(offset)
+            magic, length, _, raw_date, flags = HEADER.unpack(self._file.read(HEADER.size))
+            if magic != MAGIC or offset + HEADER.size + length > file_size:
+                break
+            self._index_record(raw_date.decode("ascii"), offset, length, flags)
+            offset += HEADER.size + length
+        if offset != file_size:
+            self._file.truncate(offset)
+            self._sync()
+        self._size = offset
+
+    def _index_record(self, date: str, offset: int, length: int, flags: int) -> None:
+        """Updates the index with a record starting at offset"""
+        previous = self._index.pop(date, None)
+        if previous is not None:
+            self._dead_bytes += HEADER.size + previous[1]
+        if flags & DELETED:
+            self._dead_bytes += HEADER.size + length
+        else:
+            self._index[date] = (offset + HEADER.size, length)
+
+    def _append(self, date: str, payload: bytes, flags: int) -> None:
+        """Appends a record in a single write and makes it durable before indexing it"""
+        header = HEADER.pack(MAGIC, len(payload), zlib.crc32(payload), date.encode("ascii"), flags)
+        with self._lock:
+            self._file.write(header + payload)
+            self._sync()
+            self._index_record(date, self._size, len(payload), flags)
+            self._size += HEADER.size + len(payload)
+            if self._needs_compaction():
+                self._compaction = threading.Thread(target=self.compact, name="log compaction", daemon=True)
+                self._compaction.start()
+
+    def _sync(self) -> None:
+        """Flushes the log file to disk"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _needs_compaction(self) -> bool:
+        """True if enough superseded records have accumulated and no compaction is running"""
+        return (self._dead_bytes >= COMPACTION_MIN_DEAD_BYTES
+                and self._dead_bytes >= COMPACTION_DEAD_RATIO * self._size
+                and (self._compaction is None or not self._compaction.is_alive()))
+
+    def _wait_for_compaction(self) -> None:
+        """Waits for the end of a running compaction"""
+        compaction = self._compaction
+        if compaction is not None and compaction is not threading.current_thread():
+            compaction.join()
+
+    def compact(self) -> None:
+        """Rewrites the log without superseded records.
+        Live records are copied without holding the lock, then the records appended meanwhile
+        are copied and the new file replaces the old one."""
+        compacted_path = self.path.with_name(f"{self.path.name}.compact")
+        with self._lock:
+            live_records = sorted(self._index.values())
+            copied_size = self._size
+        index = {}
+        with open(compacted_path, "wb") as compacted:
+            for offset, length in live_records:
+                with self._lock:
+                    self._file.seek(offset - HEADER.size)
+                    record = self._file.read(HEADER.size + length)
+                date = HEADER.unpack_from(record)[3].decode("ascii")
+                index[date] = (compacted.tell() + HEADER.size, length)
+                compacted.write(record)
+
+            with self._lock:
+                self._file.seek(copied_size)
+                tail = self._file.read(self._size - copied_size)
+                tail_start = compacted.tell()
+                compacted.write(tail)
+                compacted.flush()
+                os.fsync(compacted.fileno())
+
+                self._file.close()
+                os.replace(compacted_path, self.path)
+                _sync_folder(self.path.parent)
+                self._file = open(self.path, "a+b")
+                self._index = index
+                self._dead_bytes = 0
+                offset = 0
+                while offset < len(tail):
+                    _, length, _, raw_date, flags = HEADER.unpack_from(tail, offset)
+                    self._index_record(raw_date.decode("ascii"), tail_start + offset, length, flags)
+                    offset += HEADER.size + length
+                self._size = tail_start + len(tail)
+    # endregion
+
+
+def _sync_folder(folder: Path) -> None:
+    """Makes a rename durable (not possible on Windows, where it is not needed)"""
+    if os.name == "posix":
+        fd = os.open(folder, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,52 @@
+"""Contains Manifest class: persisted list of the existing notes.
+
+The manifest lets the application know which notes exist without listing the storage:
+{"stamp": <storage stamp>, "notes": {date: [size, modification time, flags]}}.
+It is only trusted if the stamp of the storage did not change since it was written."""
+import json
+import os
+from pathlib import Path
+
+from journal.api.constants_api import MANIFEST_FILE
+
+# Flags
+HAS_IMAGES = 1
+
+
+class Manifest:
+    """Manifest file"""
+
+    def __init__(self, path: Path = MANIFEST_FILE) -> None:
+        self.path = path
+
+    def load(self, stamp: list) -> dict[str, list] | None:
+        """Notes of the manifest, None if there is no manifest or if it is stale"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if manifest.get("stamp") != stamp:
+            return None
+        return manifest.get("notes", {})
+
+    def save(self, notes: dict[str, list], stamp: list) -> None:
+        """Writes the manifest"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.path.with_suffix(".tmp")
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump({"stamp": stamp, "notes": notes}, f, separators=(",", ":"))
+        os.replace(temporary_path, self.path)
+
+    def delete(self) -> None:
+        """Deletes the manifest"""
+        self.path.unlink(missing_ok=True)
+
+
+def note_flags(images: list[str] | None) -> int:
+    """Flags of a note"""
+    return HAS_IMAGES if images else 0
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,199 @@
+"""Conversion of the notes between html (as written by QTextEdit) and Markdown.
+Bold, italic, strikethrough, headings, lists, links and images have a Markdown syntax; underlined text
+is kept as <u> tags and font sizes are lost. markdown_to_html reads back what html_to_markdown writes."""
+import html
+import re
+from html.parser import HTMLParser
+
+from journal.api.text_functions import NOTE_TEMPLATE
+
+HEADINGS = {"h1": "# ", "h2": "## ", "h3": "### ", "h4": "#### ", "h5": "##### ", "h6": "###### "}
+ESCAPED_CHARACTERS = re.compile(r"([\\`*_\[\]~<>])")
+LINE_START_MARKUP = re.compile(r"^(\s*)(?:(#|-|\+)|(\d+)\.)(?=\s)")
+INLINE_PATTERN = re.compile(r"""
+    \\(?P<escaped>[\\`*_\[\]~<>#+.-])
+    | \[!\[(?P<linked_alt>[^\]]*)\]\((?P<linked_src>[^)\s]*)\)\]\((?P<linked_href>[^)\s]*)\)
+    | !\[(?P<alt>[^\]]*)\]\((?P<src>[^)\s]*)\)
+    | \[(?P<text>(?:\\.|[^\]\\])*)\]\((?P<href>[^)\s]*)\)
+    | \*\*(?P<bold>(?:\\.|[^\\])+?)\*\*
+    | \*(?P<italic>(?:\\.|[^\\*])+?)\*
+    | ~~(?P<strikethrough>(?:\\.|[^\\])+?)~~
+    | <u>(?P<underline>(?:\\.|[^\\])+?)</u>
+""", re.VERBOSE | re.DOTALL)
+
+
+class _MarkdownWriter(HTMLParser):
+    """Collects the Markdown of a html note, one block at a time"""
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.blocks = []
+        self._inline = [[]]  # buffers of the inline elements being read, the block first
+        self._closing = []  # (markup opening, markup closing) of the inline elements being read
+        self._prefix = ""  # markup starting the current block
+        self._lists = []  # "ul" or "ol" of the lists being read
+        self._list_id = 0  # number of the list being read, counting all the lists of the note
+        self._ignored = 0  # depth in head, style or script tags
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        attributes = dict(attrs)
+        if tag in ("head", "style", "script"):
+            self._ignored += 1
+        elif tag in ("ul", "ol"):
+            self._end_block()
+            self._lists.append(tag)
+            self._list_id += 1
+        elif tag in ("p", "li", "div", *HEADINGS):
+            self._end_block()
+            if tag == "li":
+                indent = "  " * (len(self._lists) - 1)
+                self._prefix = indent + ("1. " if self._lists and self._lists[-1] == "ol" else "- ")
+            else:
+                self._prefix = HEADINGS.get(tag, "")
+        elif tag == "br":
+            self._inline[-1].append("  \n")
+        elif tag == "img":
+            self._inline[-1].append(f"![]({_escape_url(attributes.get('src', ''))})")
+        elif tag in ("span", "a", "b", "strong", "i", "em", "u", "s", "del"):
+            self._inline.append([])
+            self._closing.append(_inline_markup(tag, attributes))
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in ("head", "style", "script"):
+            self._ignored = max(0, self._ignored - 1)
+        elif tag in ("ul", "ol"):
+            self._end_block()
+            if self._lists:
+                self._lists.pop()
+        elif tag in ("p", "li", "div", *HEADINGS):
+            self._end_block()
+        elif tag in ("span", "a", "b", "strong", "i", "em", "u", "s", "del") and len(self._inline) > 1:
+            content = "".join(self._inline.pop())
+            opening, closing = self._closing.pop()
+            core = content.strip()
+            if core and (opening or closing):
+                leading = content[:len(content) - len(content.lstrip())]
+                trailing = content[len(content.rstrip()):]
+                content = f"{leading}{opening}{core}{closing}{trailing}"
+            self._inline[-1].append(content)
+
+    def handle_data(self, data: str) -> None:
+        if not self._ignored:
+            self._inline[-1].append(ESCAPED_CHARACTERS.sub(r"\\\1", data.replace("\n", " ")))
+
+    def close(self) -> None:
+        super().close()
+        self._end_block()
+
+    def _end_block(self) -> None:
+        while len(self._inline) > 1:  # unclosed inline elements
+            self._inline[-2].extend(self._inline.pop())
+        self._closing.clear()
+        text = "".join(self._inline[0]).strip()
+        if text:
+            text = LINE_START_MARKUP.sub(_escape_line_start, text)
+            self.blocks.append((self._list_id if self._prefix.lstrip()[:1] in ("-", "1") else None,
+                                self._prefix + text))
+        self._inline = [[]]
+        self._prefix = ""
+
+
+def _escape_line_start(match: re.Match) -> str:
+    """Escapes the characters starting a line which would make a paragraph a heading or a list item"""
+    if match.group(2):
+        return f"{match.group(1)}\\{match.group(2)}"
+    return f"{match.group(1)}{match.group(3)}\\."
+
+
+def _inline_markup(tag: str, attributes: dict) -> tuple[str, str]:
+    """Markdown opening and closing an inline element"""
+    if tag == "a":
+        return "[", f"]({_escape_url(attributes.get('href', ''))})"
+    style = attributes.get("style", "") or ""
+    weight = re.search(r"font-weight:\s*(\d+)", style)
+    opening = closing = ""
+    if tag in ("b", "strong") or (weight and int(weight.group(1)) >= 600):
+        opening, closing = opening + "**", "**" + closing
+    if tag in ("i", "em") or "font-style:italic" in style:
+        opening, closing = opening + "*", "*" + closing
+    if tag in ("s", "del") or "line-through" in style:
+        opening, closing = opening + "~~", "~~" + closing
+    if tag == "u" or "underline" in style:
+        opening, closing = opening + "<u>", "</u>" + closing
+    return opening, closing
+
+
+def _escape_url(url: str) -> str:
+    """url with the characters ending a Markdown link destination percent-encoded"""
+    return url.replace(" ", "%20").replace("(", "%28").replace(")", "%29")
+
+
+def html_to_markdown(html_content: str) -> str:
+    """Markdown of a note html content"""
+    writer = _MarkdownWriter()
+    writer.feed(html_content or "")
+    writer.close()
+    lines = []
+    for index, (list_id, block) in enumerate(writer.blocks):
+        # the items of a list are consecutive lines, other blocks are separated by an empty line
+        if index and (list_id is None or list_id != writer.blocks[index - 1][0]):
+            lines.append("")
+        lines.append(block)
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def _inline_html(text: str) -> str:
+    """Html of the inline Markdown of a block"""
+    def replace(match: re.Match) -> str:
+        if match.group("escaped") is not None:
+            return html.escape(match.group("escaped"))
+        if match.group("linked_src") is not None:
+            return (f'<a href="{html.escape(_unescape_url(match.group("linked_href")))}">'
+                    f'<img src="{html.escape(_unescape_url(match.group("linked_src")))}" /></a>')
+        if match.group("src") is not None:
+            return f'<img src="{html.escape(_unescape_url(match.group("src")))}" />'
+        if match.group("href") is not None:
+            return (f'<a href="{html.escape(_unescape_url(match.group("href")))}">'
+                    f'{_inline_html(match.group("text"))}</a>')
+        for name, tag in (("bold", "b"), ("italic", "i"), ("strikethrough", "s"), ("underline", "u")):
+            if match.group(name) is not None:
+                return f"<{tag}>{_inline_html(match.group(name))}</{tag}>"
+        return ""
+
+    parts = []
+    position = 0
+    for match in INLINE_PATTERN.finditer(text):
+        parts.append(html.escape(text[position:match.start()]))
+        parts.append(replace(match))
+        position = match.end()
+    parts.append(html.escape(text[position:]))
+    return "".join(parts).replace("  \n", "<br />").replace("\n", " ")
+
+
+def _unescape_url(url: str) -> str:
+    """url of a Markdown link destination, as written before _escape_url"""
+    return url.replace("%20", " ").replace("%28", "(").replace("%29", ")")
+
+
+def markdown_to_html(markdown: str) -> str:
+    """Html note of Markdown written by html_to_markdown"""
+    parts = []
+    for block in re.split(r"\n\s*\n", markdown.strip()):
+        items = [re.match(r"\s*(-|\d+\.) (.*)", line, re.DOTALL) for line in block.split("\n")]
+        if all(items):
+            tag = "ul" if items[0].group(1) == "-" else "ol"
+            parts.append(f"<{tag}>\n")
+            parts.extend(f"<li>{_inline_html(item.group(2))}</li>\n" for item in items)
+            parts.append(f"</{tag}>\n")
+            continue
+        heading = re.match(r"(#{1,6}) (.*)", block, re.DOTALL)
+        if heading:
+            level = len(heading.group(1))
+            parts.append(f"<h{level}>{_inline_html(heading.group(2))}</h{level}>\n")
+        elif block.strip():
+            parts.append(f"<p>{_inline_html(block)}</p>\n")
+    return NOTE_TEMPLATE.format("".join(parts))
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,70 @@
+"""Stored format of notes.
+
+Version 1: {"date": ..., "html_content": <QTextEdit.toHtml() output>, "images": [...]}
+Version 2: {"format": 2, "date": ..., "content": <compressed html>, "images": [...]}
+    The html is compressed with zlib using ZDICT, a preset dictionary made of the boilerplate
+    QTextEdit.toHtml() repeats in every note (doctype, style header, paragraph and span styles),
+    then encoded in base64 in "content". Compression is lossless.
+ZDICT is part of the version 2 format: it must never change, a new dictionary needs a new version."""
+import base64
+import zlib
+
+FORMAT_VERSION = 2
+
+# Most frequent strings last: zlib favors the end of the dictionary
+ZDICT = (
+    ' font-family:\'Courier New\'; <ul style="margin-top: 0px; margin-bottom: 0px; margin-left: 0px; '
+    'margin-right: 0px; -qt-list-indent: 1;"><li style=" <ol style=" <br /></p> <a href="'
+    ' text-decoration: underline; text-decoration: line-through; font-style:italic; font-weight:700;'
+    ' font-weight:600; color:#'
+    '<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.0//EN" "http://www.w3.org/TR/REC-html40/strict.dtd">\n'
+    '<html><head><meta name="qrichtext" content="1" /><meta charset="utf-8" /><style type="text/css">\n'
+    'p, li { white-space: pre-wrap; }\n'
+    'hr { height: 1px; border-width: 0; }\n'
+    'li.unchecked::marker { content: "\\2610"; }\n'
+    'li.checked::marker { content: "\\2612"; }\n'
+    '</style></head><body style=" font-family:\'Segoe UI\'; font-size:9pt; font-weight:400; '
+    'font-style:normal;">\n'
+    '<p style="-qt-paragraph-type:empty; margin-top:0px; margin-bottom:0px; margin-left:0px; margin-right:0px; '
+    '-qt-block-indent:0; text-indent:0px; font-size:16pt;"><br /></p>\n'
+    '<img src="" /></span></p></body></html>'
+    '<p style=" margin-top:0px; margin-bottom:0px; margin-left:0px; margin-right:0px; -qt-block-indent:0; '
+    'text-indent:0px;"><span style=" font-size:16pt;">'
+).encode("utf-8")
+
+
+def compress(html_content: str) -> bytes:
+    """Compressed html content"""
+    compressor = zlib.compressobj(level=9, zdict=ZDICT)
+    return compressor.compress(html_content.encode("utf-8")) + compressor.flush()
+
+
+def decompress(content: bytes) -> str:
+    """Html content from compressed content"""
+    decompressor = zlib.decompressobj(zdict=ZDICT)
+    return (decompressor.decompress(content) + decompressor.flush()).decode("utf-8")
+
+
+def pack(record: dict) -> dict:
+    """Stored form (last version) of a note record"""
+    return {"format": FORMAT_VERSION,
+            "date": record["date"],
+            "content": base64.b64encode(compress(record["html_content"])).decode("ascii"),
+            "images": record.get("images")}
+
+
+def unpack(stored: dict) -> dict:
+    """Note record from its stored form, whatever its version"""
+    match stored.get("format", 1):
+        case 1:
+            return stored
+        case 2:
+            return {"date": stored["date"],
+                    "html_content": decompress(base64.b64decode(stored["content"])),
+                    "images": stored.get("images")}
+        case version:
+            raise ValueError(f"Unknown note format version: {version}")
+
+
+if __name__ == '__main__':
+    pass
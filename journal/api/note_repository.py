@@ -0,0 +1,257 @@
+"""Contains NoteRepository class and the process-wide note_repository"""
+import sys
+import threading
+from collections import OrderedDict
+from typing import Iterable
+
+from journal.api.constants_api import MAX_CACHED_NOTES_BYTES
+from journal.api.daily_note import DailyNote, list_note_details, load_note, delete_all_notes, note_details, \
+    storage_stamp
+from journal.api.manifest import Manifest, note_flags
+
+
+class NoteListener:
+    """Base class of objects notified by the repository once a change is written"""
+
+    def note_saved(self, note: DailyNote) -> None:
+        """Called after a note is saved"""
+        pass
+
+    def note_deleted(self, date: str) -> None:
+        """Called after a note is deleted"""
+        pass
+
+    def notes_deleted(self) -> None:
+        """Called after all notes are deleted"""
+        pass
+
+
+class NoteRepository:
+    """In-memory access to daily notes.
+    Notes are listed once as lightweight records (date, size, modification time and flags),
+    from the manifest if it is up to date, contents are read on demand and kept in a LRU cache
+    with a memory cap."""
+
+    def __init__(self, max_cached_bytes: int = MAX_CACHED_NOTES_BYTES, manifest: Manifest | None = None) -> None:
+        self.max_cached_bytes = max_cached_bytes
+        self.manifest = manifest if manifest is not None else Manifest()
+        self._manifest_outdated = False
+        self._lock = threading.RLock()
+        self._notes: dict[str, DailyNote] | None = None
+        self._contents: OrderedDict[str, str] = OrderedDict()
+        self._staged: dict[str, DailyNote | None] = {}  # submitted but not written yet, None for deletions
+        self._cached_bytes = 0
+        self._listeners: list[NoteListener] = []
+
+    def __contains__(self, date: str) -> bool:
+        return date in self.notes()
+
+    def __len__(self) -> int:
+        return len(self.notes())
+
+    # region Reading
+    def notes(self) -> dict[str, DailyNote]:
+        """Lightweight records of all existing notes, listed on first call only"""
+        with self._lock:
+            if self._notes is None:
+                stamp = storage_stamp()
+                entries = self.manifest.load(stamp) if stamp is not None else None
+                if entries is None:
+                    entries = {date: [size, mtime, 0] for date, (size, mtime) in list_note_details().items()}
+                    self._manifest_outdated = True
+                self._notes = {date: self._record(date, size, mtime=mtime, flags=flags)
+                               for date, (size, mtime, flags) in entries.items()}
+            return self._notes
+
+    def dates(self) -> list[str]:
+        """Dates having a note"""
+        return list(self.notes())
+
+    def dates_between(self, start: str, end: str) -> list[str]:
+        """Dates having a note from start to end (included)"""
+        return [date for date in self.notes() if start <= date <= end]
+
+    def get(self, date: str) -> DailyNote | None:
+        """Note of a date, its content being loaded only when accessed"""
+        return self.notes().get(date)
+
+    def get_html(self, date: str) -> str | None:
+        """Content of a note, from cache if possible"""
+        with self._lock:
+            if date in self._staged:
+                staged = self._staged[date]
+                return staged.html_content if staged is not None else None
+            if date in self._contents:
+                self._contents.move_to_end(date)
+                return self._contents[date]
+        note = load_note(date)
+        if note is None:
+            return None
+        with self._lock:
+            self._cache(date, note.html_content)
+            if self._notes is not None and date in self._notes:
+                record = self._notes[date]
+                record.images = note.images
+                if record.flags != note_flags(note.images):
+                    record.flags = note_flags(note.images)
+                    self._manifest_outdated = True
+        return note.html_content
+    # endregion
+
+    # region Writing
+    def add_listener(self, listener: NoteListener) -> None:
+        """Registers a listener notified of every written change"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: NoteListener) -> None:
+        """Unregisters a listener"""
+        self._listeners.remove(listener)
+
+    def save(self, note: DailyNote) -> None:
+        """Saves a note and updates the cache"""
+        note.save_note()
+        with self._lock:
+            staged = self._staged.get(note.date, note)
+            if staged is note:
+                self._staged.pop(note.date, None)
+                self.notes()[note.date] = self._record(note.date, note.size, note.images, note.mtime)
+                self._cache(note.date, note.html_content)
+            elif staged is not None and note.date in self.notes():
+                # A newer version has been staged while this one was written
+                self.notes()[note.date].size = note.size
+            self._changed()
+        for listener in self._listeners:
+            listener.note_saved(note)
+
+    def stage(self, note: DailyNote) -> None:
+        """Makes a note available in memory before it is written"""
+        with self._lock:
+            self._staged[note.date] = note
+            previous = self.notes().get(note.date)
+            self.notes()[note.date] = self._record(note.date, previous.size if previous else 0, note.images,
+                                                   previous.mtime if previous else 0.0)
+            self._cache(note.date, note.html_content)
+
+    def stage_deletion(self, date: str) -> None:
+        """Removes a note from memory before it is deleted"""
+        with self._lock:
+            self._staged[date] = None
+            self.notes().pop(date, None)
+            self._uncache(date)
+
+    def delete(self, date: str) -> None:
+        """Deletes the note of a date"""
+        DailyNote(date).delete_note()
+        with self._lock:
+            if self._staged.get(date, None) is None:
+                self._staged.pop(date, None)
+                self.notes().pop(date, None)
+                self._uncache(date)
+            # else the note has been staged again while it was deleted
+            self._changed()
+        for listener in self._listeners:
+            listener.note_deleted(date)
+
+    def delete_all(self) -> None:
+        """Deletes all notes"""
+        delete_all_notes()
+        self.invalidate()
+        with self._lock:
+            self._notes = {}
+            self._changed()
+        for listener in self._listeners:
+            listener.notes_deleted()
+
+    def reload(self, dates: Iterable[str]) -> dict[str, str]:
+        """Reads again the notes of dates changed by another process, and notifies the listeners.
+        A note being written by this process is left as it is, its version replacing the other one:
+        the other versions of such notes are returned ({date: html}), so that they are not lost."""
+        overwritten = {}
+        for date in dates:
+            with self._lock:
+                pending, staged = date in self._staged, self._staged.get(date)
+            if pending:
+                other = load_note(date)
+                if other is not None and (staged is None or other.html_content != staged.html_content):
+                    overwritten[date] = other.html_content
+                continue
+            note = load_note(date)
+            details = note_details(date) if note is not None else None
+            with self._lock:
+                self._uncache(date)
+                if note is None:
+                    self.notes().pop(date, None)
+                else:
+                    note.size, note.mtime = details or (0, 0.0)
+                    self.notes()[date] = self._record(date, note.size, note.images, note.mtime)
+                    self._cache(date, note.html_content)
+                self._changed()
+            for listener in self._listeners:
+                if note is None:
+                    listener.note_deleted(date)
+                else:
+                    listener.note_saved(note)
+        return overwritten
+
+    def save_manifest(self) -> None:
+        """Writes the manifest if it changed, with the modification times of the storage, unless notes
+        were modified by another process and not reloaded or the storage has no stamp"""
+        with self._lock:
+            if self._notes is None or not self._manifest_outdated:
+                return
+            stamp = storage_stamp()  # before listing: a change made meanwhile makes the manifest stale
+            if stamp is None:
+                return  # the storage is listed at each start
+            details = list_note_details()
+            if {date: size for date, (size, _) in details.items()} \
+                    != {date: note.size for date, note in self._notes.items()}:
+                self.manifest.delete()
+                return
+            self.manifest.save({date: [size, mtime, self._notes[date].flags]
+                                for date, (size, mtime) in details.items()}, stamp)
+            self._manifest_outdated = False
+
+    def invalidate(self) -> None:
+        """Forgets everything, notes will be listed again on next access"""
+        with self._lock:
+            self._notes = None
+            self._staged.clear()
+            self._contents.clear()
+            self._cached_bytes = 0
+    # endregion
+
+    # region Cache management
+    def _record(self, date: str, size: int, images: list[str] | None = None,
+                mtime: float = 0.0, flags: int | None = None) -> DailyNote:
+        """Creates a lightweight note record whose content is loaded through the cache"""
+        return DailyNote(date, images=images, size=size, loader=self.get_html, mtime=mtime,
+                         flags=note_flags(images) if flags is None else flags)
+
+    def _changed(self) -> None:
+        """Records that the repository modified the storage"""
+        self._manifest_outdated = True
+
+    def _cache(self, date: str, html_content: str | None) -> None:
+        """Adds a note content to the cache, evicting least recently used contents if necessary"""
+        self._uncache(date)
+        if html_content is None:
+            return
+        self._contents[date] = html_content
+        self._cached_bytes += sys.getsizeof(html_content)
+        while self._cached_bytes > self.max_cached_bytes and len(self._contents) > 1:
+            _, evicted = self._contents.popitem(last=False)
+            self._cached_bytes -= sys.getsizeof(evicted)
+
+    def _uncache(self, date: str) -> None:
+        """Removes a note content from the cache"""
+        html_content = self._contents.pop(date, None)
+        if html_content is not None:
+            self._cached_bytes -= sys.getsizeof(html_content)
+    # endregion
+
+
+note_repository = NoteRepository()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,298 @@
+"""Contains RevisionStore class: history of the versions of each note.
+
+Each note has two files in REVISIONS_FOLDER:
+    <date>.rev: compressed revisions, appended one after the other;
+    <date>.idx: one fixed-size entry per revision (time, kind, offset and length in the .rev file),
+        so that revisions can be listed without reading them.
+A revision is either a keyframe (the whole html) or a delta against the previous revision
+(lines copied from it and inserted lines). There is a keyframe at least every KEYFRAME_INTERVAL
+revisions, so rebuilding any revision reads at most KEYFRAME_INTERVAL revisions.
+Old revisions are thinned out according to the retention rules, by age: the image collector thins all
+the histories at each of its sweeps (journal.api.image_collector), whether their notes are still edited or not.
+REVISIONS_FOLDER/images.json lists the images used by the revisions of each note, so that the image
+collector keeps them: an image is given up only when the revisions using it are thinned out."""
+import difflib
+import json
+import os
+import shutil
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from journal.api import note_format
+from journal.api.constants_api import REVISIONS_FOLDER
+from journal.api.daily_note import DailyNote
+from journal.api.images_functions import extract_images
+from journal.api.note_repository import NoteListener
+from journal.api.settings import get_setting
+
+INDEX_ENTRY = struct.Struct("<dBQI")  # time, kind, offset, length
+KEYFRAME, DELTA = 0, 1
+KEYFRAME_INTERVAL = 20  # maximum number of revisions between two keyframes
+LATEST_CACHE_SIZE = 16  # notes whose last revision is kept in memory
+
+# Default "revisions_retention" setting: [age in seconds, minimum spacing in seconds between revisions older
+# than this age]. Revisions of the last hour are all kept, then one per hour for a day, one per day for a month,
+# then one per week.
+RETENTION = [[3600, 3600], [24 * 3600, 24 * 3600], [30 * 24 * 3600, 7 * 24 * 3600]]
+
+
+@dataclass
+class Revision:
+    """A version of a note"""
+    date: str
+    number: int
+    time: float
+    is_keyframe: bool
+
+
+class RevisionStore(NoteListener):
+    """Revisions of all notes, recorded each time a note is saved"""
+
+    def __init__(self, folder: Path = REVISIONS_FOLDER) -> None:
+        self.folder = folder
+        self._lock = threading.Lock()
+        self._latest: dict[str, str] = {}  # date: html of the last revision, for recently saved notes
+        self._images: dict[str, list[str]] | None = None  # date: images used by the revisions, loaded on demand
+
+    # region Reading
+    def revisions(self, date: str) -> list[Revision]:
+        """Revisions of a note, oldest first, read from the index only"""
+        with self._lock:
+            return [Revision(date, number, revision_time, kind == KEYFRAME)
+                    for number, (revision_time, kind, _, _) in enumerate(self._read_index(date))]
+
+    def html_content(self, date: str, number: int) -> str:
+        """Html of a revision, rebuilt from the last keyframe before it"""
+        with self._lock:
+            return self._rebuild(date, self._read_index(date), number)
+
+    def dates(self) -> list[str]:
+        """Dates of the notes having a history"""
+        return sorted(path.stem for path in self.folder.glob("*.idx"))
+
+    def images(self) -> set[str]:
+        """Images used by the revisions of all notes"""
+        with self._lock:
+            return {image for images in self._note_images().values() for image in images}
+    # endregion
+
+    # region Writing
+    def add_revision(self, date: str, html_content: str, revision_time: float | None = None) -> bool:
+        """Records a new revision of a note, unless it did not change. Returns True if recorded"""
+        revision_time = time.time() if revision_time is None else revision_time
+        with self._lock:
+            index = self._read_index(date)
+            previous = self._latest.get(date)
+            if previous is None and index:
+                previous = self._rebuild(date, index, len(index) - 1)
+            if previous == html_content:
+                return False
+
+            since_keyframe = next((len(index) - number for number in range(len(index) - 1, -1, -1)
+                                   if index[number][1] == KEYFRAME), len(index))
+            kind, data = KEYFRAME, note_format.compress(html_content)
+            if previous is not None and since_keyframe < KEYFRAME_INTERVAL:
+                delta = note_format.compress(json.dumps(_delta(previous, html_content), separators=(",", ":")))
+                if len(delta) < len(data) // 2:
+                    kind, data = DELTA, delta
+            self._append(date, revision_time, kind, data)
+            images = self._note_images().get(date, [])
+            new_images = [image for image in _images(html_content) if image not in images]
+            if new_images:
+                self._note_images()[date] = images + new_images
+                self._save_images()
+            self._latest.pop(date, None)
+            self._latest[date] = html_content
+            if len(self._latest) > LATEST_CACHE_SIZE:
+                del self._latest[next(iter(self._latest))]
+        return True
+
+    def thin(self, date: str, now: float | None = None) -> None:
+        """Removes the revisions of a note the retention rules do not keep, rewriting its history only if any"""
+        with self._lock:
+            self._thin(date, time.time() if now is None else now)
+
+    def delete_revisions(self, date: str) -> None:
+        """Deletes the whole history of a note"""
+        with self._lock:
+            self._latest.pop(date, None)
+            for path in self._paths(date):
+                path.unlink(missing_ok=True)
+            if self._note_images().pop(date, None) is not None:
+                self._save_images()
+
+    # NoteListener interface
+    def note_saved(self, note: DailyNote) -> None:
+        self.add_revision(note.date, note.html_content)
+
+    def notes_deleted(self) -> None:
+        with self._lock:
+            self._latest.clear()
+            self._images = {}
+            shutil.rmtree(self.folder, ignore_errors=True)
+    # endregion
+
+    # region Files
+    def _paths(self, date: str) -> tuple[Path, Path]:
+        """Revisions and index files of a note"""
+        return self.folder / f"{date}.rev", self.folder / f"{date}.idx"
+
+    def _read_index(self, date: str) -> list[tuple[float, int, int, int]]:
+        """Index entries of a note"""
+        try:
+            data = self._paths(date)[1].read_bytes()
+        except FileNotFoundError:
+            return []
+        count = len(data) // INDEX_ENTRY.size  # an incomplete last entry is ignored
+        return [INDEX_ENTRY.unpack_from(data, i * INDEX_ENTRY.size) for i in range(count)]
+
+    def _append(self, date: str, revision_time: float, kind: int, data: bytes) -> None:
+        """Appends a revision: data first, then its index entry"""
+        self.folder.mkdir(parents=True, exist_ok=True)
+        revisions_path, index_path = self._paths(date)
+        with open(revisions_path, "ab") as f:
+            offset = f.tell()
+            f.write(data)
+        with open(index_path, "ab") as f:
+            f.truncate(f.tell() - f.tell() % INDEX_ENTRY.size)
+            f.write(INDEX_ENTRY.pack(revision_time, kind, offset, len(data)))
+
+    def _read(self, date: str, entry: tuple[float, int, int, int]) -> bytes:
+        """Data of a revision"""
+        with open(self._paths(date)[0], "rb") as f:
+            f.seek(entry[2])
+            return f.read(entry[3])
+
+    def _rebuild(self, date: str, index: list, number: int) -> str:
+        """Html of a revision"""
+        if not 0 <= number < len(index):
+            raise IndexError(f"No revision {number} for {date}")
+        keyframe = next(i for i in range(number, -1, -1) if index[i][1] == KEYFRAME)
+        html_content = note_format.decompress(self._read(date, index[keyframe]))
+        for i in range(keyframe + 1, number + 1):
+            html_content = _apply(html_content, json.loads(note_format.decompress(self._read(date, index[i]))))
+        return html_content
+
+    def _thin(self, date: str, now: float) -> None:
+        """Rewrites the history of a note with the revisions kept by the retention rules only"""
+        index = self._read_index(date)
+        kept = _kept_revisions([entry[0] for entry in index], now,
+                               get_setting("revisions_retention", RETENTION))
+        if len(kept) == len(index):
+            return
+        revisions_path, index_path = self._paths(date)
+        new_revisions_path = revisions_path.with_suffix(".rev.tmp")
+        new_index_path = index_path.with_suffix(".idx.tmp")
+        images = {}  # images of the kept revisions, in order
+        with open(new_revisions_path, "wb") as revisions, open(new_index_path, "wb") as new_index:
+            html_content = previous = None
+            since_keyframe = KEYFRAME_INTERVAL
+            for number, entry in enumerate(index):
+                # Every revision is rebuilt in order, but only the kept ones are written
+                data = note_format.decompress(self._read(date, entry))
+                html_content = data if entry[1] == KEYFRAME else _apply(html_content, json.loads(data))
+                if number not in kept:
+                    continue
+                images.update(dict.fromkeys(_images(html_content)))
+                kind, data = KEYFRAME, note_format.compress(html_content)
+                if previous is not None and since_keyframe < KEYFRAME_INTERVAL:
+                    delta = note_format.compress(json.dumps(_delta(previous, html_content), separators=(",", ":")))
+                    if len(delta) < len(data) // 2:
+                        kind, data = DELTA, delta
+                since_keyframe = 1 if kind == KEYFRAME else since_keyframe + 1
+                new_index.write(INDEX_ENTRY.pack(entry[0], kind, revisions.tell(), len(data)))
+                revisions.write(data)
+                previous = html_content
+        os.replace(new_revisions_path, revisions_path)
+        os.replace(new_index_path, index_path)
+        if list(images) != self._note_images().get(date, []):  # the images of thinned out revisions are given up
+            self._note_images()[date] = list(images)
+            self._save_images()
+
+    def _note_images(self) -> dict[str, list[str]]:
+        """Images used by the revisions of each note, read on first call. Histories recorded before the
+        images were listed are read once to list them."""
+        if self._images is None:
+            try:
+                with open(self.folder / "images.json", "r", encoding="utf-8") as f:
+                    self._images = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._images = {}
+                for path in self.folder.glob("*.idx"):
+                    images = self._history_images(path.stem, self._read_index(path.stem))
+                    if images:
+                        self._images[path.stem] = images
+                self._save_images()
+        return self._images
+
+    def _history_images(self, date: str, index: list) -> list[str]:
+        """Images used by all the revisions of a note"""
+        images = {}
+        html_content = None
+        for entry in index:
+            data = note_format.decompress(self._read(date, entry))
+            html_content = data if entry[1] == KEYFRAME else _apply(html_content, json.loads(data))
+            images.update(dict.fromkeys(_images(html_content)))
+        return list(images)
+
+    def _save_images(self) -> None:
+        """Writes the images used by the revisions"""
+        if not self._images and not self.folder.is_dir():
+            return
+        self.folder.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.folder / "images.json.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(self._images, f, separators=(",", ":"))
+        os.replace(temporary_path, self.folder / "images.json")
+    # endregion
+
+
+def _delta(old: str, new: str) -> list:
+    """Operations rebuilding new from old: [start, end] copies old lines, a string inserts new lines"""
+    old_lines, new_lines = old.splitlines(keepends=True), new.splitlines(keepends=True)
+    operations = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        if tag == "equal":
+            operations.append([old_start, old_end])
+        elif new_start != new_end:
+            operations.append("".join(new_lines[new_start:new_end]))
+    return operations
+
+
+def _apply(old: str, operations: list) -> str:
+    """Rebuilds a text from the previous one and a delta"""
+    old_lines = old.splitlines(keepends=True)
+    return "".join(operation if isinstance(operation, str) else "".join(old_lines[operation[0]:operation[1]])
+                   for operation in operations)
+
+
+def _images(html_content: str) -> list[str]:
+    """Images of a revision, as the image collector names them"""
+    return [str(Path(image)) for image in extract_images(html_content)]
+
+
+def _kept_revisions(times: list[float], now: float, retention: list[list[float]]) -> set[int]:
+    """Numbers of the revisions kept by retention rules: for each [age, spacing] rule, revisions older
+    than age are kept only if they are at least spacing apart. The last revision is always kept."""
+    kept = set()
+    last_kept_time = None
+    for number, revision_time in enumerate(times):
+        age = now - revision_time
+        spacing = max((rule_spacing for rule_age, rule_spacing in retention if age >= rule_age), default=0)
+        if last_kept_time is None or revision_time - last_kept_time >= spacing:
+            kept.add(number)
+            last_kept_time = revision_time
+    if times:
+        kept.add(len(times) - 1)
+    return kept
+
+
+revision_store = RevisionStore()
+
+
+if __name__ == '__main__':
+    pass
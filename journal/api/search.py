@@ -0,0 +1,310 @@
+"""Contains SearchIndex class: full-text search in notes.
+
+The index is an inverted index stored in a SQLite database: for each normalized word,
+the notes containing it with the positions and offsets of its occurrences.
+It is updated note by note as a NoteListener of the repository."""
+import json
+import math
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Collection, Iterable, Iterator
+
+from journal.api.constants_api import SEARCH_INDEX_FILE
+from journal.api.daily_note import DailyNote
+from journal.api.note_repository import NoteListener, NoteRepository
+from journal.api.text_functions import html_to_text, tokenize
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    date TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL DEFAULT 0,
+    length INTEGER NOT NULL,
+    text TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    date TEXT NOT NULL,
+    frequency INTEGER NOT NULL,
+    positions TEXT NOT NULL,
+    PRIMARY KEY (term, date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_date ON postings(date);
+"""
+QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+DATES_PER_QUERY = 500  # notes looked up by primary key at most, the postings of a term being read beyond
+
+# BM25 ranking parameters
+K1 = 1.2
+B = 0.75
+
+
+@dataclass
+class SearchResult:
+    """A note matching a query"""
+    date: str
+    score: float
+    matches: list[tuple[int, int]] = field(default_factory=list)  # (start, end) offsets in the note text
+
+
+@dataclass
+class _Clause:
+    """Part of a query: a word, a word prefix or a phrase"""
+    terms: list[str]
+    prefix: bool = False  # last term is a prefix
+
+
+class SearchIndex(NoteListener):
+    """On-disk inverted index of notes plain text"""
+
+    def __init__(self, path: Path = SEARCH_INDEX_FILE) -> None:
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._lengths: dict[str, int] | None = None  # numbers of words of the notes, read at the first search
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        self._upgrade_schema()
+
+    def close(self) -> None:
+        """Closes the index database, later updates being ignored"""
+        with self._lock:
+            self._closed = True
+            self._connection.close()
+
+    # region Indexing
+    def index_note(self, date: str, html_content: str, size: int = 0, mtime: float = 0.0) -> None:
+        """Indexes (or reindexes) a note"""
+        text = html_to_text(html_content)
+        positions: dict[str, list[tuple[int, int, int]]] = {}
+        length = 0
+        for length, (term, start, end) in enumerate(tokenize(text), start=1):
+            positions.setdefault(term, []).append((length - 1, start, end))
+        with self._lock:
+            if self._closed:
+                return
+            with self._transaction():
+                self._remove(date)
+                self._connection.execute("INSERT INTO documents (date, size, mtime, length, text) "
+                                         "VALUES (?, ?, ?, ?, ?)", (date, size, mtime, length, text))
+                self._connection.executemany("INSERT INTO postings (term, date, frequency, positions) "
+                                             "VALUES (?, ?, ?, ?)",
+                                             ((term, date, len(occurrences),
+                                               json.dumps(occurrences, separators=(",", ":")))
+                                              for term, occurrences in positions.items()))
+
+    def remove_note(self, date: str) -> None:
+        """Removes a note from the index"""
+        with self._lock:
+            if self._closed:
+                return
+            with self._transaction():
+                self._remove(date)
+
+    def clear(self) -> None:
+        """Empties the index"""
+        with self._lock:
+            if self._closed:
+                return
+            with self._transaction():
+                self._connection.execute("DELETE FROM postings")
+                self._connection.execute("DELETE FROM documents")
+                self._lengths = None
+
+    def synchronize(self, notes: dict[str, tuple[int, float]], load: Callable[[str], str | None]) -> int:
+        """Updates the index from the {date: (size, modification time)} list of existing notes,
+        load(date) being called only for new or modified notes. Returns the number of changes."""
+        with self._lock:
+            indexed = {date: (size, mtime) for date, size, mtime
+                       in self._connection.execute("SELECT date, size, mtime FROM documents")}
+        changes = 0
+        for date in indexed.keys() - notes.keys():
+            self.remove_note(date)
+            changes += 1
+        for date, (size, mtime) in notes.items():
+            if self._closed:
+                break
+            if indexed.get(date) != (size, mtime):  # a note rewritten with the same size has another mtime
+                html_content = load(date)
+                if html_content is not None:
+                    self.index_note(date, html_content, size, mtime)
+                    changes += 1
+        return changes
+
+    def synchronize_in_background(self, repository: NoteRepository) -> threading.Thread:
+        """Synchronizes the index with a repository in a worker thread"""
+        thread = threading.Thread(target=lambda: self.synchronize({date: (note.size, note.mtime) for date, note
+                                                                   in repository.notes().items()},
+                                                                  repository.get_html),
+                                  name="search index", daemon=True)
+        thread.start()
+        return thread
+
+    # NoteListener interface
+    def note_saved(self, note: DailyNote) -> None:
+        self.index_note(note.date, note.html_content, note.size, note.mtime)
+
+    def note_deleted(self, date: str) -> None:
+        self.remove_note(date)
+
+    def notes_deleted(self) -> None:
+        self.clear()
+    # endregion
+
+    # region Searching
+    def search(self, query: str, limit: int = 50) -> list[SearchResult]:
+        """Notes matching all the words of a query, best matches first.
+        Words ending with * are prefixes, words between double quotes are phrases."""
+        clauses = self._parse(query)
+        if not clauses:
+            return []
+        with self._lock:
+            document_count, average_length = self._connection.execute(
+                "SELECT count(*), avg(length) FROM documents").fetchone()
+            average_length = average_length or 1
+            if self._lengths is None:
+                self._lengths = dict(self._connection.execute("SELECT date, length FROM documents"))
+            scores: dict[str, float] | None = None
+            for clause in clauses:
+                frequencies = self._clause_frequencies(clause, scores)
+                if not frequencies:
+                    return []
+                idf = math.log(1 + (document_count - len(frequencies) + 0.5) / (len(frequencies) + 0.5))
+                scores = {date: (scores or {}).get(date, 0) + idf * frequency * (K1 + 1)
+                          / (frequency + K1 * (1 - B + B * self._lengths.get(date, average_length) / average_length))
+                          for date, frequency in frequencies.items()}
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+            spans = [self._clause_spans(clause, [date for date, _ in ranked]) for clause in clauses]
+            return [SearchResult(date, score, sorted(span for clause_spans in spans for span in clause_spans[date]))
+                    for date, score in ranked]
+
+    def snippet(self, result: SearchResult, context: int = 40) -> tuple[str, list[tuple[int, int]]]:
+        """Text around the first match of a result, with the match offsets in this text"""
+        with self._lock:
+            row = self._connection.execute("SELECT text FROM documents WHERE date = ?", (result.date,)).fetchone()
+        if row is None or not result.matches:
+            return "", []
+        text = row[0]
+        start = max(0, result.matches[0][0] - context)
+        end = min(len(text), result.matches[0][1] + context)
+        prefix = "…" if start > 0 else ""
+        suffix = "…" if end < len(text) else ""
+        offsets = [(match_start - start + len(prefix), match_end - start + len(prefix))
+                   for match_start, match_end in result.matches if start <= match_start and match_end <= end]
+        return prefix + text[start:end].replace("\n", " ") + suffix, offsets
+
+    @staticmethod
+    def _parse(query: str) -> list[_Clause]:
+        """Splits a query into clauses"""
+        clauses = []
+        for phrase, word in QUERY_PATTERN.findall(query):
+            text = phrase or word
+            terms = [term for term, _, _ in tokenize(text)]
+            if terms:
+                clauses.append(_Clause(terms, prefix=not phrase and text.endswith("*")))
+        return clauses
+
+    def _clause_frequencies(self, clause: _Clause, candidates: Collection[str] | None = None) -> dict[str, int]:
+        """{date: number of occurrences} of a clause, among candidates dates if given.
+        Positions are only read for phrases."""
+        if len(clause.terms) == 1:
+            return dict(self._postings(clause.terms[0], clause.prefix, "sum(frequency)", candidates))
+        return {date: len(spans) for date, spans in self._phrase_occurrences(clause, candidates).items()}
+
+    def _clause_spans(self, clause: _Clause, dates: list[str]) -> dict[str, list[tuple[int, int]]]:
+        """{date: (start, end) offsets of the occurrences} of a clause in notes, read by one query per term"""
+        if len(clause.terms) == 1:
+            spans = {date: [] for date in dates}
+            for date, positions in self._postings(clause.terms[0], clause.prefix, "positions", dates):
+                spans[date].extend((start, end) for _, start, end in json.loads(positions))
+            return spans
+        return {date: [] for date in dates} | self._phrase_occurrences(clause, set(dates))
+
+    def _phrase_occurrences(self, clause: _Clause,
+                            candidates: Collection[str] | None = None) -> dict[str, list[tuple[int, int]]]:
+        """{date: (start, end) offsets of each occurrence} of a phrase, among candidates dates if given.
+        The notes containing all its terms are found from the frequencies first, and the positions of a term
+        are only decoded in a note while the phrase can still start somewhere."""
+        terms = [(term, clause.prefix and i == len(clause.terms) - 1) for i, term in enumerate(clause.terms)]
+        dates = set(candidates) if candidates is not None else None
+        for term, is_prefix in sorted(terms, key=lambda term: term[1]):  # prefixes match more notes
+            dates = {date for date, _ in self._postings(term, is_prefix, "sum(frequency)", dates)}
+            if not dates:
+                return {}
+
+        postings = []  # for each term: {date: [encoded positions]}
+        for term, is_prefix in terms:
+            term_postings = {}
+            for date, positions in self._postings(term, is_prefix, "positions", dates):
+                term_postings.setdefault(date, []).append(positions)
+            postings.append(term_postings)
+
+        occurrences = {}
+        for date in dates:
+            starts = {position: start for position, start, _ in self._decode(postings[0][date])}
+            ends = {}
+            for i, term_postings in enumerate(postings[1:], 1):
+                ends = {position - i: end for position, _, end in self._decode(term_postings[date])
+                        if position - i in starts}
+                starts = {position: starts[position] for position in ends}
+                if not starts:
+                    break
+            if starts:
+                occurrences[date] = [(starts[position], ends[position]) for position in sorted(starts)]
+        return occurrences
+
+    @staticmethod
+    def _decode(positions: list[str]) -> list[list[int]]:
+        """[position, start, end] occurrences from the positions of one or more terms (for a prefix)"""
+        return json.loads(positions[0]) if len(positions) == 1 else [occurrence for encoded in positions
+                                                                     for occurrence in json.loads(encoded)]
+
+    def _postings(self, term: str, prefix: bool, columns: str,
+                  dates: Collection[str] | None = None) -> Iterable[tuple]:
+        """(date, *columns) rows of a term, or of all terms starting with it, for some notes only if dates
+        is given: looked up by primary key when they are few, else filtered from the rows of the term.
+        Aggregated columns (sum(frequency)) are grouped by note."""
+        conditions, parameters = ("term >= ? AND term < ?", [term, term[:-1] + chr(ord(term[-1]) + 1)]) if prefix \
+            else ("term = ?", [term])
+        if dates is not None and len(dates) <= DATES_PER_QUERY:
+            conditions += f" AND date IN ({','.join('?' * len(dates))})"
+            parameters.extend(dates)
+        group = " GROUP BY date" if "(" in columns else ""
+        rows = self._connection.execute(f"SELECT date, {columns} FROM postings WHERE {conditions}{group}", parameters)
+        return rows if dates is None or len(dates) <= DATES_PER_QUERY else (row for row in rows if row[0] in dates)
+    # endregion
+
+    def _upgrade_schema(self) -> None:
+        """Upgrades an index created before the modification times of the notes were kept: as they are 0,
+        the notes are indexed again by the next synchronization"""
+        columns = [column for _, column, *_ in self._connection.execute("PRAGMA table_info(documents)")]
+        if "mtime" not in columns:
+            self._connection.execute("ALTER TABLE documents ADD COLUMN mtime REAL NOT NULL DEFAULT 0")
+
+    def _remove(self, date: str) -> None:
+        """Removes a note from the index, in a transaction"""
+        self._connection.execute("DELETE FROM postings WHERE date = ?", (date,))
+        self._connection.execute("DELETE FROM documents WHERE date = ?", (date,))
+        self._lengths = None
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """Wraps statements in a transaction, rolled back if an exception is raised"""
+        self._connection.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+
+if __name__ == '__main__':
+    pass
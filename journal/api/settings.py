@@ -0,0 +1,36 @@
+"""Functions to read and write user settings (SETTINGS_FILE)"""
+import json
+
+from journal.api.constants_api import SETTINGS_FILE
+
+_settings = None
+
+
+def load_settings() -> dict:
+    """Returns the user settings, read from SETTINGS_FILE on first call"""
+    global _settings
+    if _settings is None:
+        try:
+            with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
+                _settings = json.load(f)
+        except FileNotFoundError:
+            _settings = {}
+    return _settings
+
+
+def get_setting(key: str, default=None):
+    """Returns the value of a setting, default if it is not set"""
+    return load_settings().get(key, default)
+
+
+def set_setting(key: str, value) -> None:
+    """Sets a setting and saves SETTINGS_FILE"""
+    settings = load_settings()
+    settings[key] = value
+    SETTINGS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
+        json.dump(settings, f, indent=4)
+
+
+if __name__ == '__main__':
+    pass
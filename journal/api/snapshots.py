@@ -0,0 +1,320 @@
+"""Contains SnapshotStore class: backups of the notes and images at points in time, which can be restored.
+
+A snapshot is a manifest, SNAPSHOTS_FOLDER/<name>.json, listing the notes by the hash of their stored form
+(journal.api.note_format) and the stored images by name. Contents are kept once, however many snapshots
+use them:
+    Objects/<first 2 hash characters>/<sha256 hash>.json: a note;
+    Images/<shard>/<name>: an image, hard linked to the one of IMAGES_FOLDER (stored images are only ever
+        added or deleted, never modified), copied where it can't be.
+A snapshot only reads the notes whose size or modification time changed since the previous one and only
+writes the contents no snapshot has yet: unchanged notes and images cost nothing.
+Automatic snapshots run in a background thread at the lowest priority, reading and writing at most
+SNAPSHOT_IO_RATE bytes per second."""
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterator
+
+from journal.api import note_format
+from journal.api.constants_api import IMAGES_FOLDER, SNAPSHOTS_FOLDER
+from journal.api.image_collector import lower_thread_priority
+from journal.api.images_functions import link_or_copy
+from journal.api.settings import get_setting
+from journal.api.storage import get_storage
+
+SNAPSHOT_VERSION = 1
+SNAPSHOTS_KEPT = 30  # default "snapshots_kept" setting: number of snapshots kept, the oldest are deleted
+SNAPSHOT_INTERVAL = 24 * 3600  # seconds between two automatic snapshots
+SNAPSHOT_CHECK_INTERVAL = 3600  # seconds between two checks of the time of the last snapshot
+SNAPSHOT_START_DELAY = 60  # seconds before the first check, so that it never competes with the startup
+SNAPSHOT_IO_RATE = 4 * 1024 * 1024  # bytes per second read or written by automatic snapshots
+RESTORE_BATCH_SIZE = 100  # notes written to the storage at once by a restore
+
+# Reasons of snapshots
+AUTOMATIC = "automatic"
+MANUAL = "manual"
+BEFORE_DELETE_ALL = "before delete all"
+BEFORE_RESTORE = "before restore"
+
+
+@dataclass
+class Snapshot:
+    """A snapshot of the journal"""
+    name: str
+    time: float
+    reason: str
+    notes: int
+    images: int
+
+
+class SnapshotStore:
+    """Snapshots of the notes and images of the journal"""
+
+    def __init__(self, folder: Path = SNAPSHOTS_FOLDER, kept: int | None = None,
+                 interval: float = SNAPSHOT_INTERVAL) -> None:
+        self.folder = folder
+        # at least the last snapshot is kept, e.g. the one taken before deleting all the notes
+        self.kept = max(1, kept if kept is not None else get_setting("snapshots_kept", SNAPSHOTS_KEPT))
+        self.interval = interval
+        self._lock = threading.Lock()  # one snapshot, restore or pruning at a time
+        self._urgent = threading.Event()  # set while a snapshot is waited for: automatic ones stop throttling
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # region Reading
+    def snapshots(self) -> list[Snapshot]:
+        """Snapshots, oldest first"""
+        snapshots = []
+        for name in self._names():
+            manifest = self._read_manifest(name)
+            if manifest is not None:
+                snapshots.append(Snapshot(name, manifest["time"], manifest["reason"],
+                                          len(manifest["notes"]), len(manifest["images"])))
+        return snapshots
+    # endregion
+
+    # region Snapshots
+    def take(self, reason: str = MANUAL, throttled: bool = False,
+             progress: Callable[[int, int], None] | None = None) -> Snapshot | None:
+        """Takes a snapshot of the notes and images, unless nothing changed since the last one, which is
+        then returned. A throttled snapshot reads and writes at most SNAPSHOT_IO_RATE bytes per second,
+        and returns None if the store is stopped meanwhile. progress is called with the numbers of notes
+        done and to do, and may raise an exception to stop."""
+        if not throttled:
+            self._urgent.set()
+        try:
+            with self._lock:
+                snapshot = self._take(reason, throttled, progress)
+                if snapshot is not None:
+                    self._prune()
+                return snapshot
+        finally:
+            if not throttled:
+                self._urgent.clear()
+
+    def _take(self, reason: str, throttled: bool,
+              progress: Callable[[int, int], None] | None = None) -> Snapshot | None:
+        names = self._names()
+        previous = self._read_manifest(names[-1]) if names else None
+        known = previous["notes"] if previous is not None else {}  # date: [object, size, modification time]
+        notes = {}
+        storage = get_storage()
+        details = sorted(storage.list_details().items())
+        for done, (date, (size, mtime)) in enumerate(details, 1):
+            if throttled and self._stopped.is_set():
+                return None
+            if progress is not None:
+                progress(done, len(details))
+            entry = known.get(date)
+            if entry is not None and mtime and entry[1:] == [size, mtime]:
+                notes[date] = entry  # unchanged, not read
+                continue
+            record = storage.read(date)
+            if record is None:  # deleted meanwhile
+                continue
+            content = json.dumps(note_format.pack(record)).encode("utf-8")
+            digest = hashlib.sha256(content).hexdigest()
+            path = self._object_path(digest)
+            if not path.exists():
+                _write_file(path, content)
+            notes[date] = [digest, size, mtime]
+            if throttled:
+                self._throttle(size + len(content))
+
+        images = []
+        for image in _stored_images():  # listed after the notes, so that the images they use are there
+            if throttled and self._stopped.is_set():
+                return None
+            path = self.folder / "Images" / image
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    link_or_copy(IMAGES_FOLDER / image, path)
+                except FileNotFoundError:  # deleted meanwhile
+                    continue
+                if throttled and not os.path.samefile(IMAGES_FOLDER / image, path):  # copied
+                    self._throttle(path.stat().st_size)
+            images.append(image)
+
+        now = time.time()
+        if previous is not None and images == previous["images"] \
+                and {date: entry[0] for date, entry in notes.items()} \
+                == {date: entry[0] for date, entry in known.items()}:
+            # same contents: the previous snapshot only learns the new modification times
+            if notes != known:
+                previous["notes"] = notes
+                self._write_manifest(names[-1], previous)
+            return Snapshot(names[-1], previous["time"], previous["reason"], len(notes), len(images))
+        name = datetime.fromtimestamp(now).strftime("%Y-%m-%d_%H-%M-%S_%f")
+        self._write_manifest(name, {"version": SNAPSHOT_VERSION, "time": now, "reason": reason,
+                                    "notes": notes, "images": images})
+        return Snapshot(name, now, reason, len(notes), len(images))
+
+    def restore(self, name: str, progress: Callable[[int, int], None] | None = None) -> int:
+        """Puts the journal back as it was at a snapshot: its images are restored, its notes are written
+        and the notes created since are deleted. Returns the number of notes written or deleted.
+        The journal is snapshotted first, so that a restore can be undone. progress is called with the
+        numbers of notes restored and to restore, and may raise an exception to stop.
+        The notes are written straight to the storage: the caller updates what depends on them
+        (NoteRepository.invalidate(), ImageCollector.build())."""
+        manifest = self._read_manifest(name)
+        if manifest is None:
+            raise ValueError(f"No snapshot {name}")
+        self._urgent.set()
+        try:
+            with self._lock:
+                # pruned before the new snapshot: afterwards, the restored snapshot could be the oldest one beyond
+                # the number kept
+                self._prune(protected=name)
+                current = self._take(BEFORE_RESTORE, throttled=False)
+                total = self._restore(manifest, self._read_manifest(current.name)["notes"], progress)
+        finally:
+            self._urgent.clear()
+        return total
+
+    def _restore(self, manifest: dict, current_notes: dict,
+                 progress: Callable[[int, int], None] | None) -> int:
+        """Writes the notes and images of a manifest over the current notes (date: [object, ...])"""
+        for image in manifest["images"]:
+            if not (IMAGES_FOLDER / image).exists():
+                (IMAGES_FOLDER / image).parent.mkdir(parents=True, exist_ok=True)
+                link_or_copy(self.folder / "Images" / image, IMAGES_FOLDER / image)
+
+        changed = [date for date, entry in manifest["notes"].items()
+                   if current_notes.get(date, [None])[0] != entry[0]]
+        deleted = [date for date in current_notes if date not in manifest["notes"]]
+        total = len(changed) + len(deleted)
+        storage = get_storage()
+        records = []  # restored notes not written yet
+        try:
+            for done, date in enumerate(changed, 1):
+                with open(self._object_path(manifest["notes"][date][0]), "r", encoding="utf-8") as f:
+                    records.append(note_format.unpack(json.load(f)))
+                if len(records) >= RESTORE_BATCH_SIZE:
+                    storage.write_many(records)
+                    records = []
+                if progress is not None:
+                    progress(done, total)
+        finally:
+            if records:
+                storage.write_many(records)
+        for done, date in enumerate(deleted, len(changed) + 1):
+            storage.delete(date)
+            if progress is not None:
+                progress(done, total)
+        return total
+
+    def _prune(self, protected: str | None = None) -> None:
+        """Deletes the oldest snapshots beyond the number kept, protected excepted, then the contents no
+        snapshot uses anymore"""
+        names = self._names()
+        for name in names[:max(0, len(names) - self.kept)]:
+            if name != protected:
+                (self.folder / f"{name}.json").unlink()
+        objects, images = set(), set()
+        for name in self._names():
+            manifest = self._read_manifest(name)
+            if manifest is not None:
+                objects.update(entry[0] for entry in manifest["notes"].values())
+                images.update(manifest["images"])
+        for path in list(_files(self.folder / "Objects")):
+            if path.stem not in objects:
+                path.unlink()
+        for path in list(_files(self.folder / "Images")):
+            if f"{path.parent.name}/{path.name}" not in images:
+                path.unlink()
+    # endregion
+
+    # region Automatic snapshots
+    def start(self) -> None:
+        """Starts taking a snapshot every interval, in the background"""
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="snapshots", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the automatic snapshots, an unfinished one is dropped"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        """Automatic snapshots loop"""
+        lower_thread_priority()
+        wait = SNAPSHOT_START_DELAY
+        while not self._stopped.wait(wait):
+            names = self._names()
+            last = (self.folder / f"{names[-1]}.json").stat().st_mtime if names else 0
+            if time.time() - last >= self.interval:
+                try:
+                    self.take(AUTOMATIC, throttled=True)
+                except OSError:
+                    pass  # e.g. disk full: tried again at the next check
+            wait = SNAPSHOT_CHECK_INTERVAL
+
+    def _throttle(self, size: int) -> None:
+        """Waits as long as reading or writing size bytes takes at SNAPSHOT_IO_RATE, unless a snapshot
+        is waited for"""
+        if not self._urgent.is_set():
+            self._stopped.wait(size / SNAPSHOT_IO_RATE)
+    # endregion
+
+    # region Files
+    def _names(self) -> list[str]:
+        """Names of the snapshots, oldest first"""
+        try:
+            return sorted(entry.name.removesuffix(".json") for entry in os.scandir(self.folder)
+                          if entry.is_file() and entry.name.endswith(".json"))
+        except FileNotFoundError:
+            return []
+
+    def _read_manifest(self, name: str) -> dict | None:
+        try:
+            with open(self.folder / f"{name}.json", "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return manifest if manifest.get("version") == SNAPSHOT_VERSION else None
+
+    def _write_manifest(self, name: str, manifest: dict) -> None:
+        _write_file(self.folder / f"{name}.json", json.dumps(manifest).encode("utf-8"))
+
+    def _object_path(self, digest: str) -> Path:
+        return self.folder / "Objects" / digest[:2] / f"{digest}.json"
+    # endregion
+
+
+def _write_file(path: Path, content: bytes) -> None:
+    """Writes a file atomically"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = path.with_name(f".{path.name}.tmp")
+    with open(temporary_path, "wb") as f:
+        f.write(content)
+    os.replace(temporary_path, path)
+
+
+def _stored_images() -> list[str]:
+    """Stored images, as <shard>/<name> paths relative to IMAGES_FOLDER"""
+    return sorted(f"{path.parent.name}/{path.name}" for path in _files(IMAGES_FOLDER))
+
+
+def _files(folder: Path) -> Iterator[Path]:
+    """Files of the shards of a folder, temporary files excepted"""
+    try:
+        shards = [entry.path for entry in os.scandir(folder) if entry.is_dir()]
+    except FileNotFoundError:
+        return
+    for shard in shards:
+        for entry in os.scandir(shard):
+            if entry.is_file() and not entry.name.startswith("."):
+                yield Path(entry.path)
+
+
+if __name__ == '__main__':
+    pass
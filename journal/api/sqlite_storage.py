@@ -0,0 +1,154 @@
+"""Contains SqliteStorage class: all notes and their images list in a SQLite database.
+Note contents are stored as defined by note_format: html text in version 1, compressed bytes in version 2."""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from journal.api import note_format
+from journal.api.constants_api import JOURNAL_DATABASE_FILE
+from journal.api.storage import NoteStorage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    date TEXT PRIMARY KEY,
+    content BLOB NOT NULL,
+    format INTEGER NOT NULL,
+    size INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS images (
+    date TEXT NOT NULL REFERENCES notes(date) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (date, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS images_path ON images(path);
+"""
+
+
+class SqliteStorage(NoteStorage):
+    """Notes in a SQLite database in WAL mode, images in their own table"""
+    name = "sqlite"
+
+    def __init__(self, path: Path = JOURNAL_DATABASE_FILE) -> None:
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("PRAGMA foreign_keys=ON")
+        self._upgrade_schema()
+        self._connection.executescript(SCHEMA)
+
+    # region NoteStorage interface
+    def list_notes(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._connection.execute("SELECT date, size FROM notes"))
+
+    def note_details(self, date: str) -> tuple[int, float] | None:
+        with self._lock:
+            row = self._connection.execute("SELECT size FROM notes WHERE date = ?", (date,)).fetchone()
+        return (row[0], 0.0) if row is not None else None
+
+    def stamp(self) -> list:
+        stamp = []
+        for path in (self.path, self.path.with_name(f"{self.path.name}-wal")):
+            try:
+                stat = os.stat(path)
+                stamp += [stat.st_size, stat.st_mtime_ns]
+            except FileNotFoundError:
+                stamp += [0, 0]
+        return stamp
+
+    def read(self, date: str) -> dict | None:
+        with self._lock:
+            row = self._connection.execute("SELECT content, format FROM notes WHERE date = ?", (date,)).fetchone()
+            if row is None:
+                return None
+            return {"date": date, "html_content": _html_content(*row), "images": self._images(date)}
+
+    def read_range(self, start: str, end: str) -> Iterator[dict]:
+        with self._lock:
+            rows = self._connection.execute("SELECT date, content, format FROM notes WHERE date BETWEEN ? AND ? "
+                                            "ORDER BY date", (start, end)).fetchall()
+            images = {}
+            for date, path in self._connection.execute("SELECT date, path FROM images WHERE date BETWEEN ? AND ? "
+                                                       "ORDER BY date, position", (start, end)):
+                images.setdefault(date, []).append(path)
+        for date, content, content_format in rows:
+            yield {"date": date, "html_content": _html_content(content, content_format), "images": images.get(date)}
+
+    def write(self, record: dict) -> int:
+        return self.write_many([record])[0]
+
+    def write_many(self, records: Iterable[dict]) -> list[int]:
+        sizes = []
+        with self._lock, self._transaction():
+            for record in records:
+                content = note_format.compress(record["html_content"])
+                size = len(content)
+                self._connection.execute("INSERT OR REPLACE INTO notes (date, content, format, size) "
+                                         "VALUES (?, ?, ?, ?)",
+                                         (record["date"], content, note_format.FORMAT_VERSION, size))
+                self._connection.execute("DELETE FROM images WHERE date = ?", (record["date"],))
+                self._connection.executemany("INSERT INTO images (date, position, path) VALUES (?, ?, ?)",
+                                             ((record["date"], position, path)
+                                              for position, path in enumerate(record.get("images") or [])))
+                sizes.append(size)
+        return sizes
+
+    def delete(self, date: str) -> None:
+        with self._lock, self._transaction():
+            self._connection.execute("DELETE FROM notes WHERE date = ?", (date,))
+
+    def delete_all(self) -> None:
+        with self._lock, self._transaction():
+            self._connection.execute("DELETE FROM images")
+            self._connection.execute("DELETE FROM notes")
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+    # endregion
+
+    def _images(self, date: str) -> list[str] | None:
+        """Images of a note, None if it has none"""
+        images = [path for path, in self._connection.execute("SELECT path FROM images WHERE date = ? "
+                                                             "ORDER BY position", (date,))]
+        return images or None
+
+    def _upgrade_schema(self) -> None:
+        """Upgrades a database created before note contents were compressed"""
+        columns = [column for _, column, *_ in self._connection.execute("PRAGMA table_info(notes)")]
+        if "html_content" in columns:
+            self._connection.execute("ALTER TABLE notes RENAME COLUMN html_content TO content")
+            self._connection.execute("ALTER TABLE notes ADD COLUMN format INTEGER NOT NULL DEFAULT 1")
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """Wraps statements in a transaction, rolled back if an exception is raised"""
+        self._connection.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+
+def _html_content(content: bytes | str, content_format: int) -> str:
+    """Html content of a note from its stored content"""
+    match content_format:
+        case 1:
+            return content
+        case 2:
+            return note_format.decompress(content)
+        case version:
+            raise ValueError(f"Unknown note format version: {version}")
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,266 @@
+"""Contains JournalStatistics class: statistics of the journal, without reading the notes.
+
+The numbers of words, characters and images of a note are counted once, when it is saved, and kept in
+STATISTICS_FILE with the size and modification time of the note, so that a note changed by another process
+is counted again (synchronize). The time spent editing a note is added by the editor. The totals by month
+and by weekday are updated by difference at each change: the heatmap of any month, the streaks and the
+most active weekdays are given without reading any note."""
+import bisect
+import json
+import os
+import threading
+from dataclasses import astuple, dataclass
+from datetime import date as Date, timedelta
+from pathlib import Path
+from typing import Callable
+
+from journal.api.constants_api import STATISTICS_FILE
+from journal.api.daily_note import DailyNote
+from journal.api.images_functions import extract_images
+from journal.api.note_repository import NoteListener, NoteRepository
+from journal.api.text_functions import WORD_PATTERN, html_to_text
+
+STATISTICS_VERSION = 1
+INTENSITY_LEVELS = 4  # levels of the heatmap, from the shortest notes to the longest ones
+
+
+@dataclass
+class NoteStatistics:
+    """Counts of a note, and its size and modification time when they were counted"""
+    size: int = 0
+    words: int = 0
+    characters: int = 0
+    images: int = 0
+    mtime: float = 0.0  # last, as it is missing from older statistics files: such notes are counted again
+
+
+@dataclass
+class Totals:
+    """Totals of a set of notes; edit_time is in seconds"""
+    notes: int = 0
+    words: int = 0
+    characters: int = 0
+    images: int = 0
+    edit_time: float = 0.0
+
+    def add(self, note: NoteStatistics | None, edit_time: float = 0.0, sign: int = 1) -> None:
+        """Adds (sign 1) or removes (sign -1) a note and an edit time"""
+        if note is not None:
+            self.notes += sign
+            self.words += sign * note.words
+            self.characters += sign * note.characters
+            self.images += sign * note.images
+        self.edit_time = max(0.0, self.edit_time + sign * edit_time)
+
+
+@dataclass
+class Streaks:
+    """Numbers of consecutive days with a note: up to today (or yesterday), and the longest ever"""
+    current: int = 0
+    longest: int = 0
+
+
+def count_note(html_content: str, images: list[str] | None = None, size: int = 0,
+               mtime: float = 0.0) -> NoteStatistics:
+    """Counts the words, characters (white spaces normalized) and images of a note"""
+    text = html_to_text(html_content or "")
+    return NoteStatistics(size=size,
+                          words=sum(1 for _ in WORD_PATTERN.finditer(text)),
+                          characters=len(" ".join(text.split())),
+                          images=len(images if images is not None else extract_images(html_content)),
+                          mtime=mtime)
+
+
+class JournalStatistics(NoteListener):
+    """Statistics of the notes and their totals by month and weekday, updated as a NoteListener.
+    changed, if given, is called after each update, from the thread which made it."""
+
+    def __init__(self, path: Path = STATISTICS_FILE, changed: Callable[[], None] | None = None) -> None:
+        self.path = path
+        self.changed = changed
+        self._lock = threading.RLock()
+        self._notes: dict[str, NoteStatistics] = {}
+        self._edit_times: dict[str, float] = {}  # date: seconds spent editing the note
+        self._months: dict[str, Totals] = {}  # "YYYY-MM": totals of the notes of the month
+        self._weekdays = [Totals() for _ in range(7)]  # totals by weekday, Monday first
+        self._dates: list[str] | None = None  # sorted dates having a note, for the streaks
+        self._thresholds: list[int] | None = None  # numbers of words separating the intensity levels
+        self._load()
+
+    # region Reading
+    def note(self, date: str) -> NoteStatistics | None:
+        """Counts of the note of a date, None if there is none or it has not been counted yet"""
+        with self._lock:
+            return self._notes.get(date)
+
+    def edit_time(self, date: str) -> float:
+        """Seconds spent editing the note of a date"""
+        with self._lock:
+            return self._edit_times.get(date, 0.0)
+
+    def month(self, year: int, month: int) -> Totals:
+        """Totals of the notes of a month"""
+        with self._lock:
+            return Totals(*astuple(self._months.get(f"{year:04}-{month:02}", Totals())))
+
+    def weekdays(self) -> list[Totals]:
+        """Totals of the notes by weekday, Monday first"""
+        with self._lock:
+            return [Totals(*astuple(totals)) for totals in self._weekdays]
+
+    def intensity(self, date: str) -> int:
+        """Heatmap level of the note of a date, from 1 (among the shortest notes) to INTENSITY_LEVELS,
+        0 if it has not been counted"""
+        with self._lock:
+            note = self._notes.get(date)
+            if note is None:
+                return 0
+            if self._thresholds is None:
+                words = sorted(note.words for note in self._notes.values())
+                self._thresholds = [words[len(words) * level // INTENSITY_LEVELS]
+                                    for level in range(1, INTENSITY_LEVELS)]
+            return 1 + bisect.bisect_right(self._thresholds, note.words)
+
+    def streaks(self, today: str | None = None) -> Streaks:
+        """Days in a row with a note: up to today or yesterday, and the longest run"""
+        today = Date.fromisoformat(today) if today is not None else Date.today()
+        with self._lock:
+            if self._dates is None:
+                self._dates = sorted(self._notes)
+            dates = self._dates
+        streaks = Streaks()
+        run, previous = 0, None
+        for date in map(Date.fromisoformat, dates):
+            run = run + 1 if previous is not None and date - previous == timedelta(days=1) else 1
+            streaks.longest = max(streaks.longest, run)
+            previous = date
+        if previous is not None and timedelta(0) <= today - previous <= timedelta(days=1):
+            streaks.current = run
+        return streaks
+    # endregion
+
+    # region Updating
+    def add_edit_time(self, date: str, seconds: float) -> None:
+        """Adds time spent editing the note of a date. It is written to the file with the next saved
+        note, or by save()."""
+        if seconds <= 0:
+            return
+        with self._lock:
+            self._edit_times[date] = self._edit_times.get(date, 0.0) + seconds
+            self._totals(date, lambda totals: totals.add(None, seconds))
+        self._notify()
+
+    def synchronize(self, notes: dict[str, tuple[int, float]], load: Callable[[str], str | None]) -> int:
+        """Updates the statistics from the {date: (size, modification time)} list of existing notes,
+        load(date) being called only for new or modified notes. Returns the number of changes."""
+        with self._lock:
+            counted = {date: (note.size, note.mtime) for date, note in self._notes.items()}
+        changes = 0
+        for date in counted.keys() - notes.keys():
+            self._update(date, None, save=False)
+            changes += 1
+        for date, (size, mtime) in notes.items():
+            if counted.get(date) != (size, mtime):  # a note rewritten with the same size has another mtime
+                html_content = load(date)
+                if html_content is not None:
+                    self._update(date, count_note(html_content, size=size, mtime=mtime), save=False)
+                    changes += 1
+        if changes:
+            self.save()
+            self._notify()
+        return changes
+
+    def synchronize_in_background(self, repository: NoteRepository) -> threading.Thread:
+        """Synchronizes the statistics with a repository in a worker thread"""
+        thread = threading.Thread(target=lambda: self.synchronize({date: (note.size, note.mtime) for date, note
+                                                                   in repository.notes().items()},
+                                                                  repository.get_html),
+                                  name="statistics", daemon=True)
+        thread.start()
+        return thread
+
+    # NoteListener interface
+    def note_saved(self, note: DailyNote) -> None:
+        self._update(note.date, count_note(note.html_content, note.images, note.size, note.mtime))
+        self._notify()
+
+    def note_deleted(self, date: str) -> None:
+        self._update(date, None)
+        self._notify()
+
+    def notes_deleted(self) -> None:
+        with self._lock:
+            self._notes.clear()
+            self._edit_times.clear()
+            self._months.clear()
+            self._weekdays = [Totals() for _ in range(7)]
+            self._dates = self._thresholds = None
+            self._save()
+        self._notify()
+
+    def _update(self, date: str, note: NoteStatistics | None, save: bool = True) -> None:
+        """Replaces the counts of a note, None for a deleted note, and updates the totals by difference"""
+        with self._lock:
+            old_note = self._notes.get(date)
+            if note == old_note and (note is not None or date not in self._edit_times):
+                return
+            edit_time = 0.0 if note is not None else self._edit_times.pop(date, 0.0)
+            self._totals(date, lambda totals: totals.add(old_note, edit_time, sign=-1))
+            self._totals(date, lambda totals: totals.add(note))
+            if note is None:
+                self._notes.pop(date, None)
+            else:
+                self._notes[date] = note
+            if (old_note is None) != (note is None):
+                self._dates = None
+            if old_note is None or note is None or old_note.words != note.words:
+                self._thresholds = None
+            if save:
+                self._save()
+
+    def _totals(self, date: str, update: Callable[[Totals], None]) -> None:
+        """Applies update to the totals of the month and weekday of a date"""
+        update(self._months.setdefault(date[:7], Totals()))
+        update(self._weekdays[Date.fromisoformat(date).weekday()])
+
+    def _notify(self) -> None:
+        if self.changed is not None:
+            self.changed()
+    # endregion
+
+    # region Persistence
+    def _load(self) -> None:
+        """Reads the statistics file and computes the totals"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        if data.get("version") != STATISTICS_VERSION:
+            return  # counted again by synchronize
+        for date, counts in data.get("notes", {}).items():
+            self._update(date, NoteStatistics(*counts), save=False)
+        for date, seconds in data.get("edit_times", {}).items():
+            self._edit_times[date] = seconds
+            self._totals(date, lambda totals: totals.add(None, seconds))
+
+    def save(self) -> None:
+        """Writes the statistics file"""
+        with self._lock:
+            self._save()
+
+    def _save(self) -> None:
+        """Writes the statistics file, the lock being held"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.path.with_suffix(".tmp")
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"version": STATISTICS_VERSION,
+                                "notes": {date: astuple(note)
+                                          for date, note in self._notes.items()},
+                                "edit_times": self._edit_times}))
+        os.replace(temporary_path, self.path)
+    # endregion
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,170 @@
+"""Note storages: where and how note records are written.
+A note record is a dict with "date", "html_content" and "images" keys,
+stored in the format defined by note_format."""
+import json
+import os
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from journal.api import note_format
+from journal.api.constants_api import *
+from journal.api.settings import get_setting
+
+_storage = None
+
+
+class NoteStorage:
+    """Base class of note storages"""
+    name = ""
+
+    def list_notes(self) -> dict[str, int]:
+        """Lists existing notes without reading them: {date: size}"""
+        raise NotImplementedError
+
+    def list_details(self) -> dict[str, tuple[int, float]]:
+        """Lists existing notes without reading them: {date: (size, modification time or 0 if unknown)}"""
+        return {date: (size, 0.0) for date, size in self.list_notes().items()}
+
+    def note_details(self, date: str) -> tuple[int, float] | None:
+        """Size and modification time (or 0 if unknown) of a note without reading it, None if there is none"""
+        return self.list_details().get(date)
+
+    def stamp(self) -> list | None:
+        """Value changing whenever the storage is modified, by this process or another one,
+        None if it would cost as much as listing the notes: they are then listed at each start"""
+        raise NotImplementedError
+
+    def read(self, date: str) -> dict | None:
+        """Reads a note record, None if there is no note for this date"""
+        raise NotImplementedError
+
+    def read_range(self, start: str, end: str) -> Iterator[dict]:
+        """Reads the note records from start to end (included), in date order"""
+        for date in sorted(date for date in self.list_notes() if start <= date <= end):
+            record = self.read(date)
+            if record is not None:
+                yield record
+
+    def write(self, record: dict) -> int:
+        """Writes a note record, returns its size"""
+        raise NotImplementedError
+
+    def write_many(self, records: Iterable[dict]) -> list[int]:
+        """Writes several note records, returns their sizes"""
+        return [self.write(record) for record in records]
+
+    def delete(self, date: str) -> None:
+        """Deletes the note of a date"""
+        raise NotImplementedError
+
+    def delete_all(self) -> None:
+        """Deletes all notes"""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Releases the resources used by the storage"""
+        pass
+
+
+class JsonStorage(NoteStorage):
+    """One json file per note in NOTES_FOLDER"""
+    name = "json"
+
+    def __init__(self, folder: Path = NOTES_FOLDER) -> None:
+        self.folder = folder
+
+    def list_notes(self) -> dict[str, int]:
+        return {date: size for date, (size, _) in self.list_details().items()}
+
+    def list_details(self) -> dict[str, tuple[int, float]]:
+        self.folder.mkdir(parents=True, exist_ok=True)
+        details = {}
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                details[entry.name.removesuffix(".json")] = (stat.st_size, stat.st_mtime)
+        return details
+
+    def note_details(self, date: str) -> tuple[int, float] | None:
+        try:
+            stat = os.stat(self.folder / f"{date}.json")
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime
+
+    def stamp(self) -> list | None:
+        # a note file rewritten in place changes only the file: every file would have to be checked
+        return None
+
+    def read(self, date: str) -> dict | None:
+        try:
+            with open(self.folder / f"{date}.json", "r", encoding="utf-8") as f:
+                return note_format.unpack(json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def write(self, record: dict) -> int:
+        self.folder.mkdir(parents=True, exist_ok=True)
+        note_path = self.folder / f"{record['date']}.json"
+        temporary_path = note_path.with_suffix(".tmp")
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(note_format.pack(record), f, separators=(",", ":"))
+        os.replace(temporary_path, note_path)  # a note file is never left half written
+        return note_path.stat().st_size
+
+    def delete(self, date: str) -> None:
+        (self.folder / f"{date}.json").unlink(missing_ok=True)
+
+    def delete_all(self) -> None:
+        for note in self.folder.glob("*.json"):
+            note.unlink()
+
+
+def create_storage(name: str) -> NoteStorage:
+    """Creates a storage from its name, migrating json notes to it the first time"""
+    match name:
+        case JsonStorage.name:
+            return JsonStorage()
+        case "log":
+            from journal.api.log_storage import LogStorage
+            storage = LogStorage()
+        case "sqlite":
+            from journal.api.sqlite_storage import SqliteStorage
+            storage = SqliteStorage()
+        case _:
+            raise ValueError(f"Unknown storage backend: {name!r}")
+    migrate_json_notes(storage, storage.path.with_name(f"{storage.path.name}.migrated"))
+    return storage
+
+
+def get_storage() -> NoteStorage:
+    """Returns the storage in use, created on first call from the "storage" setting"""
+    global _storage
+    if _storage is None:
+        _storage = create_storage(get_setting("storage", STORAGE_BACKEND))
+    return _storage
+
+
+def set_storage(storage: NoteStorage) -> None:
+    """Replaces the storage in use"""
+    global _storage
+    if _storage is not None and _storage is not storage:
+        _storage.close()
+    _storage = storage
+
+
+def migrate_json_notes(storage: NoteStorage, marker: Path) -> int:
+    """Copies the notes of NOTES_FOLDER into a storage, once: marker is created when done.
+    Json files are left untouched. Returns the number of migrated notes."""
+    if marker.exists():
+        return 0
+    source = JsonStorage()
+    dates = source.list_notes()
+    count = len(storage.write_many(source.read_range(min(dates), max(dates)))) if dates else 0
+    marker.parent.mkdir(parents=True, exist_ok=True)
+    marker.write_text(f"{count} notes migrated from {NOTES_FOLDER}\n", encoding="utf-8")
+    return count
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,82 @@
+"""Functions to extract and normalize the text of notes"""
+import html
+import re
+import unicodedata
+from html.parser import HTMLParser
+from typing import Iterator
+
+WORD_PATTERN = re.compile(r"\w+")
+NOTE_TEMPLATE = ('<html><head><meta name="qrichtext" content="1" /><meta charset="utf-8" /></head>'
+                 '<body>\n{}</body></html>')  # html of a new note, filled with its paragraphs
+BLOCK_TAGS = {"p", "br", "li", "div", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote"}
+
+
+class _TextExtractor(HTMLParser):
+    """Collects the text of a html body, one line per block"""
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._ignored = 0  # depth in head, style or script tags
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if tag in ("head", "style", "script"):
+            self._ignored += 1
+        elif tag in BLOCK_TAGS and self.parts and not self.parts[-1].endswith("\n"):
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in ("head", "style", "script"):
+            self._ignored = max(0, self._ignored - 1)
+
+    def handle_data(self, data: str) -> None:
+        if not self._ignored:
+            self.parts.append(data)
+
+
+def html_to_text(html: str) -> str:
+    """Plain text of a note html content"""
+    extractor = _TextExtractor()
+    extractor.feed(html or "")
+    extractor.close()
+    return unicodedata.normalize("NFC", "".join(extractor.parts).strip())
+
+
+def text_to_html(text: str) -> str:
+    """Html paragraphs of a plain text, one per line"""
+    return "".join(f"<p>{html.escape(line) or '<br />'}</p>\n" for line in text.splitlines())
+
+
+def append_html(note_html: str | None, fragment: str) -> str:
+    """Html content of a note with fragment added at the end of its body, or of a new note"""
+    if not note_html:
+        return NOTE_TEMPLATE.format(fragment)
+    position = note_html.rfind("</body>")
+    if position == -1:
+        return note_html + fragment
+    return note_html[:position] + fragment + note_html[position:]
+
+
+def html_body(note_html: str) -> str:
+    """Content of the body of a note html content"""
+    start = note_html.find("<body")
+    end = note_html.rfind("</body>")
+    if start == -1 or end == -1:
+        return note_html
+    return note_html[note_html.index(">", start) + 1:end]
+
+
+def normalize(word: str) -> str:
+    """Lower case word without accents: "Été" -> "ete" """
+    decomposed = unicodedata.normalize("NFD", word.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text: str) -> Iterator[tuple[str, int, int]]:
+    """Yields the normalized words of a text with their start and end offsets in it"""
+    for match in WORD_PATTERN.finditer(text):
+        yield normalize(match.group()), match.start(), match.end()
+
+
+if __name__ == '__main__':
+    pass
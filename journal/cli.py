@@ -0,0 +1,200 @@
+"""Command line interface to the journal, without Qt: python -m journal <command>
+
+Notes are read one at a time and written out as soon as they are read, so that the output of a large
+journal can be piped to other commands."""
+import argparse
+import os
+import sys
+from datetime import date as Date
+from pathlib import Path
+
+from journal.api.daily_note import DailyNote, list_notes, read_notes
+from journal.api.images_functions import extract_images
+from journal.api.text_functions import html_to_text, text_to_html, append_html, tokenize
+
+
+def iso_date(value: str) -> str:
+    """Argument type of dates: YYYY-MM-DD or "today" """
+    if value == "today":
+        return Date.today().isoformat()
+    try:
+        return Date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date: {value!r} (expected YYYY-MM-DD)")
+
+
+def command_list(arguments: argparse.Namespace) -> None:
+    """Dates and sizes of the notes, without reading them"""
+    for date, size in sorted(list_notes().items()):
+        if arguments.start <= date <= arguments.end:
+            sys.stdout.write(f"{date}\t{size}\n")
+
+
+def command_dump(arguments: argparse.Namespace) -> None:
+    """Contents of the notes, as text or html"""
+    for note in read_notes(arguments.start, arguments.end):
+        content = note.html_content if arguments.html else html_to_text(note.html_content)
+        sys.stdout.write(f"# {note.date}\n{content}\n\n")
+
+
+def command_append(arguments: argparse.Namespace) -> None:
+    """Adds text at the end of a note, today's by default, updating what the window keeps up to date"""
+    text = " ".join(arguments.text) if arguments.text else sys.stdin.read()
+    if not text.strip():
+        return
+    from journal.api.image_collector import ImageCollector
+    from journal.api.note_repository import note_repository
+    from journal.api.revisions import revision_store
+    from journal.api.search import SearchIndex
+    from journal.api.statistics import JournalStatistics
+    html_content = append_html(note_repository.get_html(arguments.date), text_to_html(text))
+    search_index = SearchIndex()
+    for listener in (search_index, JournalStatistics(), ImageCollector(), revision_store):
+        note_repository.add_listener(listener)
+    try:
+        note_repository.save(DailyNote(arguments.date, html_content, extract_images(html_content)))
+    finally:
+        search_index.close()
+
+
+def command_export(arguments: argparse.Namespace) -> None:
+    """One file per note in a folder, as text or html"""
+    folder = Path(arguments.folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    suffix = ".txt" if arguments.text else ".html"
+    for note in read_notes(arguments.start, arguments.end):
+        content = html_to_text(note.html_content) if arguments.text else note.html_content
+        path = folder / f"{note.date}{suffix}"
+        path.write_text(content, encoding="utf-8")
+        sys.stdout.write(f"{path}\n")
+
+
+def command_archive(arguments: argparse.Namespace) -> None:
+    """Notes and their images in a zip archive, as html or Markdown"""
+    from journal.api.archive import export_archive
+    count = export_archive(arguments.archive, arguments.start, arguments.end, markdown=arguments.markdown)
+    sys.stdout.write(f"{arguments.archive}\t{count} notes\n")
+
+
+def command_import(arguments: argparse.Namespace) -> None:
+    """Merges the notes of an archive into the journal"""
+    from journal.api.archive import import_archive
+    from journal.api.image_collector import ImageCollector
+    result = import_archive(arguments.archive)
+    if result.added or result.merged:
+        # the notes were not written through the repository: the images they use must be listed
+        ImageCollector().build(read_notes())
+    sys.stdout.write(f"added\t{result.added}\nmerged\t{result.merged}\nunchanged\t{result.unchanged}\n")
+
+
+def command_snapshot(arguments: argparse.Namespace) -> None:
+    """Snapshot of the notes and images, only the contents changed since the last one being written"""
+    from journal.api.snapshots import SnapshotStore
+    snapshot = SnapshotStore().take()
+    sys.stdout.write(f"{snapshot.name}\t{snapshot.notes} notes\t{snapshot.images} images\n")
+
+
+def command_snapshots(arguments: argparse.Namespace) -> None:
+    """Snapshots, oldest first"""
+    from journal.api.snapshots import SnapshotStore
+    for snapshot in SnapshotStore().snapshots():
+        sys.stdout.write(f"{snapshot.name}\t{snapshot.notes} notes\t{snapshot.images} images\t{snapshot.reason}\n")
+
+
+def command_restore(arguments: argparse.Namespace) -> None:
+    """Puts the notes and images back as they were at a snapshot"""
+    from journal.api.image_collector import ImageCollector
+    from journal.api.snapshots import SnapshotStore
+    count = SnapshotStore().restore(arguments.snapshot)
+    if count:
+        # the notes were not written through the repository: the images they use must be listed
+        ImageCollector().build(read_notes())
+    sys.stdout.write(f"restored\t{count}\n")
+
+
+def command_stats(arguments: argparse.Namespace) -> None:
+    """Number of notes, words, characters and images"""
+    notes = words = characters = images = 0
+    first = last = None
+    for note in read_notes(arguments.start, arguments.end):
+        text = html_to_text(note.html_content)
+        notes += 1
+        words += sum(1 for _ in tokenize(text))
+        characters += len(text)
+        images += len(note.images if note.images is not None else extract_images(note.html_content))
+        first = first or note.date
+        last = note.date
+    sys.stdout.write(f"notes\t{notes}\nfirst\t{first or '-'}\nlast\t{last or '-'}\n"
+                     f"words\t{words}\ncharacters\t{characters}\nimages\t{images}\n")
+
+
+def parser() -> argparse.ArgumentParser:
+    """Parser of the command line"""
+    main_parser = argparse.ArgumentParser(prog="journal", description="Training journal, without its window")
+    commands = main_parser.add_subparsers(dest="command", required=True)
+
+    date_range = argparse.ArgumentParser(add_help=False)
+    date_range.add_argument("--from", dest="start", type=iso_date, help="first date (included)")
+    date_range.add_argument("--to", dest="end", type=iso_date, help="last date (included)")
+
+    command = commands.add_parser("list", parents=[date_range], help="list the dates and sizes of the notes")
+    command.set_defaults(function=command_list)
+
+    command = commands.add_parser("dump", parents=[date_range], help="print the notes")
+    command.add_argument("--html", action="store_true", help="print the html instead of the text")
+    command.set_defaults(function=command_dump)
+
+    command = commands.add_parser("append", help="add text at the end of a note (read from stdin without text)")
+    command.add_argument("text", nargs="*")
+    command.add_argument("--date", type=iso_date, default="today", help="date of the note (today by default)")
+    command.set_defaults(function=command_append)
+
+    command = commands.add_parser("export", parents=[date_range], help="write one file per note in a folder")
+    command.add_argument("folder")
+    command.add_argument("--text", action="store_true", help="write text files instead of html")
+    command.set_defaults(function=command_export)
+
+    command = commands.add_parser("archive", parents=[date_range],
+                                  help="write the notes and their images to a zip archive")
+    command.add_argument("archive")
+    command.add_argument("--markdown", action="store_true", help="write Markdown notes instead of html")
+    command.set_defaults(function=command_archive)
+
+    command = commands.add_parser("import", help="merge the notes of a zip archive into the journal")
+    command.add_argument("archive")
+    command.set_defaults(function=command_import)
+
+    command = commands.add_parser("snapshot", help="take a snapshot of the notes and images")
+    command.set_defaults(function=command_snapshot)
+
+    command = commands.add_parser("snapshots", help="list the snapshots")
+    command.set_defaults(function=command_snapshots)
+
+    command = commands.add_parser("restore", help="put the notes and images back as they were at a snapshot "
+                                                  "(the current ones are snapshotted first)")
+    command.add_argument("snapshot", help="name of the snapshot, as listed by the snapshots command")
+    command.set_defaults(function=command_restore)
+
+    command = commands.add_parser("stats", parents=[date_range], help="count notes, words and images")
+    command.set_defaults(function=command_stats)
+    return main_parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Runs a command, returns the exit status"""
+    arguments = parser().parse_args(argv)
+    if "start" in arguments:
+        arguments.start = arguments.start or "0000-00-00"
+        arguments.end = arguments.end or "9999-99-99"
+    try:
+        arguments.function(arguments)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # the reader of the output stopped (e.g. head): silence the flush at exit
+        sys.stdout = open(os.devnull, "w")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    pass
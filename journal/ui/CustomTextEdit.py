@@ -1,12 +1,14 @@
 """Contains CustomTextEdit class"""
 
-from PySide6.QtCore import Qt
-from PySide6.QtGui import QWheelEvent
+from PySide6.QtCore import Qt, QUrl
+from PySide6.QtGui import QDesktopServices, QMouseEvent, QTextDocument, QWheelEvent
 from PySide6.QtWidgets import QTextEdit
 
+from journal.ui.format_inspection import image_at
+
 
 class CustomTextEdit(QTextEdit):
-    """A zoomable QTextEdit"""
+    """A zoomable QTextEdit, opening the original of an image on Ctrl+click"""
     def __init__(self):
         super().__init__()
         self.image_detected_callback = None
@@ -22,30 +24,39 @@ class CustomTextEdit(QTextEdit):
         else:
             super().wheelEvent(event)
 
-    # TODO: permettre la suppresion des images inutilisées (car effacées par l'utilisateur) du dossier Images
+    def mouseReleaseEvent(self, event: QMouseEvent):
+        if event.modifiers() == Qt.KeyboardModifier.ControlModifier and event.button() == Qt.MouseButton.LeftButton:
+            link = self.anchorAt(event.position().toPoint())
+            if link:
+                QDesktopServices.openUrl(QUrl(link) if "://" in link else QUrl.fromLocalFile(link))
+                return
+        super().mouseReleaseEvent(event)
+
+    # Images removed from notes are deleted from the Images folder by journal.api.image_collector
     def keyPressEvent(self, event):
         self.image_detected_callback = None
-        if event.key() in (Qt.Key.Key_Backspace, Qt.Key.Key_Delete):
-            cursor = self.textCursor()
-            cursor_position = cursor.position()
-
-            # Check if the cursor is positioned on an image
-            cursor.movePosition(cursor.MoveOperation.StartOfBlock)
-            while not cursor.atEnd():
-                cursor.movePosition(cursor.MoveOperation.NextCharacter, cursor.MoveMode.KeepAnchor)
-                if cursor.charFormat().isImageFormat():
-                    image_position = cursor.position()
-                    image_name = cursor.charFormat().toImageFormat().name()
-                    if image_position <= cursor_position < image_position + len(image_name):
-                        # Cursor is inside an image, remove it
-                        cursor.removeSelectedText()
-                        self.image_detected_callback = image_name
-                        return
-
-            # If cursor is not on an image, handle default behavior
-            super().keyPressEvent(event)
-        else:
-            super().keyPressEvent(event)
+        cursor = self.textCursor()
+        if event.key() in (Qt.Key.Key_Backspace, Qt.Key.Key_Delete) and not cursor.hasSelection():
+            # Check if the character to delete is an image
+            position = cursor.position() - 1 if event.key() == Qt.Key.Key_Backspace else cursor.position()
+            image_format = image_at(self.document(), position) if position >= 0 else None
+            if image_format is not None:
+                cursor.setPosition(position)
+                cursor.setPosition(position + 1, cursor.MoveMode.KeepAnchor)
+                cursor.removeSelectedText()
+                self.image_detected_callback = image_format.name()
+                return
+        super().keyPressEvent(event)
+
+    def set_note_document(self, document: QTextDocument) -> None:
+        """Shows another document, which the editor then owns"""
+        previous_document = self.document()
+        owned = previous_document.parent() is self  # otherwise deleted by setDocument if needed
+        document.setDefaultFont(previous_document.defaultFont())
+        document.setParent(self)
+        self.setDocument(document)
+        if owned:
+            previous_document.deleteLater()
 
     def set_image_detected_callback(self, callback: str | None) -> None:
         """Method needed to get image name when deleted"""
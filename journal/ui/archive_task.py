@@ -0,0 +1,57 @@
+"""Export and import of archives (journal.api.archive), snapshots and their restore, and migration of legacy
+images, in the thread pool"""
+import threading
+from typing import Callable
+
+from PySide6.QtCore import QObject, QThreadPool, Signal
+
+
+class ArchiveCancelled(Exception):
+    """Raised in an export or import when it is cancelled"""
+
+
+class ArchiveTask(QObject):
+    """Runs export_archive, import_archive, SnapshotStore.take or restore, or migrate_legacy_images in the
+    thread pool.
+    progress gives the percentage done; finished gives the result of the function, None if it was
+    cancelled or failed, and the error message if it failed."""
+    progress = Signal(int)
+    finished = Signal(object, str)
+
+    def __init__(self, parent: QObject | None = None) -> None:
+        super().__init__(parent)
+        self._cancelled = threading.Event()
+
+    def start(self, function: Callable, *args, **kwargs) -> None:
+        """Starts function(*args, progress=..., **kwargs)"""
+        self._cancelled = threading.Event()
+        cancelled = self._cancelled
+        percentage = -1
+
+        def progress(done: int, total: int) -> None:
+            nonlocal percentage
+            if cancelled.is_set():
+                raise ArchiveCancelled
+            if 100 * done // max(1, total) != percentage:  # one signal per percent, not per note
+                percentage = 100 * done // max(1, total)
+                self.progress.emit(percentage)
+
+        def run() -> None:
+            try:
+                self.finished.emit(function(*args, progress=progress, **kwargs), "")
+            except ArchiveCancelled:
+                self.finished.emit(None, "")
+            except Exception as error:  # e.g. an encrypted or unsupported zip entry: finished is always emitted
+                self.finished.emit(None, str(error))
+
+        QThreadPool.globalInstance().start(run)
+
+    def cancel(self) -> None:
+        """Stops the task: an export leaves no archive, an import keeps the notes already merged"""
+        self._cancelled.set()
+
+    def close(self) -> None:
+        """Stops the task without emitting finished, before its window is closed. The function stops
+        between two notes: wait for the thread pool to be sure it returned."""
+        self.blockSignals(True)
+        self.cancel()
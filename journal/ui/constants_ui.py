@@ -6,10 +6,23 @@ __all__ = ['ICON_BOLD', 'ICON_ITALIC', 'ICON_UNDERLINE', 'ICON_STRIKETHROUGH',
            'ICON_CODE', 'ICON_COPY', 'ICON_PASTE', 'ICON_SEARCH', 'ICON_IMAGE',
            'WID_CALENDAR_COLLAPSED_WIDTH', 'WID_CALENDAR_EXPANDED_WIDTH',
            'DEFAULT_FONT_SIZE', 'CMB_SIZES',
-           'STYLE_FILE', 'BASE_FOLDER', 'FILE_FILTER',
+           'STYLE_FILE', 'STYLE_VARIABLES', 'BASE_FOLDER', 'FILE_FILTER',
            'YES', 'NO', 'OK',
-           'BG_WHEN_NOTE', 'BG_WHEN_EMPTY', 'BG_WHEN_NOTE_SELECTED', 'BG_WHEN_EMPTY_SELECTED',
-           'DELETE_ALL_MESSAGE', ]
+           'BG_WHEN_NOTE', 'BG_WHEN_EMPTY', 'BG_WHEN_NOTE_SELECTED', 'BG_WHEN_EMPTY_SELECTED', 'BG_HEATMAP',
+           'DELETE_ALL_MESSAGE',
+           'AUTOSAVE_DELAY', 'AUTOSAVE_ERROR_MESSAGE', 'CLOSE_ERROR_MESSAGE',
+           'SEARCH_DELAY', 'SEARCH_HELP_MESSAGE',
+           'HEARTBEAT_INTERVAL', 'STALL_THRESHOLD',
+           'LARGE_NOTE_SIZE', 'PARSE_CHUNK_SIZE', 'PARSE_SLICE', 'MAX_CACHED_IMAGES_BYTES',
+           'IMAGE_PLACEHOLDER_COLOR', 'IMAGES_RELAYOUT_DELAY',
+           'IMAGE_DISPLAY_WIDTH', 'DISPLAY_VARIANT_QUALITY', 'IMPORT_PROGRESS_DELAY', 'IMPORT_ERROR_MESSAGE',
+           'ARCHIVE_HTML_FILTER', 'ARCHIVE_MARKDOWN_FILTER', 'ARCHIVE_EXPORTED_MESSAGE', 'ARCHIVE_IMPORTED_MESSAGE',
+           'ARCHIVE_ERROR_MESSAGE',
+           'WATCH_DELAY', 'WATCH_POLL_INTERVAL', 'CONFLICT_MESSAGE',
+           'EDIT_PAUSE', 'WEEKDAYS', 'STATISTICS_MESSAGE', 'STATISTICS_TOOLTIP',
+           'TIMELINE_WIDTH', 'TIMELINE_MARGIN', 'TIMELINE_LOADING_LINES',
+           'TIMELINE_PREFETCH', 'TIMELINE_PREFETCH_DELAY', 'TIMELINE_CACHED_ENTRIES',
+           'SNAPSHOT_REASONS', 'SNAPSHOT_RESTORED_MESSAGE', 'SNAPSHOT_ERROR_MESSAGE', 'RESTORE_ERROR_MESSAGE', ]
 
 from PySide6.QtGui import QColor
 from PySide6.QtWidgets import QMessageBox
@@ -40,6 +53,10 @@ STYLE_FILE = Path(__file__).parent / "style.css"
 EXTENSIONS = [".jpg", ".jpeg", ".png", ".gif", ".bmp"]
 FILE_FILTER = f"Images ({" ".join(f"*{extension}" for extension in EXTENSIONS)})"
 
+# Archives
+ARCHIVE_HTML_FILTER = "Archive html (*.zip)"
+ARCHIVE_MARKDOWN_FILTER = "Archive Markdown (*.zip)"
+
 # Box buttons
 YES = QMessageBox.StandardButton.Yes
 NO = QMessageBox.StandardButton.No
@@ -50,7 +67,75 @@ BG_WHEN_EMPTY = QColor("white")
 BG_WHEN_NOTE = QColor("yellow")
 BG_WHEN_NOTE_SELECTED = "rgb(225, 220, 22)"
 BG_WHEN_EMPTY_SELECTED = "rgb(225, 250, 250)"
+# by intensity (journal.api.statistics), from the shortest notes to the longest ones
+BG_HEATMAP = [QColor(255, 250, 170), QColor("yellow"), QColor(255, 200, 0), QColor(255, 150, 0)]
+
+# Values of the {variables} of STYLE_FILE
+STYLE_VARIABLES = {"bg_when_note_selected": BG_WHEN_NOTE_SELECTED,
+                   "bg_when_empty_selected": BG_WHEN_EMPTY_SELECTED}
+
+# Autosave
+AUTOSAVE_DELAY = 500  # quiet time in ms after the last change before a note is saved
+
+# Search
+SEARCH_DELAY = 200  # ms without typing before searching
+
+# Note loading
+LARGE_NOTE_SIZE = 200_000  # html length from which notes are parsed chunk by chunk
+PARSE_CHUNK_SIZE = 50_000  # html length of these chunks
+PARSE_SLICE = 15  # ms of parsing between two passes of the event loop
+MAX_CACHED_IMAGES_BYTES = 64 * 1024 * 1024  # memory cap for decoded images, shared by all notes
+IMAGE_PLACEHOLDER_COLOR = "rgb(235, 235, 235)"  # shown until an image is decoded
+IMAGES_RELAYOUT_DELAY = 50  # ms to gather decoded images before laying out the note again
+
+# Image import
+IMAGE_DISPLAY_WIDTH = 1280  # width of the display variants of wider images
+DISPLAY_VARIANT_QUALITY = 85  # jpeg quality of the display variants
+IMPORT_PROGRESS_DELAY = 300  # ms of import before showing its progress
+
+# Changes made by other processes
+WATCH_DELAY = 300  # ms to gather the changes of the journal folders before handling them
+WATCH_POLL_INTERVAL = 2000  # ms between two checks of the folders the file system can't watch
+
+# Statistics
+EDIT_PAUSE = 60  # s without typing after which the time is not counted as spent editing
+WEEKDAYS = ["lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche"]
+
+# Timeline
+TIMELINE_WIDTH = 350  # initial width of the timeline
+TIMELINE_MARGIN = 6  # px around an entry
+TIMELINE_LOADING_LINES = 5  # lines given to an entry until its note is laid out
+TIMELINE_PREFETCH = 20  # entries loaded before and after the visible ones
+TIMELINE_PREFETCH_DELAY = 50  # ms without scrolling before loading the entries shown
+TIMELINE_CACHED_ENTRIES = 300  # entries whose note and document are kept in memory
+
+# Snapshots: labels of the reasons stored in the snapshots (journal.api.snapshots)
+SNAPSHOT_REASONS = {"automatic": "automatique",
+                    "manual": "manuelle",
+                    "before delete all": "avant l'effacement de toutes les notes",
+                    "before restore": "avant une restauration"}
+
+# Instrumentation
+HEARTBEAT_INTERVAL = 50  # ms between two beats of the event loop
+STALL_THRESHOLD = 0.25  # s without a beat before the event loop is considered stalled
 
 # Messages
 DELETE_ALL_MESSAGE = """Voulez-vous vraiment tout effacer ?
-Attention, cette action est irrémédiable..."""
+Une sauvegarde sera faite avant : « Restaurer une sauvegarde... » pourra revenir en arrière."""
+IMPORT_ERROR_MESSAGE = "Ces images n'ont pas pu être insérées :\n{}"
+ARCHIVE_EXPORTED_MESSAGE = "{} notes ont été exportées."
+ARCHIVE_IMPORTED_MESSAGE = """{} notes ajoutées, {} notes complétées.
+{} notes étaient déjà dans le journal."""
+ARCHIVE_ERROR_MESSAGE = "L'archive n'a pas pu être traitée :\n{}"
+SNAPSHOT_RESTORED_MESSAGE = "{} notes ont été restaurées.\nL'état d'avant la restauration a été sauvegardé."
+SNAPSHOT_ERROR_MESSAGE = "La sauvegarde n'a pas pu être faite, rien n'a été effacé :\n{}"
+RESTORE_ERROR_MESSAGE = "La sauvegarde n'a pas pu être restaurée :\n{}"
+AUTOSAVE_ERROR_MESSAGE = "La note du {} n'a pas pu être enregistrée, un nouvel essai sera fait :\n{}"
+CLOSE_ERROR_MESSAGE = "Des modifications n'ont pas pu être enregistrées :\n{}"
+CONFLICT_MESSAGE = """Cette note a été modifiée ailleurs pendant que vous l'écriviez.
+La version écartée restera dans l'historique de la note."""
+STATISTICS_MESSAGE = """{} notes, {} mots, {} images, {} min d'écriture
+Série en cours : {} jours ; record : {} jours"""
+STATISTICS_TOOLTIP = "Jours les plus actifs :\n{}"
+SEARCH_HELP_MESSAGE = """Les accents et majuscules sont ignorés.
+mot* : mots commençant par « mot » ; "une phrase" : expression exacte"""
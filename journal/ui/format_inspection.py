@@ -0,0 +1,68 @@
+"""Queries on the character formats of a QTextDocument.
+The document is walked run by run (QTextFragment: characters sharing a format) instead of character
+by character, so that a query costs one step per format change, not per character."""
+from dataclasses import dataclass
+from typing import Iterator
+
+from PySide6.QtGui import QFont, QTextCharFormat, QTextCursor, QTextDocument, QTextFragment, QTextImageFormat
+
+MIXED = None  # value of a property differing in a range
+
+
+@dataclass
+class RangeFormat:
+    """Format of a text range: the value of each property, MIXED when it differs in the range"""
+    size: int | None
+    bold: bool | None
+    italic: bool | None
+    underline: bool | None
+    strikethrough: bool | None
+
+    @classmethod
+    def from_char_format(cls, char_format: QTextCharFormat) -> "RangeFormat":
+        return cls(int(char_format.fontPointSize()), char_format.fontWeight() == QFont.Weight.Bold,
+                   char_format.fontItalic(), char_format.fontUnderline(), char_format.fontStrikeOut())
+
+    def merge(self, other: "RangeFormat") -> bool:
+        """Marks as MIXED the properties differing in other, returns True if they are all MIXED"""
+        for name in ("size", "bold", "italic", "underline", "strikethrough"):
+            if getattr(self, name) != getattr(other, name):
+                setattr(self, name, MIXED)
+        return (self.size, self.bold, self.italic, self.underline, self.strikethrough) == (MIXED,) * 5
+
+
+def fragments(document: QTextDocument, start: int, end: int) -> Iterator[QTextFragment]:
+    """Fragments overlapping the range [start, end[ of a document"""
+    block = document.findBlock(start)
+    while block.isValid() and block.position() < end:
+        for iterator in block:
+            fragment = iterator.fragment()
+            if fragment.position() >= end:
+                return
+            if fragment.position() + fragment.length() > start:
+                yield fragment
+        block = block.next()
+
+
+def selection_format(cursor: QTextCursor) -> RangeFormat:
+    """Format of the selection of a cursor in a single pass, or of its position without selection"""
+    if not cursor.hasSelection():
+        return RangeFormat.from_char_format(cursor.charFormat())
+    range_format = None
+    for fragment in fragments(cursor.document(), cursor.selectionStart(), cursor.selectionEnd()):
+        fragment_format = RangeFormat.from_char_format(fragment.charFormat())
+        if range_format is None:
+            range_format = fragment_format
+        elif range_format.merge(fragment_format):
+            break
+    # a selection of paragraph separators only has no fragment
+    return range_format or RangeFormat.from_char_format(cursor.charFormat())
+
+
+def image_at(document: QTextDocument, position: int) -> QTextImageFormat | None:
+    """Image of the character at position, None if it is not an image"""
+    for fragment in fragments(document, position, position + 1):
+        char_format = fragment.charFormat()
+        if char_format.isImageFormat():
+            return char_format.toImageFormat()
+    return None
@@ -0,0 +1,145 @@
+"""Import of images into the notes, in the thread pool.
+Each image is copied to the store, then, if it is wider than IMAGE_DISPLAY_WIDTH, decoded once
+directly at this width to a display variant stored next to it. Notes show the display variant,
+linked to the original."""
+import html
+import os
+import threading
+from pathlib import Path
+
+from PySide6.QtCore import QObject, QSize, QThreadPool, Signal
+from PySide6.QtGui import QImageIOHandler, QImageReader, QImageWriter
+
+from journal.api.images_functions import copy_image, display_variant_path
+from journal.ui.constants_ui import *
+
+HASHING_SHARE = 0.8  # part of the import of an image shown as done once it is copied
+
+
+class ImportCancelled(Exception):
+    """Raised in the import of an image when the import is cancelled"""
+
+
+def create_display_variant(image: Path, width: int = IMAGE_DISPLAY_WIDTH) -> Path | None:
+    """Display variant of a stored image, created if necessary; None if the image is not wider than width,
+    is animated or can't be read"""
+    for suffix in (".jpg", ".png"):
+        variant = display_variant_path(image, width, suffix)
+        if variant.exists():
+            return variant
+    reader = QImageReader(str(image))
+    reader.setAutoTransform(True)  # camera photos are often rotated by their EXIF orientation
+    if reader.supportsAnimation() and reader.imageCount() > 1:
+        return None
+    size = reader.size()
+    rotated = bool(reader.transformation() & QImageIOHandler.Transformation.TransformationRotate90)
+    displayed_width = size.height() if rotated else size.width()
+    if not size.isValid() or displayed_width <= width:
+        return None
+    reader.setScaledSize(QSize(max(1, size.width() * width // displayed_width),
+                               max(1, size.height() * width // displayed_width)))
+    scaled_image = reader.read()
+    if scaled_image.isNull():
+        return None
+    variant = display_variant_path(image, width, ".png" if scaled_image.hasAlphaChannel() else ".jpg")
+    temporary_path = variant.with_name(f".{variant.name}.tmp")
+    writer = QImageWriter(str(temporary_path), variant.suffix[1:].encode())
+    writer.setQuality(DISPLAY_VARIANT_QUALITY)
+    if not writer.write(scaled_image):
+        temporary_path.unlink(missing_ok=True)
+        return None
+    os.replace(temporary_path, variant)
+    return variant
+
+
+def image_html(image: Path, variant: Path | None) -> str:
+    """Html inserting an image in a note: its display variant linked to it, or itself"""
+    if variant is None:
+        return f'<img src="{html.escape(str(image))}" />'
+    return f'<a href="{html.escape(str(image))}"><img src="{html.escape(str(variant))}" /></a>'
+
+
+class _Messenger(QObject):
+    """Carries the results of the thread pool to the GUI thread"""
+    progressed = Signal(int, float)
+    imported = Signal(int, str)
+    failed = Signal(int, str)
+
+
+class ImageImporter(QObject):
+    """Imports images in parallel in the thread pool.
+    progress gives the percentage done; finished gives the html of the imported images, in the order
+    of the files, and the error messages of the others; nothing is imported if the import is cancelled."""
+    progress = Signal(int)
+    finished = Signal(list, list)
+
+    def __init__(self, parent: QObject | None = None) -> None:
+        super().__init__(parent)
+        self._messenger = _Messenger(self)
+        self._messenger.progressed.connect(self._progressed)
+        self._messenger.imported.connect(self._imported)
+        self._messenger.failed.connect(self._failed)
+        self._cancelled = threading.Event()
+        self._fractions = []  # done of each file, from 0 to 1
+        self._results = []  # html of each file, None until imported, "" if failed
+        self._errors = []
+
+    def start(self, paths: list[str]) -> None:
+        """Starts importing images"""
+        self._cancelled = threading.Event()
+        self._fractions = [0.0] * len(paths)
+        self._results = [None] * len(paths)
+        self._errors = []
+        cancelled = self._cancelled
+        for index, path in enumerate(paths):
+            QThreadPool.globalInstance().start(lambda index=index, path=path: self._import(index, path, cancelled))
+
+    def cancel(self) -> None:
+        """Stops the import; images already copied are left to the image collector"""
+        self._cancelled.set()
+
+    def _import(self, index: int, path: str, cancelled: threading.Event) -> None:
+        """Imports an image, in the thread pool"""
+        messenger = self._messenger
+        file_size = 1
+        read = 0
+
+        def progress(chunk_size: int) -> None:
+            nonlocal read
+            if cancelled.is_set():
+                raise ImportCancelled
+            read += chunk_size
+            messenger.progressed.emit(index, HASHING_SHARE * read / file_size)
+
+        try:
+            file_size = max(1, os.path.getsize(path))
+            image = copy_image(path, progress)
+            if cancelled.is_set():
+                raise ImportCancelled
+            variant = create_display_variant(image)
+            messenger.imported.emit(index, image_html(image, variant))
+        except ImportCancelled:
+            messenger.imported.emit(index, "")
+        except Exception as error:  # any error of a decoder: the import of the other images goes on
+            messenger.failed.emit(index, f"{Path(path).name} : {error}")
+
+    def _progressed(self, index: int, fraction: float) -> None:
+        self._fractions[index] = fraction
+        self.progress.emit(int(100 * sum(self._fractions) / len(self._fractions)))
+
+    def _imported(self, index: int, image_html_content: str) -> None:
+        self._results[index] = image_html_content
+        self._progressed(index, 1.0)
+        self._finish_if_done()
+
+    def _failed(self, index: int, message: str) -> None:
+        self._results[index] = ""
+        self._errors.append(message)
+        self._progressed(index, 1.0)
+        self._finish_if_done()
+
+    def _finish_if_done(self) -> None:
+        if None in self._results:
+            return
+        results = [] if self._cancelled.is_set() else [result for result in self._results if result]
+        self.finished.emit(results, self._errors)
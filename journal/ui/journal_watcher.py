@@ -0,0 +1,133 @@
+"""Contains JournalWatcher class: reports the changes made to the journal folders by other processes.
+
+NOTES_FOLDER, IMAGES_FOLDER and its shards are watched with QFileSystemWatcher; where the file system
+can't watch them (network drives, no more watches available), they are checked every
+WATCH_POLL_INTERVAL ms instead. Directory watches miss the files rewritten in place (sync clients
+usually replace them): check() can also be called when such a change may have happened.
+The notes are listed and compared in the thread pool, the GUI thread only reloads the changed ones."""
+import os
+from pathlib import Path
+
+from PySide6.QtCore import QFileSystemWatcher, QObject, QThreadPool, QTimer, Signal
+
+from journal.api import instrumentation
+from journal.api.change_feed import NoteChangeFeed
+from journal.api.constants_api import IMAGES_FOLDER, NOTES_FOLDER
+from journal.ui.constants_ui import *
+
+
+class JournalWatcher(QObject):
+    """Gathers the changes of the journal folders for WATCH_DELAY ms, then gives by notes_changed
+    the dates of the notes changed by other processes, and tells by images_changed that images
+    were added or removed"""
+    notes_changed = Signal(list)
+    images_changed = Signal()
+    _notes_listed = Signal(list)  # from the thread pool
+
+    def __init__(self, feed: NoteChangeFeed, parent: QObject | None = None) -> None:
+        super().__init__(parent)
+        self.feed = feed
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._directory_changed)
+        self._delay_timer = QTimer(self)
+        self._delay_timer.setSingleShot(True)
+        self._delay_timer.setInterval(WATCH_DELAY)
+        self._delay_timer.timeout.connect(self.check)
+        self._poll_timer = QTimer(self)
+        self._poll_timer.setInterval(WATCH_POLL_INTERVAL)
+        self._poll_timer.timeout.connect(self.check)
+        self._notes_listed.connect(self._report_notes)
+        self._listing = False  # the notes are being compared in the thread pool
+        self._list_again = False  # a check was requested meanwhile
+        self._images_changed = False
+        self._image_folders_stamp = None  # modification times of the image folders, when polled
+
+    def start(self) -> None:
+        """Starts watching, or polling if the folders can't be watched"""
+        NOTES_FOLDER.mkdir(parents=True, exist_ok=True)
+        IMAGES_FOLDER.mkdir(parents=True, exist_ok=True)
+        self._watch([NOTES_FOLDER, IMAGES_FOLDER, *_image_shards()])
+
+    def stop(self) -> None:
+        """Stops watching, the changes of the notes being listed are not reported"""
+        self.blockSignals(True)
+        self._delay_timer.stop()
+        self._poll_timer.stop()
+        if paths := self._watcher.directories():
+            self._watcher.removePaths(paths)
+
+    @instrumentation.timed()
+    def check(self) -> None:
+        """Reports the changes since the last check, those of the notes once they are listed"""
+        self._delay_timer.stop()
+        if self._listing:
+            self._list_again = True
+        else:
+            self._list_notes()
+        if self._poll_timer.isActive():
+            stamp = _image_folders_stamp()
+            self._images_changed |= stamp != self._image_folders_stamp
+            self._image_folders_stamp = stamp
+        if self._images_changed:
+            self._images_changed = False
+            self.images_changed.emit()
+
+    def check_notes(self, dates: list[str]) -> None:
+        """Reports at once the changes of some notes, without listing the others"""
+        if changed := self.feed.changes(dates):
+            self.notes_changed.emit(sorted(changed))
+
+    def _list_notes(self) -> None:
+        """Compares the notes with those last seen in the thread pool"""
+        self._listing = True
+
+        def run() -> None:
+            try:
+                dates = sorted(self.feed.changes())
+            except Exception:  # e.g. the notes folder being replaced: listed again at the next check
+                dates = []
+            self._notes_listed.emit(dates)
+
+        QThreadPool.globalInstance().start(run)
+
+    def _report_notes(self, dates: list[str]) -> None:
+        self._listing = False
+        if self._list_again:
+            self._list_again = False
+            self._list_notes()
+        if dates:
+            self.notes_changed.emit(dates)
+
+    def _directory_changed(self, path: str) -> None:
+        if Path(path) != NOTES_FOLDER:
+            self._images_changed = True
+        if Path(path) == IMAGES_FOLDER:  # a new shard is watched as well
+            watched = set(self._watcher.directories())
+            self._watch([shard for shard in _image_shards() if str(shard) not in watched])
+        self._delay_timer.start()  # a sync client writes many files in a row
+
+    def _watch(self, folders: list[Path]) -> None:
+        """Watches folders, falls back to polling if one of them can't be watched"""
+        if folders and self._watcher.addPaths([str(folder) for folder in folders]) \
+                and not self._poll_timer.isActive():
+            self._image_folders_stamp = _image_folders_stamp()
+            self._poll_timer.start()
+
+
+def _image_shards() -> list[Path]:
+    """Folders of the stored images"""
+    try:
+        return [Path(entry.path) for entry in os.scandir(IMAGES_FOLDER) if entry.is_dir()]
+    except FileNotFoundError:
+        return []
+
+
+def _image_folders_stamp() -> list[int]:
+    """Value changing whenever an image is added to or removed from the store"""
+    stamp = []
+    for folder in [IMAGES_FOLDER, *_image_shards()]:
+        try:
+            stamp.append(folder.stat().st_mtime_ns)
+        except FileNotFoundError:
+            pass
+    return stamp
@@ -1,31 +1,89 @@
 """Contains MainWindow class"""
-import sys
+import threading
+import time
 from functools import wraps
 from pathlib import Path
 from typing import Callable
 
-from PySide6.QtCore import Qt, QLocale, QDate
-from PySide6.QtGui import QIcon, QFont, QTextCharFormat, QAction, QKeySequence, QColor, QIntValidator
+from PySide6.QtCore import Qt, QLocale, QDate, QThreadPool, QTimer, QDateTime, Signal
+from PySide6.QtGui import QIcon, QFont, QTextCharFormat, QAction, QKeySequence, QColor, QIntValidator, QCloseEvent
 from PySide6.QtWidgets import QMainWindow, QSplitter, QCalendarWidget, QPushButton, QWidget, QLabel, \
-    QVBoxLayout, QHBoxLayout, QToolBar, QFileDialog, QComboBox, QMessageBox
-
-from journal.api.daily_note import DailyNote, get_notes, delete_all_notes
-from journal.api.images_functions import copy_image
+    QVBoxLayout, QHBoxLayout, QToolBar, QFileDialog, QComboBox, QMessageBox, QTableView, QInputDialog, \
+    QProgressDialog
+
+from journal.api import instrumentation
+from journal.api.archive import ImportResult, export_archive, import_archive
+from journal.api.autosave import AutosaveWriter
+from journal.api.change_feed import NoteChangeFeed, content_hash
+from journal.api.daily_note import DailyNote, read_notes
+from journal.api.image_collector import ImageCollector
+from journal.api.images_functions import extract_images, legacy_images, migrate_legacy_images
+from journal.api.note_repository import note_repository
+from journal.api.revisions import revision_store
+from journal.api.search import SearchIndex
+from journal.api.snapshots import BEFORE_DELETE_ALL, Snapshot, SnapshotStore
+from journal.api.statistics import JournalStatistics
+from journal.ui.archive_task import ArchiveTask
 from journal.ui.CustomTextEdit import CustomTextEdit
+from journal.ui.format_inspection import MIXED, selection_format
+from journal.ui.image_import import ImageImporter
+from journal.ui.journal_watcher import JournalWatcher
+from journal.ui.note_document import NoteDocument, NoteDocumentLoader
+from journal.ui.search_dialog import SearchDialog
+from journal.ui.stall_watchdog import StallWatchdog
+from journal.ui.theme import Theme
+from journal.ui.timeline import TimelineView
 from journal.ui.constants_ui import *
 
 
 class MainWindow(QMainWindow):
     """Main window"""
+    statistics_changed = Signal()  # emitted by any thread, handled in the UI thread
+    note_not_saved = Signal(str, str)  # date, error, emitted by the autosave thread
 
     def __init__(self, app) -> None:
         super().__init__()
         self.app = app
         self.resize(1000, 600)
 
+        self.theme = Theme()
+        self.autosave = AutosaveWriter(failed=self.note_not_saved.emit)
+        self.search_index = SearchIndex()
+        note_repository.add_listener(self.search_index)
+        self.search_index.synchronize_in_background(note_repository)
+        self.image_collector = ImageCollector()
+        note_repository.add_listener(self.image_collector)
+        self.image_collector.start()
+        note_repository.add_listener(revision_store)
+        self.change_feed = NoteChangeFeed()
+        note_repository.add_listener(self.change_feed)
+        self.statistics = JournalStatistics(changed=self.statistics_changed.emit)
+        note_repository.add_listener(self.statistics)
+        self.statistics.synchronize_in_background(note_repository)
+        self.snapshot_store = SnapshotStore()
+        self.snapshot_store.start()
+        self.current_date = None  # date of the note in the editor
+        self.note_hash = None  # content hash of the version of the note the editor started from
+        self.note_modified = False
+        self.note_is_empty = True
+        self.edit_time = 0.0  # seconds spent editing the note since it was last saved
+        self.last_edit = None  # time.monotonic() of the last change of the note
+
+        self.stall_watchdog = None
+        if instrumentation.enabled:
+            self.stall_watchdog = StallWatchdog(self)
+            self.stall_watchdog.start()
+
         self.setup_ui()
+        note_repository.add_listener(self.timeline.timeline_model)
         self.color_dates()
+        self.show_statistics()
         self.display_note()
+        if legacy_images():
+            self.migrating_images = True
+            self.set_loading(True)  # the notes are rewritten meanwhile
+            self.image_migrator.start(migrate_legacy_images)
+        self.journal_watcher.start()
 
     # region UI setup
     def setup_ui(self) -> None:
@@ -48,6 +106,7 @@ class MainWindow(QMainWindow):
         self.btn_toggle_sidebar = QPushButton("<")
         self.calendar = QCalendarWidget()
         self.btn_search = QPushButton(QIcon(ICON_SEARCH), "")
+        self.lbl_statistics = QLabel()
 
         # notes zone
         self.toolbar = QToolBar()
@@ -55,8 +114,37 @@ class MainWindow(QMainWindow):
         self.te_notes = CustomTextEdit()
         self.cmb_font_size = QComboBox()
 
+        # timeline
+        self.timeline = TimelineView()
+
         # menu
         self.file_menu = self.menuBar().addMenu("Fichier")
+        self.view_menu = self.menuBar().addMenu("Affichage")
+
+        # autosave
+        self.autosave_timer = QTimer(self)
+
+        # notes loading
+        self.note_loader = NoteDocumentLoader(self)
+
+        # images import
+        self.image_importer = ImageImporter(self)
+        self.import_progress = None
+
+        # journal export and import
+        self.journal_exporter = ArchiveTask(self)
+        self.journal_importer = ArchiveTask(self)
+        self.snapshot_restorer = ArchiveTask(self)
+        self.snapshot_taker = ArchiveTask(self)
+        self.archive_progress = None
+        self.image_migrator = ArchiveTask(self)
+        self.migrating_images = False  # editing stays off until then, whatever note is displayed
+
+        # changes made by other processes
+        self.journal_watcher = JournalWatcher(self.change_feed, self)
+
+        # dialogs
+        self.search_dialog = SearchDialog(self.search_index, parent=self)
 
     def create_actions(self) -> None:
         """Adds actions to notes zone toolbar and menu"""
@@ -76,7 +164,12 @@ class MainWindow(QMainWindow):
         self.act_image = self.toolbar.addAction(QIcon(ICON_IMAGE), "Inérer une image")
 
         self.act_quit = self.file_menu.addAction("Quitter Journal", QKeySequence("Ctrl+Q"))
+        self.act_restore_revision = self.file_menu.addAction("Historique de la note...")
+        self.act_export_journal = self.file_menu.addAction("Exporter le journal...")
+        self.act_import_journal = self.file_menu.addAction("Importer un journal...")
+        self.act_restore_snapshot = self.file_menu.addAction("Restaurer une sauvegarde...")
         self.act_delete_all_notes = self.file_menu.addAction("Effacer toutes les notes...")
+        self.act_timeline = self.view_menu.addAction("Fil des jours", QKeySequence("Ctrl+T"))
 
         self.toggleable_actions = [self.act_bold,
                                    self.act_italic,
@@ -97,6 +190,8 @@ class MainWindow(QMainWindow):
         self.calendar.setVerticalHeaderFormat(QCalendarWidget.VerticalHeaderFormat.NoVerticalHeader)
         self.calendar.setFixedHeight(400)
         self.btn_toggle_sidebar.setFixedSize(20, 20)
+        self.lbl_statistics.setObjectName("lbl_statistics")
+        self.lbl_statistics.setWordWrap(True)
 
         # notes zone
         self.lbl_date.setObjectName("lbl_date")
@@ -105,6 +200,10 @@ class MainWindow(QMainWindow):
         for action in self.toggleable_actions:
             action.setCheckable(True)
 
+        # timeline
+        self.act_timeline.setCheckable(True)
+        self.timeline.setVisible(False)
+
         self.te_notes.setFontPointSize(DEFAULT_FONT_SIZE)
 
         self.cmb_font_size.setEditable(True)
@@ -113,6 +212,9 @@ class MainWindow(QMainWindow):
         self.cmb_font_size.setCurrentText(str(DEFAULT_FONT_SIZE))
         self.cmb_font_size.lineEdit().setValidator(QIntValidator())
 
+        self.autosave_timer.setSingleShot(True)
+        self.autosave_timer.setInterval(AUTOSAVE_DELAY)
+
         self.set_application_style()
 
     def add_widgets_to_layouts(self) -> None:
@@ -121,6 +223,7 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(self.splitter)
         self.splitter.addWidget(self.wid_sidebar)
         self.splitter.addWidget(self.wid_notes)
+        self.splitter.addWidget(self.timeline)
 
         # left sidebar
         self.wid_sidebar.setLayout(self.sidebar_layout)
@@ -129,6 +232,7 @@ class MainWindow(QMainWindow):
         self.toggle_layout.addWidget(self.btn_toggle_sidebar)
         self.calendar_layout.addWidget(self.calendar)
         self.calendar_layout.addWidget(self.btn_search, alignment=Qt.AlignmentFlag.AlignRight)
+        self.calendar_layout.addWidget(self.lbl_statistics)
 
         # notes zone
         self.wid_notes.setLayout(self.notes_layout)
@@ -139,9 +243,23 @@ class MainWindow(QMainWindow):
     def setup_connections(self) -> None:
         """Sets up the connections and shortcuts"""
         self.btn_toggle_sidebar.clicked.connect(self.toggle_sidebar)
+        self.btn_search.clicked.connect(self.search_dialog.show)
+        self.search_dialog.date_selected.connect(self.calendar.setSelectedDate)
         self.calendar.selectionChanged.connect(self.display_note)
+        self.calendar.currentPageChanged.connect(lambda year, month: self.color_dates())
+        self.calendar.currentPageChanged.connect(lambda year, month: self.show_statistics())
+        self.statistics_changed.connect(self.color_dates)
+        self.statistics_changed.connect(self.show_statistics)
+        self.note_not_saved.connect(self.note_saving_failed)
+        self.note_loader.document_ready.connect(self.show_note_document)
         self.te_notes.textChanged.connect(self.note_changed)
         self.te_notes.selectionChanged.connect(self.update_actions_state)
+        self.autosave_timer.timeout.connect(self.save_note)
+        self.journal_watcher.notes_changed.connect(self.notes_changed_elsewhere)
+        self.journal_watcher.images_changed.connect(self.images_changed_elsewhere)
+        # notes rewritten in place are not seen by the watcher: they are looked for when coming back
+        self.app.applicationStateChanged.connect(
+            lambda state: self.journal_watcher.check() if state == Qt.ApplicationState.ApplicationActive else None)
 
         # Actions:
         for action in self.toggleable_actions:
@@ -153,8 +271,53 @@ class MainWindow(QMainWindow):
             signal.connect(self.change_font_size)
 
         self.act_image.triggered.connect(self.insert_image)
-        self.act_quit.triggered.connect(sys.exit)
+        self.image_importer.finished.connect(self.images_imported)
+        self.act_quit.triggered.connect(self.close)
+        self.act_restore_revision.triggered.connect(self.restore_revision)
+        self.act_export_journal.triggered.connect(self.export_journal)
+        self.journal_exporter.finished.connect(self.journal_exported)
+        self.act_import_journal.triggered.connect(self.import_journal)
+        self.journal_importer.finished.connect(self.journal_imported)
+        self.act_restore_snapshot.triggered.connect(self.restore_snapshot)
+        self.snapshot_restorer.finished.connect(self.snapshot_restored)
+        self.snapshot_taker.finished.connect(self.snapshot_taken)
+        self.image_migrator.finished.connect(self.legacy_images_migrated)
         self.act_delete_all_notes.triggered.connect(self.delete_all)
+        self.act_timeline.toggled.connect(self.toggle_timeline)
+        self.timeline.date_selected.connect(self.calendar.setSelectedDate)
+
+    # endregion
+
+    # region Events
+    def closeEvent(self, event: QCloseEvent) -> None:
+        """Stops the background tasks and saves the note being edited before closing"""
+        for task in (self.journal_exporter, self.journal_importer, self.snapshot_restorer, self.snapshot_taker,
+                     self.image_migrator):
+            task.close()
+        QThreadPool.globalInstance().waitForDone()  # the writes of the tasks stopped are complete
+        self.journal_watcher.stop()
+        self.snapshot_store.stop()
+        self.save_note()
+        try:
+            self.autosave.close()
+        except Exception as error:  # the rest is closed anyway
+            QMessageBox(QMessageBox.Icon.Warning, "Enregistrement", CLOSE_ERROR_MESSAGE.format(error),
+                        buttons=OK, parent=self).exec()
+        note_repository.save_manifest()
+        note_repository.remove_listener(self.search_index)
+        self.search_index.close()
+        note_repository.remove_listener(self.image_collector)
+        self.image_collector.stop()
+        note_repository.remove_listener(revision_store)
+        note_repository.remove_listener(self.change_feed)
+        note_repository.remove_listener(self.statistics)
+        note_repository.remove_listener(self.timeline.timeline_model)
+        self.statistics.save()
+        if self.stall_watchdog is not None:
+            self.stall_watchdog.stop()
+            trace_file = instrumentation.export_trace()
+            instrumentation.logger.info("Timings (trace in %s):\n%s", trace_file, instrumentation.summary())
+        super().closeEvent(event)
 
     # endregion
 
@@ -191,7 +354,7 @@ class MainWindow(QMainWindow):
             self.te_notes.setFocus()
 
     def delete_all(self) -> None:
-        """Deletes all notes after a warning"""
+        """Deletes all notes after a warning, once they are snapshotted in the background"""
         confirm_box = QMessageBox(QMessageBox.Icon.Warning,
                                   "Du passé faisons table rase ?",
                                   DELETE_ALL_MESSAGE,
@@ -200,26 +363,110 @@ class MainWindow(QMainWindow):
         confirm_box.setDefaultButton(NO)
 
         if confirm_box.exec() == YES:
-            self.color_dates(delete_all=True)
-            self.te_notes.clear()
-            delete_all_notes()
-            info_box = QMessageBox(QMessageBox.Icon.Information,
-                                   "Effacement effectué",
-                                   "Toutes les notes ont été effacées.",
-                                   buttons=OK,
-                                   parent=self)
-            info_box.exec()
-
+            self.save_note()
+            self.autosave.flush()
+            self.set_loading(True)
+            # the notes are deleted by snapshot_taken, once they are snapshotted
+            self.show_archive_progress(self.snapshot_taker, "Sauvegarde avant l'effacement...")
+            self.snapshot_taker.start(self.snapshot_store.take, BEFORE_DELETE_ALL)
+
+    def export_journal(self) -> None:
+        """Exports all notes and their images to an archive, in the background (see journal.api.archive)"""
+        path, selected_filter = QFileDialog.getSaveFileName(self, "Exporter le journal",
+                                                            str(BASE_FOLDER / "journal.zip"),
+                                                            f"{ARCHIVE_HTML_FILTER};;{ARCHIVE_MARKDOWN_FILTER}")
+        if not path:
+            return
+        self.save_note()
+        self.autosave.flush()
+        self.show_archive_progress(self.journal_exporter, "Export du journal...")
+        self.journal_exporter.start(export_archive, path, markdown=selected_filter == ARCHIVE_MARKDOWN_FILTER)
+
+    def images_imported(self, images_html: list[str], errors: list[str]) -> None:
+        """Inserts the imported images at the cursor position"""
+        self.image_importer.progress.disconnect(self.import_progress.setValue)
+        self.import_progress.close()
+        self.import_progress.deleteLater()
+        if images_html:
+            char_format = self.te_notes.currentCharFormat()
+            self.te_notes.insertHtml("".join(images_html))
+            self.te_notes.setCurrentCharFormat(char_format)  # the text typed next is not part of the last link
+        if errors:
+            QMessageBox(QMessageBox.Icon.Warning, "Insertion d'images",
+                        IMPORT_ERROR_MESSAGE.format("\n".join(errors)), buttons=OK, parent=self).exec()
+
+    def import_journal(self) -> None:
+        """Merges the notes of an archive into the journal, in the background (see journal.api.archive)"""
+        path, _ = QFileDialog.getOpenFileName(self, "Importer un journal", str(BASE_FOLDER),
+                                              f"{ARCHIVE_HTML_FILTER};;{ARCHIVE_MARKDOWN_FILTER}")
+        if not path:
+            return
+        self.save_note()
+        self.autosave.flush()
+        self.set_loading(True)  # the note being displayed may be merged
+        self.show_archive_progress(self.journal_importer, "Import du journal...")
+        self.journal_importer.start(import_archive, path)
+
+    @instrumentation.timed()
     def insert_image(self) -> None:
-        """Opens a file dialog window to insert a file.
-        If ian image is selected, copies it to the application Images folder,
-        then inserts it."""
-        file_dialog = QFileDialog(self, "Sélectionnez une image...",
+        """Opens a file dialog window to insert images.
+        The selected images are imported in the background (see journal.ui.image_import),
+        then inserted by images_imported."""
+        file_dialog = QFileDialog(self, "Sélectionnez une ou plusieurs images...",
                                   str(BASE_FOLDER),
                                   FILE_FILTER)
+        file_dialog.setFileMode(QFileDialog.FileMode.ExistingFiles)
         if file_dialog.exec():
-            selected_file = file_dialog.selectedFiles()[0]
-            self.te_notes.insertHtml(f'<img src="{copy_image(selected_file)}" />')
+            self.import_progress = QProgressDialog("Import des images...", "Annuler", 0, 100, self)
+            self.import_progress.setWindowModality(Qt.WindowModality.WindowModal)  # the note must stay the same
+            self.import_progress.setMinimumDuration(IMPORT_PROGRESS_DELAY)
+            self.import_progress.setAutoReset(False)
+            self.import_progress.canceled.connect(self.image_importer.cancel)
+            self.image_importer.progress.connect(self.import_progress.setValue)
+            self.image_importer.start(file_dialog.selectedFiles())
+
+    def restore_revision(self) -> None:
+        """Lets the user choose a previous version of the note and puts it back in the editor"""
+        self.save_note()
+        self.autosave.flush()
+        revisions = DailyNote(self.current_date).revisions()[::-1]
+        if not revisions:
+            QMessageBox(QMessageBox.Icon.Information, "Historique de la note",
+                        "Cette note n'a pas encore d'historique.", buttons=OK, parent=self).exec()
+            return
+        locale = QLocale(QLocale.Language.French)
+        labels = [f"{revision.number + 1}. "
+                  f"{locale.toString(QDateTime.fromSecsSinceEpoch(int(revision.time)), 'dddd d MMMM yyyy, HH:mm:ss')}"
+                  for revision in revisions]
+        label, ok = QInputDialog.getItem(self, "Historique de la note", "Version à restaurer :",
+                                         labels, editable=False)
+        if ok:
+            note = DailyNote(self.current_date)
+            note.restore_revision(revisions[labels.index(label)].number)
+            self.stop_loading()
+            self.te_notes.setText(note.html_content)
+
+    def restore_snapshot(self) -> None:
+        """Lets the user choose a snapshot and puts the journal back as it was then, in the background
+        (see journal.api.snapshots)"""
+        snapshots = self.snapshot_store.snapshots()[::-1]
+        if not snapshots:
+            QMessageBox(QMessageBox.Icon.Information, "Restaurer une sauvegarde",
+                        "Aucune sauvegarde n'a encore été faite.", buttons=OK, parent=self).exec()
+            return
+        locale = QLocale(QLocale.Language.French)
+        labels = [f"{locale.toString(QDateTime.fromSecsSinceEpoch(int(snapshot.time)), 'dddd d MMMM yyyy, HH:mm')}"
+                  f" : {snapshot.notes} notes ({SNAPSHOT_REASONS.get(snapshot.reason, snapshot.reason)})"
+                  for snapshot in snapshots]
+        label, ok = QInputDialog.getItem(self, "Restaurer une sauvegarde", "Sauvegarde à restaurer :",
+                                         labels, editable=False)
+        if not ok:
+            return
+        self.save_note()
+        self.autosave.flush()
+        self.set_loading(True)
+        self.show_archive_progress(self.snapshot_restorer, "Restauration de la sauvegarde...")
+        self.snapshot_restorer.start(self.snapshot_store.restore, snapshots[labels.index(label)].name)
 
     @modify_font
     def toggle_action(self, sender: QAction, char_format: QTextCharFormat) -> None:
@@ -234,70 +481,210 @@ class MainWindow(QMainWindow):
             case self.act_strikethrough:
                 char_format.setFontStrikeOut(sender.isChecked())
 
+    def toggle_timeline(self, checked: bool) -> None:
+        """Shows the notes of consecutive days next to the editor, from the note being displayed, or hides them"""
+        self.timeline.setVisible(checked)
+        if checked:
+            sizes = self.splitter.sizes()
+            if not sizes[2]:
+                self.splitter.setSizes([sizes[0], max(1, sizes[1] - TIMELINE_WIDTH), TIMELINE_WIDTH])
+            self.timeline.show_date(self.current_date)
+
+    @instrumentation.timed()
     def update_actions_state(self) -> None:
         """Adjusts bold, italic, underline and strikethrough action status
-        based on cursor position"""
-        char_format = self.te_notes.textCursor().charFormat()
-        self.act_bold.setChecked(char_format.fontWeight() == QFont.Weight.Bold)
-        self.act_italic.setChecked(char_format.fontItalic())
-        self.act_underline.setChecked(char_format.fontUnderline())
-        self.act_strikethrough.setChecked(char_format.fontStrikeOut())
-        self.cmb_font_size.setCurrentText("" if self.has_different_font_sizes() else
-                                          f"{int(char_format.fontPointSize())}")
+        based on cursor position or selection: an action is checked if the whole selection has its style"""
+        range_format = selection_format(self.te_notes.textCursor())
+        self.act_bold.setChecked(bool(range_format.bold))
+        self.act_italic.setChecked(bool(range_format.italic))
+        self.act_underline.setChecked(bool(range_format.underline))
+        self.act_strikethrough.setChecked(bool(range_format.strikethrough))
+        self.cmb_font_size.setCurrentText("" if range_format.size is MIXED else f"{range_format.size}")
 
     # endregion
 
     # region Other methods in alphabetical order
-    def color_dates(self, delete_all: bool = False) -> None:
-        """Applies background color to dates in calendar based on delete_all status"""
-        for date in get_notes().keys():
-            self.set_date_format(QDate.fromString(date, Qt.DateFormat.ISODate),
-                                 BG_WHEN_EMPTY if delete_all else BG_WHEN_NOTE)
+    def close_archive_progress(self, task: ArchiveTask) -> None:
+        """Closes the progress dialog of an export or import"""
+        task.progress.disconnect(self.archive_progress.setValue)
+        self.archive_progress.close()
+        self.archive_progress.deleteLater()
+        self.archive_progress = None
 
+    def color_dates(self, delete_all: bool = False) -> None:
+        """Applies background color to the dates of the displayed month based on delete_all status.
+        Formats of other months are cleared, so that only the visible dates are formatted."""
+        self.calendar.setDateTextFormat(QDate(), QTextCharFormat())
+        if delete_all:
+            return
+        first_day = QDate(self.calendar.yearShown(), self.calendar.monthShown(), 1)
+        # the calendar also shows the end of the previous month and the beginning of the next one
+        start = first_day.addDays(-7).toString(Qt.DateFormat.ISODate)
+        end = first_day.addMonths(1).addDays(14).toString(Qt.DateFormat.ISODate)
+        for date in note_repository.dates_between(start, end):
+            self.set_date_format(QDate.fromString(date, Qt.DateFormat.ISODate), self.heatmap_color(date))
+
+    @instrumentation.timed()
     def display_note(self):
         """Changes the date in the label when a date is selected"""
+        self.save_note()
         selected_date = self.calendar.selectedDate()
         iso_date = selected_date.toString(Qt.DateFormat.ISODate)
         formatted_date = QLocale(QLocale.Language.French).toString(selected_date, "dddd d MMMM").capitalize()
         self.lbl_date.setText(formatted_date)
 
-        # TODO: voir si possible de changer ça pour alléger le processus
-        notes = get_notes()
-        if notes.get(iso_date):
-            self.te_notes.setText(notes[iso_date].html_content)
+        note = note_repository.get(iso_date)
+        html_content = note.html_content if note is not None else None
+        self.current_date = iso_date
+        self.note_hash = content_hash(html_content)
+        if self.timeline.isVisible():
+            self.timeline.select_date(iso_date)
+        self.edit_time, self.last_edit = 0.0, None
+        document = None
+        if html_content:
+            # images are decoded at most as wide as the screen
+            document = self.note_loader.load(html_content, self.te_notes.screen().availableGeometry().width())
+            if document is None:  # large note, parsed progressively: shown by show_note_document
+                self.te_notes.blockSignals(True)
+                self.te_notes.clear()
+                self.te_notes.blockSignals(False)
+                self.set_loading(True)
+                return
         else:
-            self.te_notes.clear()
-            self.te_notes.setFontPointSize(DEFAULT_FONT_SIZE)
-            self.cmb_font_size.setCurrentText(str(DEFAULT_FONT_SIZE))
-        self.set_application_style()
-        self.te_notes.setFocus()
-
-    def has_different_font_sizes(self) -> bool | None:
-        """True if selection has different font sizes, False if not"""
-        cursor = self.te_notes.textCursor()
-        if cursor.hasSelection():
-            sizes = set()
-            selection_start = cursor.selectionStart()
-            selection_end = cursor.selectionEnd()
-            cursor.setPosition(selection_start)
-            while cursor.position() < selection_end:
-                cursor.movePosition(cursor.MoveOperation.NextCharacter, cursor.MoveMode.KeepAnchor)
-                sizes.add(int(cursor.charFormat().fontPointSize()))
-            return len(sizes) > 1
+            self.note_loader.cancel()
+        self.show_note_document(document)
+
+    def heatmap_color(self, date: str) -> QColor:
+        """Background color of a date having a note, darker for longer notes"""
+        intensity = self.statistics.intensity(date)
+        return BG_HEATMAP[intensity - 1] if intensity else BG_WHEN_NOTE  # not counted yet
+
+    def images_changed_elsewhere(self) -> None:
+        """Shows the images of the note which were missing, if they have arrived"""
+        document = self.te_notes.document()
+        if isinstance(document, NoteDocument):
+            document.load_missing_images()
+
+    def journal_exported(self, count: int | None, error: str) -> None:
+        """Reports the end of an export"""
+        self.close_archive_progress(self.journal_exporter)
+        if error:
+            QMessageBox(QMessageBox.Icon.Warning, "Export du journal", ARCHIVE_ERROR_MESSAGE.format(error),
+                        buttons=OK, parent=self).exec()
+        elif count is not None:
+            QMessageBox(QMessageBox.Icon.Information, "Export du journal", ARCHIVE_EXPORTED_MESSAGE.format(count),
+                        buttons=OK, parent=self).exec()
+
+    def journal_imported(self, result: ImportResult | None, error: str) -> None:
+        """Shows the notes merged by an import, even if it was cancelled or failed along the way"""
+        self.close_archive_progress(self.journal_importer)
+        self.reload_journal()
+        if error:
+            QMessageBox(QMessageBox.Icon.Warning, "Import du journal", ARCHIVE_ERROR_MESSAGE.format(error),
+                        buttons=OK, parent=self).exec()
+        elif result is not None:
+            QMessageBox(QMessageBox.Icon.Information, "Import du journal",
+                        ARCHIVE_IMPORTED_MESSAGE.format(result.added, result.merged, result.unchanged),
+                        buttons=OK, parent=self).exec()
+
+    def legacy_images_migrated(self, count: int | None, error: str) -> None:
+        """Shows the note again, with the new paths of its images, and allows editing again"""
+        self.migrating_images = False
+        self.display_note()
 
+    @instrumentation.timed()
     def note_changed(self) -> None:
-        """Saves note changes"""
-        iso_date = self.calendar.selectedDate().toString(Qt.DateFormat.ISODate)
-        note = DailyNote(date=iso_date, html_content=self.te_notes.toHtml())
+        """Schedules note saving once changes stop for AUTOSAVE_DELAY ms"""
+        self.autosave.request_save()
+        self.note_modified = True
+        self.autosave_timer.start()
+        now = time.monotonic()
+        if self.last_edit is not None and now - self.last_edit < EDIT_PAUSE:
+            self.edit_time += now - self.last_edit
+        self.last_edit = now
+
+        note_is_empty = self.te_notes.document().isEmpty()
+        if note_is_empty != self.note_is_empty:
+            self.note_is_empty = note_is_empty
+            self.set_date_format(QDate.fromString(self.current_date, Qt.DateFormat.ISODate),
+                                 BG_WHEN_EMPTY if note_is_empty else self.heatmap_color(self.current_date))
+            self.update_note_state()
+
+    @instrumentation.timed()
+    def note_saving_failed(self, date: str, error: str) -> None:
+        """Warns that a note could not be written; the autosave writes it again until it succeeds"""
+        day = QLocale(QLocale.Language.French).toString(QDate.fromString(date, Qt.DateFormat.ISODate), "d MMMM yyyy")
+        QMessageBox(QMessageBox.Icon.Warning, "Enregistrement", AUTOSAVE_ERROR_MESSAGE.format(day, error),
+                    buttons=OK, parent=self).exec()
+
+    def notes_changed_elsewhere(self, dates: list[str]) -> None:
+        """Takes the notes written by other processes (e.g. a sync client) into account, date by date.
+        The note being edited is reloaded, after asking the user if it has unsaved or unwritten changes.
+        The other versions of the notes still being written by the autosave are kept in their history."""
+        overwritten = note_repository.reload(dates)
+        for date, other_html_content in overwritten.items():
+            revision_store.add_revision(date, other_html_content)
+        for date in dates:
+            self.set_date_format(QDate.fromString(date, Qt.DateFormat.ISODate),
+                                 self.heatmap_color(date) if date in note_repository else BG_WHEN_EMPTY)
+        if self.current_date not in dates:
+            return
+        html_content = overwritten.get(self.current_date, note_repository.get_html(self.current_date))
+        if content_hash(html_content) == self.note_hash:  # same content, e.g. a file touched by a sync client
+            return
+        if self.note_modified or self.current_date in overwritten:
+            conflict_box = QMessageBox(QMessageBox.Icon.Warning, "Note modifiée ailleurs", CONFLICT_MESSAGE,
+                                       parent=self)
+            btn_keep_mine = conflict_box.addButton("Garder ma version", QMessageBox.ButtonRole.AcceptRole)
+            conflict_box.addButton("Prendre l'autre version", QMessageBox.ButtonRole.RejectRole)
+            conflict_box.exec()
+            if conflict_box.clickedButton() is btn_keep_mine:
+                self.note_hash = content_hash(html_content)  # the other version is in the history already
+                if self.note_modified:
+                    self.autosave_timer.start()
+                return
+            revision_store.add_revision(self.current_date, self.te_notes.toHtml())
+            if self.current_date in overwritten:  # replaces the version being written
+                self.autosave.submit(DailyNote(date=self.current_date, html_content=html_content,
+                                               images=extract_images(html_content)))
+        self.note_modified = False
+        self.display_note()
+
+    def reload_journal(self) -> None:
+        """Shows the notes written to the storage directly, not through the repository (import, restore),
+        and updates what depends on them"""
+        note_repository.invalidate()
+        self.change_feed.changes()  # all read again already
+        self.search_index.synchronize_in_background(note_repository)
+        self.statistics.synchronize_in_background(note_repository)
+        threading.Thread(target=lambda: self.image_collector.build(read_notes()),
+                         name="image references", daemon=True).start()
+        self.timeline.reset_notes()
+        self.color_dates()
+        self.set_loading(False)
+        self.display_note()
+
+    def save_note(self) -> None:
+        """Hands the note being edited to the autosave writer if it has been modified,
+        unless it has been changed elsewhere meanwhile and the user takes the other version"""
+        self.autosave_timer.stop()
+        if not self.note_modified:
+            return
+        if self.change_feed.has_changed(self.current_date):  # e.g. synced since the last check
+            self.journal_watcher.check_notes([self.current_date])
+            if not self.note_modified:
+                return
+        self.note_modified = False
         if self.te_notes.toPlainText():
-            note.save_note()
-            if len(self.te_notes.toPlainText()) == 1:
-                self.set_date_format(self.calendar.selectedDate(), BG_WHEN_NOTE)
-                self.set_application_style()
+            html_content = self.te_notes.toHtml()
+            self.statistics.add_edit_time(self.current_date, self.edit_time)  # written with the note
+            self.autosave.submit(DailyNote(date=self.current_date, html_content=html_content,
+                                           images=extract_images(html_content)))
+            self.note_hash = content_hash(html_content)
         else:
-            note.delete_note()
-            self.set_date_format(self.calendar.selectedDate(), BG_WHEN_EMPTY)
-            self.set_application_style()
+            self.autosave.submit_deletion(self.current_date)
+            self.note_hash = None
+        self.edit_time = 0.0
 
     def set_date_format(self, date: QDate, color: QColor) -> None:
         """Sets the date format based on the existence of an associated note"""
@@ -305,14 +692,95 @@ class MainWindow(QMainWindow):
         date_format.setBackground(color)
         self.calendar.setDateTextFormat(date, date_format)
 
+    @instrumentation.timed()
     def set_application_style(self) -> None:
         """Sets the application style"""
-        with open(STYLE_FILE, 'r', encoding='utf-8') as f:
-            stylesheet = f.read()
-            stylesheet = stylesheet.replace("{selected_date_bg_color}",
-                                            BG_WHEN_NOTE_SELECTED if self.te_notes.toPlainText()
-                                            else BG_WHEN_EMPTY_SELECTED)
-        self.setStyleSheet(stylesheet)
+        self.update_note_state()
+        self.theme.apply(self)
+
+    def set_loading(self, loading: bool) -> None:
+        """Prevents editing while the note is being loaded, or the legacy images migrated"""
+        loading = loading or self.migrating_images
+        self.te_notes.setReadOnly(loading)
+        self.toolbar.setEnabled(not loading)
+
+    def show_archive_progress(self, task: ArchiveTask, label: str) -> None:
+        """Shows the progress of an export or import, which can be cancelled"""
+        self.archive_progress = QProgressDialog(label, "Annuler", 0, 100, self)
+        self.archive_progress.setWindowModality(Qt.WindowModality.WindowModal)
+        self.archive_progress.setMinimumDuration(IMPORT_PROGRESS_DELAY)
+        self.archive_progress.setAutoReset(False)
+        self.archive_progress.canceled.connect(task.cancel)
+        task.progress.connect(self.archive_progress.setValue)
+
+    def show_note_document(self, document: NoteDocument | None) -> None:
+        """Puts the document of the current note in the editor, an empty one if None"""
+        self.set_loading(False)
+        self.te_notes.blockSignals(True)  # loading a note is not a change
+        if document is not None:
+            self.te_notes.set_note_document(document)
+        else:
+            self.te_notes.clear()
+            self.te_notes.setFontPointSize(DEFAULT_FONT_SIZE)
+            self.cmb_font_size.setCurrentText(str(DEFAULT_FONT_SIZE))
+        self.te_notes.blockSignals(False)
+        self.note_is_empty = self.te_notes.document().isEmpty()
+        self.update_note_state()
+        self.te_notes.setFocus()
+
+    def show_statistics(self) -> None:
+        """Shows the totals of the displayed month and the streaks, and the most active weekdays as tooltip"""
+        totals = self.statistics.month(self.calendar.yearShown(), self.calendar.monthShown())
+        streaks = self.statistics.streaks()
+        self.lbl_statistics.setText(STATISTICS_MESSAGE.format(totals.notes, totals.words, totals.images,
+                                                              round(totals.edit_time / 60),
+                                                              streaks.current, streaks.longest))
+        weekdays = sorted(enumerate(self.statistics.weekdays()), key=lambda weekday: -weekday[1].words)
+        self.lbl_statistics.setToolTip(STATISTICS_TOOLTIP.format("\n".join(
+            f"{WEEKDAYS[day]} : {totals.notes} notes, {totals.words} mots"
+            for day, totals in weekdays[:3] if totals.notes)))
+
+    def snapshot_restored(self, count: int | None, error: str) -> None:
+        """Shows the restored notes, even if the restore was cancelled or failed along the way"""
+        self.close_archive_progress(self.snapshot_restorer)
+        self.reload_journal()
+        if error:
+            QMessageBox(QMessageBox.Icon.Warning, "Restaurer une sauvegarde", RESTORE_ERROR_MESSAGE.format(error),
+                        buttons=OK, parent=self).exec()
+        elif count is not None:
+            QMessageBox(QMessageBox.Icon.Information, "Restaurer une sauvegarde",
+                        SNAPSHOT_RESTORED_MESSAGE.format(count), buttons=OK, parent=self).exec()
+
+    def snapshot_taken(self, snapshot: Snapshot | None, error: str) -> None:
+        """Deletes all notes once they are snapshotted, unless the snapshot failed or was cancelled"""
+        self.close_archive_progress(self.snapshot_taker)
+        if snapshot is None:
+            self.set_loading(False)
+            if error:
+                QMessageBox(QMessageBox.Icon.Warning, "Effacement annulé", SNAPSHOT_ERROR_MESSAGE.format(error),
+                            buttons=OK, parent=self).exec()
+            return
+        self.color_dates(delete_all=True)
+        self.stop_loading()
+        self.te_notes.clear()
+        self.save_note()
+        self.autosave.flush()
+        note_repository.delete_all()
+        info_box = QMessageBox(QMessageBox.Icon.Information,
+                               "Effacement effectué",
+                               "Toutes les notes ont été effacées.",
+                               buttons=OK,
+                               parent=self)
+        info_box.exec()
+
+    def stop_loading(self) -> None:
+        """Drops the note being parsed, before the editor content is replaced"""
+        self.note_loader.cancel()
+        self.set_loading(False)
+
+    def update_note_state(self) -> None:
+        """Updates the style of the selected date based on the existence of a note"""
+        self.theme.set_state(self.calendar.findChild(QTableView), "has_note", not self.note_is_empty)
 
     def toggle_sidebar(self):
         """Shows or hides sidebar"""
@@ -0,0 +1,221 @@
+"""Documents of the notes: parsed progressively when large, with images decoded asynchronously.
+The images of a note first appear as placeholders of their final size; they are decoded in the
+thread pool, scaled down to the display width, and kept in image_cache, shared by all the notes."""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from PySide6.QtCore import QObject, QSize, QThreadPool, QUrl, QTimer, Signal
+from PySide6.QtGui import QColor, QImage, QImageReader, QTextCursor, QTextDocument, QTextDocumentFragment
+
+from journal.ui.constants_ui import *
+
+
+class ImageCache:
+    """Decoded images by (path, width), least recently used first out when over max_bytes"""
+
+    def __init__(self, max_bytes: int = MAX_CACHED_IMAGES_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self._images: OrderedDict[tuple[str, int], QImage] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple[str, int]) -> QImage | None:
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+            return image
+
+    def put(self, key: tuple[str, int], image: QImage) -> None:
+        with self._lock:
+            if key in self._images:
+                self._bytes -= self._images.pop(key).sizeInBytes()
+            if image.sizeInBytes() > self.max_bytes:
+                return
+            self._images[key] = image
+            self._bytes += image.sizeInBytes()
+            while self._bytes > self.max_bytes:
+                self._bytes -= self._images.popitem(last=False)[1].sizeInBytes()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._images.clear()
+            self._bytes = 0
+
+
+image_cache = ImageCache()
+
+
+def display_size(size: QSize, width: int) -> QSize:
+    """Size of an image scaled down to fit width"""
+    if not size.isValid() or size.width() <= width:
+        return size
+    return QSize(width, max(1, size.height() * width // size.width()))
+
+
+def decode_image(path: str, width: int) -> QImage:
+    """Decodes an image directly at its display size, which is much faster than decoding then scaling"""
+    reader = QImageReader(path)
+    size = display_size(reader.size(), width)
+    if size.isValid():
+        reader.setScaledSize(size)
+    return reader.read()
+
+
+class _Messenger(QObject):
+    """Carries the results of the thread pool to the GUI thread"""
+    image_decoded = Signal(str, int, QImage)
+
+
+class NoteDocument(QTextDocument):
+    """Document of a note showing its images at most display_width wide, decoded asynchronously"""
+
+    def __init__(self, display_width: int, parent: QObject | None = None) -> None:
+        super().__init__(parent)
+        self.display_width = max(1, display_width)
+        self._pending = set()  # names of the images being decoded
+        self._missing = {}  # name: path of the images missing when the note was laid out
+        self._messenger = None
+        self._relayout_timer = None
+
+    def loadResource(self, resource_type: int, url: QUrl):
+        if resource_type != QTextDocument.ResourceType.ImageResource.value:
+            return super().loadResource(resource_type, url)
+        path = url.toLocalFile() or url.toString()
+        image = image_cache.get((path, self.display_width))
+        if image is not None:
+            return image
+        self._decode(url.toString(), path)
+        size = display_size(QImageReader(path).size(), self.display_width)
+        if not size.isValid():  # missing or unreadable: Qt shows its broken image
+            self._missing[url.toString()] = path
+            return super().loadResource(resource_type, url)
+        placeholder = QImage(size, QImage.Format.Format_RGB32)
+        placeholder.fill(QColor(IMAGE_PLACEHOLDER_COLOR))
+        return placeholder
+
+    def load_missing_images(self) -> None:
+        """Decodes the images missing when the note was laid out which have arrived since (e.g. synced)"""
+        for name, path in list(self._missing.items()):
+            if os.path.exists(path):
+                del self._missing[name]
+                self._decode(name, path)
+
+    def _decode(self, name: str, path: str) -> None:
+        if name in self._pending:
+            return
+        if self._messenger is None:
+            self._messenger = _Messenger(self)
+            self._messenger.image_decoded.connect(self._image_decoded)
+            self._relayout_timer = QTimer(self)
+            self._relayout_timer.setSingleShot(True)
+            self._relayout_timer.setInterval(IMAGES_RELAYOUT_DELAY)
+            self._relayout_timer.timeout.connect(self._relayout)
+        self._pending.add(name)
+        messenger, width = self._messenger, self.display_width
+
+        def decode() -> None:
+            image = decode_image(path, width)
+            if not image.isNull():
+                image_cache.put((path, width), image)
+            try:
+                messenger.image_decoded.emit(name, width, image)
+            except RuntimeError:  # the document was deleted meanwhile
+                pass
+
+        QThreadPool.globalInstance().start(decode)
+
+    def _image_decoded(self, name: str, width: int, image: QImage) -> None:
+        self._pending.discard(name)
+        if image.isNull() or width != self.display_width:
+            return
+        self.addResource(QTextDocument.ResourceType.ImageResource.value, QUrl(name), image)
+        self._relayout_timer.start()  # images decoded together are laid out once
+
+    def _relayout(self) -> None:
+        self.markContentsDirty(0, self.characterCount())
+
+
+def html_chunks(html: str, chunk_size: int = PARSE_CHUNK_SIZE) -> list[str]:
+    """Splits the html of a note in html documents of about chunk_size, each with the head and body
+    attributes of the note, cut between the paragraphs written one per line by QTextDocument.toHtml().
+    Lists and tables stay in the first chunk: a list pasted after another one of the same format
+    would join it."""
+    body_start = html.find("<body")
+    body_end = html.rfind("</body>")
+    if body_start == -1 or body_end == -1:
+        return [html]
+    body_start = html.index(">", body_start) + 1
+    head, body, tail = html[:body_start], html[body_start:body_end], html[body_end:]
+    last_container = max(body.rfind("</ul>"), body.rfind("</ol>"), body.rfind("</table>"))
+    chunks = []
+    lines = []
+    length = 0  # of the lines
+    offset = 0  # in body, after the lines
+    for line in body.split("\n"):
+        lines.append(line)
+        length += len(line) + 1
+        offset += len(line) + 1
+        # a cut can only follow a paragraph, after the last list or table
+        if length >= chunk_size and line.startswith("<p") and offset > last_container:
+            chunks.append(head + "\n".join(lines) + tail)
+            lines = []
+            length = 0
+    if lines or not chunks:
+        chunks.append(head + "\n".join(lines) + tail)
+    return chunks
+
+
+class NoteDocumentLoader(QObject):
+    """Creates the documents of the notes. A large note is parsed chunk by chunk from the event loop,
+    PARSE_SLICE ms at a time, so that the window stays responsive, and delivered by document_ready.
+    QTextDocument.setHtml() keeps the GIL: a thread would freeze the window as well.
+    Only the last requested document is delivered; a new request drops the one being parsed."""
+    document_ready = Signal(QObject)
+
+    def __init__(self, parent: QObject | None = None) -> None:
+        super().__init__(parent)
+        self._document = None  # document being parsed
+        self._chunks = deque()  # html of its remaining chunks
+        self._timer = QTimer(self)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._parse_chunks)
+
+    def load(self, html: str, display_width: int) -> NoteDocument | None:
+        """Document of html, or None if it is large and will come by document_ready"""
+        self.cancel()
+        chunks = html_chunks(html) if len(html) >= LARGE_NOTE_SIZE else [html]
+        document = NoteDocument(display_width)
+        document.setUndoRedoEnabled(False)  # the insertion of the chunks is not an edit
+        document.setHtml(chunks[0])
+        if len(chunks) == 1:
+            document.setUndoRedoEnabled(True)
+            return document
+        self._document = document
+        self._chunks.extend(chunks[1:])
+        self._timer.start()
+        return None
+
+    def cancel(self) -> None:
+        """Drops the document being parsed"""
+        self._timer.stop()
+        self._document = None
+        self._chunks.clear()
+
+    def _parse_chunks(self) -> None:
+        deadline = time.perf_counter() + PARSE_SLICE / 1000
+        cursor = QTextCursor(self._document)
+        while self._chunks and time.perf_counter() < deadline:
+            chunk = QTextDocument()
+            chunk.setHtml(self._chunks.popleft())
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            cursor.insertBlock(chunk.begin().blockFormat(), chunk.begin().charFormat())
+            cursor.insertFragment(QTextDocumentFragment(chunk))
+        if self._chunks:
+            return
+        document = self._document
+        self.cancel()
+        document.setUndoRedoEnabled(True)
+        self.document_ready.emit(document)
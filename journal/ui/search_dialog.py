@@ -0,0 +1,60 @@
+"""Contains SearchDialog class"""
+
+from PySide6.QtCore import Qt, QDate, QLocale, QTimer, Signal
+from PySide6.QtWidgets import QDialog, QLineEdit, QListWidget, QListWidgetItem, QVBoxLayout, QLabel
+
+from journal.api.search import SearchIndex
+from journal.ui.constants_ui import *
+
+
+class SearchDialog(QDialog):
+    """A dialog to search notes, emitting date_selected when a result is chosen"""
+    date_selected = Signal(QDate)
+
+    def __init__(self, search_index: SearchIndex, parent=None) -> None:
+        super().__init__(parent)
+        self.search_index = search_index
+        self.setWindowTitle("Rechercher dans les notes")
+        self.resize(500, 400)
+
+        self.setup_ui()
+
+    # region UI setup
+    def setup_ui(self) -> None:
+        """Sets up the UI"""
+        self.le_query = QLineEdit()
+        self.lbl_help = QLabel(SEARCH_HELP_MESSAGE)
+        self.lst_results = QListWidget()
+        self.search_timer = QTimer(self)
+
+        self.le_query.setClearButtonEnabled(True)
+        self.lbl_help.setWordWrap(True)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.le_query)
+        layout.addWidget(self.lbl_help)
+        layout.addWidget(self.lst_results)
+
+        self.le_query.textChanged.connect(self.search_timer.start)
+        self.le_query.returnPressed.connect(self.search)
+        self.search_timer.timeout.connect(self.search)
+        self.lst_results.itemActivated.connect(self.select_result)
+    # endregion
+
+    def search(self) -> None:
+        """Displays the notes matching the query"""
+        self.search_timer.stop()
+        self.lst_results.clear()
+        locale = QLocale(QLocale.Language.French)
+        for result in self.search_index.search(self.le_query.text()):
+            date = QDate.fromString(result.date, Qt.DateFormat.ISODate)
+            snippet, _ = self.search_index.snippet(result)
+            item = QListWidgetItem(f"{locale.toString(date, 'dddd d MMMM yyyy').capitalize()}\n{snippet}")
+            item.setData(Qt.ItemDataRole.UserRole, date)
+            self.lst_results.addItem(item)
+
+    def select_result(self, item: QListWidgetItem) -> None:
+        """Emits the date of the chosen result"""
+        self.date_selected.emit(item.data(Qt.ItemDataRole.UserRole))
@@ -0,0 +1,73 @@
+"""Contains StallWatchdog class"""
+import sys
+import threading
+import time
+import traceback
+
+from PySide6.QtCore import QObject, QTimer
+
+from journal.api import instrumentation
+from journal.ui.constants_ui import *
+
+
+class StallWatchdog(QObject):
+    """Detects stalls of the event loop.
+    A timer of the GUI thread beats every HEARTBEAT_INTERVAL; a watcher thread checks the beats and,
+    when none came for STALL_THRESHOLD, logs a sample of the GUI thread stack, once per threshold
+    elapsed, so that a long stall shows where the time went."""
+
+    def __init__(self, parent: QObject | None = None, threshold: float = STALL_THRESHOLD) -> None:
+        super().__init__(parent)
+        self.threshold = threshold
+        self.stalls = 0
+        self._gui_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.timer = QTimer(self)
+        self.timer.setInterval(HEARTBEAT_INTERVAL)
+        self.timer.timeout.connect(self.beat)
+
+    def beat(self) -> None:
+        """Marks the event loop as alive"""
+        self._last_beat = time.monotonic()
+
+    def start(self) -> None:
+        """Starts beating and watching"""
+        self._stopped.clear()
+        self.beat()
+        self.timer.start()
+        self._thread = threading.Thread(target=self._watch, name="stall-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops beating and watching"""
+        self.timer.stop()
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _watch(self) -> None:
+        sampled_beat = None  # beat of the stall being sampled
+        next_sample = 0.0
+        while not self._stopped.wait(self.threshold / 4):
+            last_beat = self._last_beat
+            stalled_for = time.monotonic() - last_beat
+            if stalled_for < self.threshold:
+                continue
+            if last_beat != sampled_beat:
+                sampled_beat = last_beat
+                next_sample = self.threshold
+                self.stalls += 1
+            if stalled_for >= next_sample:
+                next_sample += self.threshold
+                self._sample(stalled_for)
+
+    def _sample(self, stalled_for: float) -> None:
+        frame = sys._current_frames().get(self._gui_thread)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+        instrumentation.record_instant("event loop stall", self._gui_thread,
+                                       stalled_ms=round(stalled_for * 1000), stack=stack)
+        instrumentation.logger.warning("Event loop stalled for %d ms:\n%s", stalled_for * 1000, stack)
+
@@ -0,0 +1,34 @@
+"""Contains Theme class"""
+from pathlib import Path
+
+from PySide6.QtWidgets import QWidget
+
+from journal.ui.constants_ui import *
+
+
+class Theme:
+    """Application stylesheet, read and filled in once.
+    Every state variant is part of the stylesheet, selected by a dynamic property of the widget
+    concerned, so that a state change only polishes this widget again."""
+
+    def __init__(self, style_file: Path = STYLE_FILE, **variables: str) -> None:
+        with open(style_file, "r", encoding="utf-8") as f:
+            stylesheet = f.read()
+        for name, value in {**STYLE_VARIABLES, **variables}.items():
+            stylesheet = stylesheet.replace(f"{{{name}}}", value)
+        self.stylesheet = stylesheet
+
+    def apply(self, widget: QWidget) -> None:
+        """Sets the stylesheet on a top-level widget"""
+        widget.setStyleSheet(self.stylesheet)
+
+    @staticmethod
+    def set_state(widget: QWidget, name: str, value: bool) -> None:
+        """Changes a state property of a widget and polishes this widget only, if the state changed"""
+        if widget.property(name) == value:
+            return
+        widget.setProperty(name, value)
+        style = widget.style()
+        style.unpolish(widget)
+        style.polish(widget)
+        widget.update()
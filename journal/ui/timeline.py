@@ -0,0 +1,321 @@
+"""Contains TimelineView class: the notes of consecutive days one after the other, in a scrollable list.
+
+The list is virtualized: the view only paints the visible entries, and lays out the others from the heights
+remembered by the delegate, without loading their notes. An entry shows the date and the note, rendered by
+a NoteDocument. The notes are read in the thread pool for the visible entries and TIMELINE_PREFETCH entries
+on each side, once scrolling pauses, and their documents are created then; at most TIMELINE_CACHED_ENTRIES
+notes and documents are kept."""
+import bisect
+import math
+from collections import OrderedDict
+
+from PySide6.QtCore import QAbstractListModel, QDate, QLocale, QModelIndex, QObject, QPoint, QRect, QSize, Qt, \
+    QThreadPool, QTimer, Signal
+from PySide6.QtGui import QAbstractTextDocumentLayout, QFont, QFontMetrics, QPainter, QPalette
+from PySide6.QtWidgets import QAbstractItemView, QStyle, QStyledItemDelegate, QStyleOptionViewItem, QTreeView
+
+from journal.api.daily_note import DailyNote
+from journal.api.note_repository import NoteListener, note_repository
+from journal.ui.note_document import NoteDocument, html_chunks
+from journal.ui.constants_ui import *
+
+
+def timeline_html(html_content: str | None) -> str:
+    """Html shown for a note: the note, or the beginning of a large one, which is opened to be read entirely"""
+    if not html_content:
+        return ""
+    if len(html_content) < LARGE_NOTE_SIZE:
+        return html_content
+    beginning = html_chunks(html_content)[0]
+    body_end = beginning.rfind("</body>")
+    return beginning if body_end == -1 else beginning[:body_end] + "<p>…</p>" + beginning[body_end:]
+
+
+class TimelineModel(QAbstractListModel, NoteListener):
+    """Dates having a note, in order, with the html of their notes loaded on demand (prefetch).
+    Kept up to date as a NoteListener of the repository; the notes written to the storage directly
+    are taken into account by reset()."""
+    DATE_ROLE = Qt.ItemDataRole.UserRole
+    HTML_ROLE = Qt.ItemDataRole.UserRole + 1
+    _note_loaded = Signal(int, str, str)  # generation, date, html, from the thread pool
+    _note_changed = Signal(str)  # date of a note saved or deleted, from the thread which wrote it
+    _notes_deleted = Signal()
+
+    def __init__(self, parent: QObject | None = None) -> None:
+        super().__init__(parent)
+        self._dates: list[str] = []
+        self._notes: OrderedDict[str, str] = OrderedDict()  # date: html, least recently used first
+        self._pending: set[str] = set()  # dates whose note is being loaded
+        self._generation = 0  # incremented by reset(), so that the notes loaded before are dropped
+        self._visible = (0, -1)  # rows last shown by the view
+        self._note_loaded.connect(self._store_note)
+        self._note_changed.connect(self._update)
+        self._notes_deleted.connect(self.reset)
+
+    def reset(self) -> None:
+        """Lists the dates again and forgets the notes"""
+        self.beginResetModel()
+        self._dates = sorted(note_repository.dates())
+        self._notes.clear()
+        self._pending.clear()
+        self._generation += 1
+        self.endResetModel()
+
+    def row(self, date: str) -> int:
+        """Row of a date, or of the first date after it if it has no note"""
+        return min(bisect.bisect_left(self._dates, date), len(self._dates) - 1)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._dates)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._dates):
+            return None
+        date = self._dates[index.row()]
+        if role == self.DATE_ROLE:
+            return date
+        if role == self.HTML_ROLE:
+            html_content = self._notes.get(date)
+            if html_content is None:
+                return ""  # until loaded
+            self._notes.move_to_end(date)
+            return html_content
+        return None
+
+    def is_prefetched(self, row: int) -> bool:
+        """Whether a row is among the visible ones or TIMELINE_PREFETCH rows around"""
+        return self._visible[0] - TIMELINE_PREFETCH <= row <= self._visible[1] + TIMELINE_PREFETCH
+
+    def prefetch(self, first: int, last: int) -> None:
+        """Loads in the thread pool the notes of rows first to last and TIMELINE_PREFETCH rows around"""
+        self._visible = (first, last)
+        start, end = max(0, first - TIMELINE_PREFETCH), min(len(self._dates), last + 1 + TIMELINE_PREFETCH)
+        dates = [date for date in self._dates[start:end] if date not in self._notes and date not in self._pending]
+        if not dates:
+            return
+        self._pending.update(dates)
+        generation, signal = self._generation, self._note_loaded
+
+        def load() -> None:
+            for date in dates:
+                try:
+                    signal.emit(generation, date, timeline_html(note_repository.get_html(date)))
+                except RuntimeError:  # the model was deleted meanwhile
+                    return
+
+        QThreadPool.globalInstance().start(load)
+
+    def _store_note(self, generation: int, date: str, html_content: str) -> None:
+        if generation != self._generation:
+            return
+        self._pending.discard(date)
+        self._notes[date] = html_content
+        while len(self._notes) > TIMELINE_CACHED_ENTRIES:
+            self._notes.popitem(last=False)
+        row = bisect.bisect_left(self._dates, date)
+        if row < len(self._dates) and self._dates[row] == date:
+            self.dataChanged.emit(self.index(row), self.index(row), [self.HTML_ROLE])
+
+    def _update(self, date: str) -> None:
+        """Adds, removes or reloads the entry of a date"""
+        self._notes.pop(date, None)
+        row = bisect.bisect_left(self._dates, date)
+        listed = row < len(self._dates) and self._dates[row] == date
+        if date in note_repository and not listed:
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._dates.insert(row, date)
+            self.endInsertRows()
+        elif date not in note_repository and listed:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._dates[row]
+            self.endRemoveRows()
+        elif listed:
+            self._pending.discard(date)  # a note being loaded may be the previous version
+            self.prefetch(*self._visible)
+
+    # NoteListener interface
+    def note_saved(self, note: DailyNote) -> None:
+        self._note_changed.emit(note.date)
+
+    def note_deleted(self, date: str) -> None:
+        self._note_changed.emit(date)
+
+    def notes_deleted(self) -> None:
+        self._notes_deleted.emit()
+
+
+class TimelineDelegate(QStyledItemDelegate):
+    """Paints an entry: the date, then the note rendered by a NoteDocument. The documents are created for
+    the entries prefetched, and at most TIMELINE_CACHED_ENTRIES are kept, while the heights of all the notes
+    laid out are remembered, so that an entry keeps its height when its document is dropped. The entries
+    not laid out yet are given TIMELINE_LOADING_LINES lines."""
+
+    def __init__(self, parent: QAbstractItemView) -> None:
+        super().__init__(parent)
+        self.locale = QLocale(QLocale.Language.French)
+        self.width = 1  # of the documents, set by the view
+        self._documents: OrderedDict[str, tuple[str, NoteDocument]] = OrderedDict()  # date: (html, document)
+        self._heights: dict[str, int] = {}  # date: height of the document of its note
+
+    def set_width(self, width: int) -> bool:
+        """Sets the width of the documents, which are created again when needed. True if it changed"""
+        width = max(1, width)
+        if width == self.width:
+            return False
+        self.width = width
+        self._documents.clear()
+        return True
+
+    def document(self, index: QModelIndex) -> NoteDocument | None:
+        """Document of the note of an entry, None until it is loaded.
+        An entry whose note is being loaded again keeps its previous document meanwhile."""
+        date = index.data(TimelineModel.DATE_ROLE)
+        html_content = index.data(TimelineModel.HTML_ROLE)
+        cached = self._documents.get(date)
+        if cached is not None and (not html_content or cached[0] == html_content):
+            self._documents.move_to_end(date)
+            return cached[1]
+        if not html_content:
+            return None
+        document = NoteDocument(self.width)
+        document.setHtml(html_content)
+        document.setTextWidth(self.width)
+        viewport = self.parent().viewport()
+        document.documentLayout().update.connect(lambda rect: viewport.update())  # images decoded
+        self._documents[date] = (html_content, document)
+        while len(self._documents) > TIMELINE_CACHED_ENTRIES:
+            self._documents.popitem(last=False)
+        self._heights[date] = math.ceil(document.size().height())
+        return document
+
+    def sizeHint(self, option: QStyleOptionViewItem, index: QModelIndex) -> QSize:
+        metrics = QFontMetrics(option.font)
+        if index.model().is_prefetched(index.row()):
+            self.document(index)  # measures the note if loaded
+        height = self._heights.get(index.data(TimelineModel.DATE_ROLE), TIMELINE_LOADING_LINES * metrics.lineSpacing())
+        return QSize(self.width + 2 * TIMELINE_MARGIN, 2 * TIMELINE_MARGIN + metrics.height() + height)
+
+    def paint(self, painter: QPainter, option: QStyleOptionViewItem, index: QModelIndex) -> None:
+        painter.save()
+        context = QAbstractTextDocumentLayout.PaintContext()
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+            painter.setPen(option.palette.color(QPalette.ColorRole.HighlightedText))
+            context.palette.setColor(QPalette.ColorRole.Text, option.palette.color(QPalette.ColorRole.HighlightedText))
+        rect = option.rect.adjusted(TIMELINE_MARGIN, TIMELINE_MARGIN, -TIMELINE_MARGIN, -TIMELINE_MARGIN)
+        metrics = QFontMetrics(option.font)
+        date = QDate.fromString(index.data(TimelineModel.DATE_ROLE), Qt.DateFormat.ISODate)
+        title_font = QFont(option.font)
+        title_font.setBold(True)
+        painter.setFont(title_font)
+        painter.drawText(QRect(rect.left(), rect.top(), rect.width(), metrics.height()),
+                         Qt.AlignmentFlag.AlignLeft, self.locale.toString(date, "dddd d MMMM yyyy").capitalize())
+        note_rect = rect.adjusted(0, metrics.height(), 0, 0)
+        document = self.document(index)
+        if document is None:  # being loaded
+            painter.setFont(option.font)
+            painter.setPen(option.palette.color(QPalette.ColorRole.PlaceholderText))
+            painter.drawText(note_rect, Qt.AlignmentFlag.AlignLeft, "…")
+        else:
+            painter.setClipRect(note_rect)  # until the entry is laid out at the height of its document
+            painter.translate(note_rect.topLeft())
+            document.documentLayout().draw(painter, context)
+        painter.restore()
+
+
+class TimelineView(QTreeView):
+    """Scrollable list of the notes, emitting date_selected when one is clicked.
+    The dates are listed the first time the view is shown. A tree view, unlike a list view, keeps
+    the heights of the entries and only measures again those whose notes were loaded."""
+    date_selected = Signal(QDate)
+
+    def __init__(self, parent: QObject | None = None) -> None:
+        super().__init__(parent)
+        self.timeline_model = TimelineModel(self)
+        self.setModel(self.timeline_model)
+        self.timeline_delegate = TimelineDelegate(self)
+        self.setItemDelegate(self.timeline_delegate)
+        self.setHeaderHidden(True)
+        self.setRootIsDecorated(False)
+        self.setIndentation(0)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self._listed = False
+        self._prefetch_timer = QTimer(self)
+        self._prefetch_timer.setSingleShot(True)
+        self._prefetch_timer.setInterval(TIMELINE_PREFETCH_DELAY)
+        self._prefetch_timer.timeout.connect(self._prefetch)
+        # start(msec) would take the arguments of the signals as interval
+        self.verticalScrollBar().valueChanged.connect(lambda value: self._prefetch_timer.start())
+        self.timeline_model.modelReset.connect(lambda: self._prefetch_timer.start())
+        self.timeline_model.rowsInserted.connect(lambda parent, first, last: self._prefetch_timer.start())
+        self.clicked.connect(lambda index: self.date_selected.emit(
+            QDate.fromString(index.data(TimelineModel.DATE_ROLE), Qt.DateFormat.ISODate)))
+
+    def show_date(self, date: str) -> None:
+        """Scrolls to the note of a date, or to the next one"""
+        if not self._listed:
+            self.timeline_model.reset()
+            self._listed = True
+        if not self.timeline_model.rowCount():
+            return
+        index = self.timeline_model.index(self.timeline_model.row(date))
+        self.setCurrentIndex(index)
+        self.scrollTo(index, QAbstractItemView.ScrollHint.PositionAtTop)
+        self._prefetch_timer.start()
+
+    def select_date(self, date: str) -> None:
+        """Selects the entry of a date, scrolling only if it is not visible"""
+        if not self._listed or not self.timeline_model.rowCount():
+            return
+        index = self.timeline_model.index(self.timeline_model.row(date))
+        if index.data(TimelineModel.DATE_ROLE) == date:
+            self.setCurrentIndex(index)
+            self.scrollTo(index, QAbstractItemView.ScrollHint.EnsureVisible)
+        else:
+            self.clearSelection()
+
+    def reset_notes(self) -> None:
+        """Lists the notes again, after they were written to the storage directly"""
+        if self._listed:
+            self.timeline_model.reset()
+
+    def dataChanged(self, top_left: QModelIndex, bottom_right: QModelIndex, roles=()) -> None:
+        """Measures the entries whose notes were loaded, keeping the first visible one in place"""
+        anchor = self._anchor()
+        super().dataChanged(top_left, bottom_right, roles)
+        self._restore_anchor(anchor)
+
+    def doItemsLayout(self) -> None:
+        """Lays out all the entries, keeping the first visible one in place"""
+        anchor = self._anchor()
+        super().doItemsLayout()
+        self._restore_anchor(anchor)
+
+    def resizeEvent(self, event) -> None:
+        super().resizeEvent(event)
+        self._prefetch_timer.start()
+
+    def _anchor(self) -> tuple[QModelIndex, int]:
+        """First visible entry, and the position of its top"""
+        anchor = self.indexAt(QPoint(0, 0))
+        return anchor, self.visualRect(anchor).top()
+
+    def _restore_anchor(self, anchor: tuple[QModelIndex, int]) -> None:
+        """Scrolls so that an entry is back at its position, when the heights of the entries above changed"""
+        index, top = anchor
+        if index.isValid() and index.row() < self.timeline_model.rowCount():
+            scroll_bar = self.verticalScrollBar()
+            scroll_bar.setValue(scroll_bar.value() + self.visualRect(index).top() - top)
+
+    def _prefetch(self) -> None:
+        """Loads the visible entries, and lays out the entries again if the width changed"""
+        if not self.isVisible() or not self.timeline_model.rowCount():
+            return
+        first = self.indexAt(QPoint(0, 0))
+        last = self.indexAt(QPoint(0, self.viewport().height() - 1))
+        first = first.row() if first.isValid() else 0
+        last = last.row() if last.isValid() else self.timeline_model.rowCount() - 1
+        self.timeline_model.prefetch(first, last)
+        if self.timeline_delegate.set_width(self.viewport().width() - 2 * TIMELINE_MARGIN):
+            self.doItemsLayout()